@@ -1,32 +1,51 @@
 # app/main.py
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
 
-from fastapi import FastAPI, Depends, Path, Query, Body, BackgroundTasks
+from fastapi import FastAPI, Depends, Path, Query, Body, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from contextlib import asynccontextmanager
+import hmac
 
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-import asyncio
-import time
+import json
 
-from app.models.database import get_db, Base, engine
+from app.models.database import get_async_db, Base, engine, async_engine, SessionLocal, AsyncSessionLocal
 from app.models.models import Device, AvailabilityCheck, MonitoringSettings
+from app.models.schema import upgrade_schema
 from app.schemas.schemas import (
     AvailabilityCheckResponse,
+    AvailabilityIntervalResponse,
+    UptimeStats,
     AvailabilitySettingsUpdate,
     DeviceCreate,
-    DeviceUpdate
+    DeviceUpdate,
+    ProbePolicyCreate,
+    ProbePolicyResponse,
+    DeviceProbeAssignment,
+    DeviceScheduleUpdate,
+    CheckJobCreate,
+    DeviceEventBatch
 )
 from app.services.availability import AvailabilityService
-from app.services.scheduler import (
-    AvailabilityScheduler,
-    background_check_status,
-    check_results,
-    check_results_lock,
-    thread_pool_executor
-)
-from app.services.sync import sync_devices, run_device_sync
+from app.services.probe import ProbeService
+from app.services.device_scheduler import DeviceCheckScheduler
+from app.services.writer import ResultWriter
+from app.services.intervals import IntervalService
+from app.services.rollups import RollupService, ROLLUPS
+from app.services.latency import LatencyService
+from app.services.export import ExportService, EXPORT_FORMATS
+from app.services.live_stats import LiveStats, STATS_WINDOWS
+from app.services.latest_state import LatestStateService
+from app.services.retention import RetentionService, run_retention
+from app.services.scheduler import AvailabilityScheduler, thread_pool_executor
+from app.services.jobs import CheckJobRegistry
+from app.services.sharding import ShardedProbePool
+from app.services.sync import sync_devices, run_device_sync, apply_device_events
+from app.services.http_clients import ServiceClients
 import config
 
 
@@ -45,85 +64,59 @@ def initialize_default_settings(db: Session):
         )
 
 
-# Helper function for background checks
-async def check_all_devices_db():
-    """Run check_all_devices with a new database connection in a non-blocking way"""
-    db = None
-    try:
-        # Create a new DB session
-        from app.models.database import SessionLocal
-        db = SessionLocal()
-
-        print(f"Running scheduled availability checks at {time.strftime('%Y-%m-%d %H:%M:%S')}")
-        # Run the actual check
-        results = await AvailabilityService.check_all_devices(db)
-        print(f"Completed {len(results)} device checks")
-        return {"status": "completed", "count": len(results)}
-
-    except Exception as e:
-        print(f"Error during scheduled availability check: {str(e)}")
-        return {"status": "error", "message": str(e)}
-
-    finally:
-        if db:
-            db.close()
-
-
-# Endpoint for processing device checks
-async def process_device_check(device_id: int):
-    """Process a single device check and update the results"""
-    global background_check_status
-
-    try:
-        # Create new DB session for each check
-        from app.models.database import SessionLocal
-        db = SessionLocal()
-        try:
-            # Perform the check
-            result = await AvailabilityService.check_device_availability(device_id, db)
-
-            # Update results
-            async with check_results_lock:
-                check_results[device_id] = result
-
-            # Update status
-            async with check_results_lock:
-                background_check_status["completed_count"] += 1
-        finally:
-            db.close()
-    except Exception as e:
-        print(f"Error checking device {device_id}: {str(e)}")
-        async with check_results_lock:
-            background_check_status["completed_count"] += 1
-
-
 # Lifespan context manager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create tables if they don't exist
+    # Create tables if they don't exist, and add columns newer than an existing database
+    RetentionService.prepare_storage()
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
 
     # Startup actions
     db = None
     try:
-        # Create DB connection
-        from app.models.database import SessionLocal
+        # Create DB connection; startup work runs before any request is served
         db = SessionLocal()
 
         # Initialize default settings
         initialize_default_settings(db)
 
+        # Build the interval store, rollups, latency sketches and latest states from existing history on first start
+        IntervalService.backfill(db)
+        RollupService.backfill(db)
+        LatencyService.backfill(db)
+        LatestStateService.backfill(db)
+
+        # Seed the live /stats aggregates
+        now = datetime.utcnow()
+        slow_checks = AvailabilityService.get_slowest_checks(db, limit=config.STATS_TOP_K)
+        for window_seconds in STATS_WINDOWS.values():
+            slow_checks += AvailabilityService.get_slowest_checks(
+                db, since=now - timedelta(seconds=window_seconds), limit=config.STATS_TOP_K)
+        async with AsyncSessionLocal() as async_db:
+            latest = await AvailabilityService.get_latest_availability(async_db)
+        LiveStats().load(latest, slow_checks)
+
+        # Start the bulk result writer before any checks run
+        ResultWriter().start()
+
+        # Probe worker processes, if configured, before the scheduler hands out checks
+        ShardedProbePool().start(config.AVAILABILITY_WORKERS)
+
         # Initialize and start scheduler
         scheduler = AvailabilityScheduler()
         scheduler.init_scheduler()
 
-        # Schedule availability checks
+        # Start per-device availability checks
         interval = AvailabilityService.get_check_interval(db)
-        scheduler.schedule_availability_checks(check_all_devices_db, interval_minutes=interval)
+        scheduler.schedule_availability_checks(interval_minutes=interval)
 
-        # Schedule device synchronization every minute
+        # Poll for device changes as a fallback to the pushed device events
         scheduler.schedule_device_sync(run_device_sync, interval_minutes=config.DEFAULT_SYNC_INTERVAL)
 
+        # Expire old raw checks in the background
+        scheduler.schedule_retention(run_retention, interval_minutes=config.RETENTION_INTERVAL_MINUTES)
+
         scheduler.start()
 
         # Initial device sync
@@ -138,6 +131,16 @@ async def lifespan(app: FastAPI):
     # Shutdown actions
     scheduler = AvailabilityScheduler()
     scheduler.stop()
+    await ShardedProbePool().stop()
+
+    # Persist results still waiting in the writer queue
+    await ResultWriter().stop()
+
+    # Close the pooled connections to the main app
+    await ServiceClients().close()
+
+    # Close pooled async connections (aiosqlite keeps a thread per connection)
+    await async_engine.dispose()
 
     # Close thread pool
     thread_pool_executor.shutdown()
@@ -172,188 +175,374 @@ async def root():
 
 
 @app.get("/devices")
-async def get_devices(db: Session = Depends(get_db)):
+async def get_devices(db: AsyncSession = Depends(get_async_db)):
     """Get all monitored devices"""
-    devices = db.query(Device).all()
+    devices = (await db.execute(select(Device))).scalars().all()
     return [{"id": d.id, "name": d.name, "ip_address": d.ip_address, "is_active": d.is_active} for d in devices]
 
 
 @app.post("/sync-devices")
 async def force_device_sync():
-    """Manually trigger device synchronization from main system"""
-    await sync_devices()
+    """Manually trigger a full device synchronization from main system"""
+    await sync_devices(full=True)
     return {"message": "Device synchronization completed"}
 
 
+@app.post("/device-events")
+async def receive_device_events(
+        batch: DeviceEventBatch,
+        x_device_event_secret: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Webhook for device changes pushed by the main system.
+    Only accepted with the shared DEVICE_EVENT_SECRET, as a delete event removes the device's history.
+    Delivery is at least once; applying an event again changes nothing.
+    Events that cannot be applied are listed in rejected, the others are applied.
+    """
+    if not config.DEVICE_EVENT_SECRET:
+        raise HTTPException(status_code=403, detail="Device events are disabled, DEVICE_EVENT_SECRET is not set")
+    if not x_device_event_secret or not hmac.compare_digest(
+            x_device_event_secret.encode(), config.DEVICE_EVENT_SECRET.encode()):
+        raise HTTPException(status_code=401, detail="Invalid device event secret")
+    return await db.run_sync(apply_device_events, batch.events)
+
+
 @app.get("/{device_id}/check")
 async def check_device_availability(
         device_id: int = Path(..., description="The ID of the device to check"),
-        db: Session = Depends(get_db)
+        max_age: Optional[float] = Query(
+            None, ge=0, description="Return the latest result instead if it is at most this many seconds old")
 ):
     """
     Check if a device is available right now.
+
+    Concurrent checks of the same device share one probe.
     """
-    return await AvailabilityService.check_device_availability(device_id, db)
+    return await AvailabilityService.check_device_availability(device_id, max_age=max_age)
+
+
+# Serialized /latest payload of the current version
+latest_body_cache = {}
 
 
 @app.get("/latest")
 async def get_latest_availability(
-        db: Session = Depends(get_db)
+        request: Request,
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get the latest availability state for all devices without running new checks.
+
+    Sends an ETag; polls with a matching If-None-Match get 304 Not Modified.
     """
-    return await AvailabilityService.get_latest_availability(db)
+    etag = f'"{await LatestStateService.get_version(db)}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    # Pollers without a cached copy share one serialized body per version
+    if latest_body_cache.get("etag") != etag:
+        latest = await AvailabilityService.get_latest_availability(db)
+        latest_body_cache.update(etag=etag, body=json.dumps(latest).encode())
+    return Response(content=latest_body_cache["body"], media_type="application/json", headers=headers)
 
 
 @app.get("/results")
 async def get_availability_check_results():
     """
-    Get the current availability check results.
+    Get the results of the most recent check job.
     Returns partial results as they become available.
     """
-    async with check_results_lock:
-        # Return a copy of the results to avoid concurrent modification issues
-        return list(check_results.values())
+    job = CheckJobRegistry().latest()
+    return CheckJobRegistry().results(job["id"]) if job else []
 
 
 @app.get("/check-status")
 async def get_availability_check_status():
     """
-    Get the status of the background availability check process.
+    Get the status of the most recent check job.
     """
-    async with check_results_lock:
-        # Calculate elapsed time if check is in progress
-        if background_check_status["in_progress"] and background_check_status["start_time"]:
-            elapsed_seconds = time.time() - background_check_status["start_time"]
-            estimated_total = 0
-
-            # Estimate completion time based on progress so far
-            if background_check_status["completed_count"] > 0:
-                estimated_total = (elapsed_seconds / background_check_status["completed_count"]) * \
-                                  background_check_status[
-                                      "total_count"]
-
-            return {
-                **background_check_status,
-                "elapsed_seconds": elapsed_seconds,
-                "estimated_total_seconds": estimated_total
-            }
-
-        return background_check_status
+    job = CheckJobRegistry().latest()
+    if job is None:
+        return {"in_progress": False, "completed_count": 0, "total_count": 0, "start_time": None}
+    return job
 
 
 @app.get("/{device_id}/history", response_model=list[AvailabilityCheckResponse])
 async def get_device_availability_history(
         device_id: int = Path(..., description="The ID of the device"),
         limit: int = Query(100, description="Limit the number of records returned"),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get availability check history for a device. Unless RAW_CHECKS is "all",
+    only the checks that changed the device's state are stored.
+    """
+    return await db.run_sync(AvailabilityService.get_device_availability_history, device_id, limit)
+
+
+@app.get("/{device_id}/intervals", response_model=list[AvailabilityIntervalResponse])
+async def get_device_availability_intervals(
+        device_id: int = Path(..., description="The ID of the device"),
+        days: int = Query(7, description="Number of days of history"),
+        limit: int = Query(1000, description="Limit the number of intervals returned"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get availability history as state intervals (one row per stretch of unchanged state).
+    """
+    start = datetime.utcnow() - timedelta(days=days)
+    return await db.run_sync(IntervalService.get_intervals, device_id, start, None, limit)
+
+
+@app.get("/{device_id}/uptime", response_model=UptimeStats)
+async def get_device_uptime(
+        device_id: int = Path(..., description="The ID of the device"),
+        days: int = Query(7, description="Number of days to compute uptime over"),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get availability check history for a device.
+    Get uptime statistics for a device, computed from state intervals.
     """
-    return AvailabilityService.get_device_availability_history(db, device_id, limit)
+    uptime = await db.run_sync(IntervalService.get_uptime, device_id, days)
+    if uptime is None:
+        raise HTTPException(status_code=404, detail="No availability data for this device")
+    return uptime
 
 
 @app.get("/{device_id}/chart-data")
 async def get_device_availability_chart_data(
         device_id: int = Path(..., description="The ID of the device"),
         days: int = Query(7, description="Number of days to show in the chart"),
-        db: Session = Depends(get_db)
+        source: str = Query("auto", description="'raw' checks, a rollup ('minute', 'hour', 'day'), 'intervals' "
+                                                "for state intervals or 'auto' for raw checks or rollups by range"),
+        max_points: int = Query(1000, ge=0, description="Downsample series to this many points (0 for all, "
+                                                          "otherwise at least 3)"),
+        availability_agg: str = Query("min", description="Downsampled availability: 'min' or 'ratio' per bucket"),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get availability data formatted for charts.
     """
-    return AvailabilityService.get_availability_chart_data(db, device_id, days)
+    if source == "intervals":
+        return await db.run_sync(IntervalService.get_chart_data, device_id, days)
+    if source not in ("auto", "raw") and source not in ROLLUPS:
+        raise HTTPException(status_code=400,
+                            detail=f"source must be auto, raw, intervals or one of {', '.join(ROLLUPS)}")
+    return await db.run_sync(
+        AvailabilityService.get_availability_chart_data, device_id, days, max_points, availability_agg, source)
+
+
+@app.get("/trend")
+async def get_availability_trend(
+        resolution: str = Query("hour", description="Bucket size: 'minute', 'hour' or 'day'"),
+        hours: int = Query(24, description="Number of hours to cover"),
+        device_id: Optional[int] = Query(None, description="Limit the trend to one device"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get the availability trend from the rollup tables.
+    """
+    if resolution not in ROLLUPS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(ROLLUPS)}")
+    start = datetime.utcnow() - timedelta(hours=hours)
+    return await db.run_sync(RollupService.get_trend, resolution, start, None, device_id)
+
+
+@app.get("/latency")
+async def get_latency_percentiles(
+        hours: int = Query(24, description="Number of hours to cover"),
+        per_device: bool = Query(False, description="Also list the percentiles of every device"),
+        limit: Optional[int] = Query(None, description="Only the devices with the highest p99"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get fleet-wide p50/p95/p99 response times from the latency sketches.
+    """
+    start = datetime.utcnow() - timedelta(hours=hours)
+    result = await db.run_sync(LatencyService.get_percentiles, start)
+    if per_device:
+        result["devices"] = await db.run_sync(LatencyService.get_device_percentiles, start, None, limit)
+    return result
+
+
+@app.get("/{device_id}/latency")
+async def get_device_latency_percentiles(
+        device_id: int = Path(..., description="The ID of the device"),
+        hours: int = Query(24, description="Number of hours to cover"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get p50/p95/p99 response times of a device from the latency sketches.
+    """
+    start = datetime.utcnow() - timedelta(hours=hours)
+    return await db.run_sync(LatencyService.get_percentiles, start, None, device_id)
+
+
+@app.get("/storage/stats")
+async def get_storage_stats(db: AsyncSession = Depends(get_async_db)):
+    """
+    Get row counts of the raw check table and the interval store.
+    """
+    return await db.run_sync(IntervalService.get_storage_stats)
+
+
+@app.get("/export")
+async def export_availability_history(
+        format: str = Query("csv", description="File format: 'csv', 'arrow' (Arrow IPC file) or 'parquet'"),
+        table: str = Query("checks", description="Raw 'checks' or a rollup: 'minute', 'hour' or 'day'"),
+        start: Optional[datetime] = Query(None, description="Export from this time on (inclusive)"),
+        end: Optional[datetime] = Query(None, description="Export up to this time (exclusive)"),
+        device_id: Optional[List[int]] = Query(None, description="Limit the export to these devices"),
+):
+    """
+    Stream availability history as a file, read in chunks with bounded memory.
+    """
+    try:
+        ExportService.check_format(format, table)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Stored timestamps are naive UTC
+    if start is not None and start.tzinfo is not None:
+        start = start.astimezone(timezone.utc).replace(tzinfo=None)
+    if end is not None and end.tzinfo is not None:
+        end = end.astimezone(timezone.utc).replace(tzinfo=None)
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"availability_{table}_{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.{extension}"
+    # A plain iterator is run on the thread pool by StreamingResponse, off the event loop
+    return StreamingResponse(
+        ExportService.stream(format, table, start=start, end=end, device_ids=device_id),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 
 @app.post("/run-checks")
 async def run_availability_checks(
-        background_tasks: BackgroundTasks,
         max_concurrent: int = Query(config.MAX_CONCURRENT_CHECKS, description="Maximum number of concurrent checks"),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Manually trigger availability checks for all active devices.
     """
-    global background_check_status, check_results
-
     # If a check is already running, return information about it
-    if background_check_status["in_progress"]:
+    running = CheckJobRegistry().running()
+    if running:
         return {
             "message": "Availability checks already in progress",
-            "status": background_check_status
+            "status": running
         }
 
-    # Reset the results
-    async with check_results_lock:
-        check_results = {}
-
-    # Get device IDs to check
-    device_count = db.query(Device).filter(Device.is_active == True).count()
-    device_ids = [d.id for d in db.query(Device.id).filter(Device.is_active == True).all()]
-
-    # Update the status
-    async with check_results_lock:
-        background_check_status = {
-            "in_progress": True,
-            "completed_count": 0,
-            "total_count": device_count,
-            "start_time": time.time()
-        }
+    device_ids = (await db.execute(select(Device.id).where(Device.is_active == True))).scalars().all()
+    job = CheckJobRegistry().start(device_ids, max_concurrent=max_concurrent)
 
-    async def run_checks_in_background():
-        global background_check_status
+    return {
+        "message": f"Started availability checks for {len(device_ids)} devices with max concurrency {max_concurrent}",
+        "status": job
+    }
 
-        try:
-            # Create a semaphore to limit concurrency
-            semaphore = asyncio.Semaphore(max_concurrent)
 
-            async def check_device_with_semaphore(device_id):
-                async with semaphore:
-                    await process_device_check(device_id)
+@app.post("/jobs", status_code=202)
+async def create_check_job(
+        job: CheckJobCreate = Body(CheckJobCreate()),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Start a check job for a set of devices (all active devices by default).
+    Several jobs can run at the same time.
+    """
+    query = select(Device.id).where(Device.is_active == True)
+    if job.device_ids is not None:
+        query = query.where(Device.id.in_(job.device_ids))
+    device_ids = (await db.execute(query)).scalars().all()
+    if job.device_ids is not None and not device_ids:
+        raise HTTPException(status_code=404, detail="None of the devices exist or are active")
+    return CheckJobRegistry().start(device_ids, max_concurrent=job.max_concurrent)
 
-            # Create tasks for all devices
-            tasks = [check_device_with_semaphore(device_id) for device_id in device_ids]
 
-            # Run all tasks concurrently with the semaphore
-            if tasks:
-                await asyncio.gather(*tasks)
-        except Exception as e:
-            print(f"Error in background availability check: {str(e)}")
-        finally:
-            # Mark the process as complete
-            async with check_results_lock:
-                background_check_status["in_progress"] = False
+@app.get("/jobs")
+async def get_check_jobs():
+    """
+    Get running and retained check jobs, newest first.
+    """
+    return CheckJobRegistry().jobs()
 
-    # Start the checks in the background
-    background_tasks.add_task(run_checks_in_background)
 
-    return {
-        "message": f"Started availability checks for {len(device_ids)} devices with max concurrency {max_concurrent}",
-        "status": background_check_status
-    }
+@app.get("/jobs/{job_id}")
+async def get_check_job(job_id: str = Path(..., description="The ID of the job")):
+    """
+    Get the progress of a check job.
+    """
+    job = CheckJobRegistry().status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}/results")
+async def get_check_job_results(job_id: str = Path(..., description="The ID of the job")):
+    """
+    Get the results a check job has produced so far.
+    """
+    results = CheckJobRegistry().results(job_id)
+    if results is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return results
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_check_job_events(job_id: str = Path(..., description="The ID of the job")):
+    """
+    Stream a check job as server-sent events: a "result" event per device
+    (earlier results are replayed first) and a final "done" event with the
+    job status.
+    """
+    if CheckJobRegistry().status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async for event, data in CheckJobRegistry().events(job_id):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_check_job(job_id: str = Path(..., description="The ID of the job")):
+    """
+    Cancel a running check job. Results produced so far are kept.
+    """
+    job = await CheckJobRegistry().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 
 @app.get("/check-all")
 async def check_all_devices_availability(
-        max_concurrent: int = Query(config.MAX_CONCURRENT_CHECKS, description="Maximum number of concurrent checks"),
-        db: Session = Depends(get_db)
+        max_concurrent: int = Query(config.MAX_CONCURRENT_CHECKS, description="Maximum number of concurrent checks")
 ):
     """
     Check availability for all active devices with controlled concurrency.
     """
-    return await AvailabilityService.check_all_devices(db, max_concurrent)
+    return await AvailabilityService.check_all_devices(max_concurrent)
 
 
 @app.get("/settings")
 async def get_availability_settings(
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get current availability monitoring settings.
     """
-    interval = AvailabilityService.get_check_interval(db)
+    interval = await db.run_sync(AvailabilityService.get_check_interval)
     return {
         "check_interval_minutes": interval
     }
@@ -362,16 +551,16 @@ async def get_availability_settings(
 @app.post("/settings")
 async def update_availability_settings(
         settings: AvailabilitySettingsUpdate = Body(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Update availability monitoring settings.
     """
-    AvailabilityService.set_check_interval(db, settings.check_interval_minutes)
+    await db.run_sync(AvailabilityService.set_check_interval, settings.check_interval_minutes)
 
     # Update scheduler with new interval
     scheduler = AvailabilityScheduler()
-    scheduler.schedule_availability_checks(check_all_devices_db, interval_minutes=settings.check_interval_minutes)
+    scheduler.schedule_availability_checks(interval_minutes=settings.check_interval_minutes)
 
     return {
         "message": f"Settings updated. New check interval: {settings.check_interval_minutes} minutes",
@@ -379,11 +568,153 @@ async def update_availability_settings(
     }
 
 
+@app.get("/probe-policies", response_model=list[ProbePolicyResponse])
+async def get_probe_policies(db: AsyncSession = Depends(get_async_db)):
+    """
+    Get all probe policies.
+    """
+    return await db.run_sync(ProbeService.get_policies)
+
+
+@app.post("/probe-policies", response_model=ProbePolicyResponse)
+async def create_probe_policy(
+        policy: ProbePolicyCreate = Body(...),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Create a probe policy (probe methods, order, parallel/sequential, quorum and timeout).
+    """
+    created = await db.run_sync(ProbeService.save_policy, policy)
+    await db.run_sync(DeviceCheckScheduler().refresh_devices)
+    return created
+
+
+@app.put("/probe-policies/{policy_id}", response_model=ProbePolicyResponse)
+async def update_probe_policy(
+        policy_id: int = Path(..., description="The ID of the probe policy"),
+        policy: ProbePolicyCreate = Body(...),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Replace a probe policy.
+    """
+    updated = await db.run_sync(ProbeService.save_policy, policy, policy_id)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Probe policy not found")
+    await db.run_sync(DeviceCheckScheduler().refresh_devices)
+    return updated
+
+
+@app.delete("/probe-policies/{policy_id}")
+async def delete_probe_policy(
+        policy_id: int = Path(..., description="The ID of the probe policy"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Delete a probe policy. Devices using it fall back to their group or the default policy.
+    """
+    if not await db.run_sync(ProbeService.delete_policy, policy_id):
+        raise HTTPException(status_code=404, detail="Probe policy not found")
+    await db.run_sync(DeviceCheckScheduler().refresh_devices)
+    return {"message": f"Probe policy {policy_id} deleted"}
+
+
+@app.put("/{device_id}/probe-policy")
+async def assign_device_probe_policy(
+        device_id: int = Path(..., description="The ID of the device"),
+        assignment: DeviceProbeAssignment = Body(...),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Assign a probe policy and/or probe group to a device.
+    """
+    device = await db.run_sync(ProbeService.assign_device, device_id, assignment)
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    await db.run_sync(DeviceCheckScheduler().refresh_devices)
+    return {
+        "device_id": device.id,
+        "probe_policy_id": device.probe_policy_id,
+        "probe_group": device.probe_group,
+        "effective_policy": await db.run_sync(ProbeService.resolve_policy, device)
+    }
+
+
+@app.put("/{device_id}/schedule")
+async def update_device_schedule(
+        device_id: int = Path(..., description="The ID of the device"),
+        schedule: DeviceScheduleUpdate = Body(...),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Set the check tier and/or per-device check interval of a device.
+    """
+    device = await db.get(Device, device_id)
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+
+    for key, value in schedule.model_dump(exclude_unset=True).items():
+        setattr(device, key, value)
+    await db.commit()
+
+    await db.run_sync(DeviceCheckScheduler().refresh_devices)
+    return {
+        "device_id": device.id,
+        "check_tier": device.check_tier,
+        "check_interval_seconds": device.check_interval_seconds
+    }
+
+
+@app.get("/retention/status")
+async def get_retention_status():
+    """
+    Get the retention settings and the summary of the last retention pass.
+    """
+    return {
+        "raw_retention_days": config.RAW_RETENTION_DAYS,
+        "minute_rollup_retention_days": config.MINUTE_ROLLUP_RETENTION_DAYS,
+        "partitioning": config.CHECK_PARTITIONING,
+        "last_run": RetentionService.last_run or None
+    }
+
+
+@app.get("/writer/stats")
+async def get_result_writer_stats():
+    """
+    Get throughput of the bulk result writer (rows per second, batches, queue depth).
+    """
+    return ResultWriter().stats()
+
+
+@app.get("/schedule")
+async def get_check_schedule():
+    """
+    Get the per-device check schedule, soonest first.
+    """
+    return DeviceCheckScheduler().snapshot()
+
+
+@app.get("/shards")
+async def get_probe_shards():
+    """
+    Get the probe worker processes and how many devices each one owns.
+    """
+    return ShardedProbePool().stats()
+
+
+@app.get("/schedule/metrics")
+async def get_check_schedule_metrics():
+    """
+    Get timer wheel metrics: tick lag and scheduled checks per slot.
+    """
+    return DeviceCheckScheduler().metrics()
+
+
 # In the monitoring microservice (app/main.py)
 @app.get("/stats")
 async def get_monitoring_statistics(
         time_range: str = Query(None, description="Time range filter: '30m', '1h', '6h', '24h', '7d' or 'all'"),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get comprehensive monitoring statistics and system overview.
@@ -412,51 +743,40 @@ async def get_monitoring_statistics(
             # 'all' doesn't set a start_time, so we get all data
 
         # Get total devices count
-        total_devices = db.query(func.count(Device.id)).scalar()
-        active_devices = db.query(func.count(Device.id)).filter(Device.is_active == True).scalar()
-
-        # Get latest availability data
-        latest_availability = await AvailabilityService.get_latest_availability(db)
-
-        # Calculate current availability metrics
-        devices_up = sum(1 for device in latest_availability if device["is_available"])
-        devices_down = sum(1 for device in latest_availability if not device["is_available"])
-
-        # Calculate availability percentage
-        availability_rate = (devices_up / len(latest_availability)) * 100 if latest_availability else 0
-
-        # Get average response time for available devices
-        response_times = [device["response_time"] for device in latest_availability
-                          if device["is_available"] and device["response_time"]]
-        avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-
-        # Get check methods distribution
-        check_methods = {}
-        for device in latest_availability:
-            method = device["check_method"]
-            check_methods[method] = check_methods.get(method, 0) + 1
+        total_devices = (await db.execute(select(func.count(Device.id)))).scalar()
+        active_devices = (await db.execute(
+            select(func.count(Device.id)).where(Device.is_active == True))).scalar()
+
+        # Real-time parts come from the live in-memory aggregates
+        live = LiveStats().summary()
+        devices_up = live["devices_available"]
+        devices_down = live["devices_unavailable"]
+        availability_rate = live["availability_rate"]
+        avg_response_time = live["avg_response_time_ms"]
+        check_methods = live["check_methods"]
 
         # Determine the time range for recent errors
         error_time_range = start_time if start_time else (datetime.utcnow() - timedelta(days=1))
-        error_query = db.query(AvailabilityCheck).filter(
+        error_query = select(AvailabilityCheck, Device.name).join(
+            Device, Device.id == AvailabilityCheck.device_id
+        ).where(
             AvailabilityCheck.is_available == False,
             AvailabilityCheck.timestamp >= error_time_range,
             AvailabilityCheck.error_message != None
         ).order_by(AvailabilityCheck.timestamp.desc())
 
         # Limit error records to reduce response size
-        recent_errors = error_query.limit(50).all()
-
-        error_summary = []
-        for error in recent_errors:
-            device = db.query(Device).filter(Device.id == error.device_id).first()
-            if device:
-                error_summary.append({
-                    "device_id": error.device_id,
-                    "device_name": device.name,
-                    "error_message": error.error_message,
-                    "timestamp": error.timestamp.isoformat()
-                })
+        recent_errors = (await db.execute(error_query.limit(50))).all()
+
+        error_summary = [
+            {
+                "device_id": error.device_id,
+                "device_name": device_name,
+                "error_message": error.error_message,
+                "timestamp": error.timestamp.isoformat()
+            }
+            for error, device_name in recent_errors
+        ]
 
         # Calculate hourly availability trend
         # Adjust the number of hours based on time range
@@ -473,60 +793,27 @@ async def get_monitoring_statistics(
             elif time_range == "7d":
                 hours_to_show = 24 * 7
 
-        hourly_stats = []
-        for hour_offset in range(hours_to_show, -1, -1):
-            hour_start = datetime.utcnow() - timedelta(hours=hour_offset)
-            hour_end = hour_start + timedelta(hours=1)
-
-            checks_query = db.query(AvailabilityCheck).filter(
-                AvailabilityCheck.timestamp >= hour_start,
-                AvailabilityCheck.timestamp < hour_end
-            )
-
-            checks = checks_query.all()
-
-            available_count = sum(1 for check in checks if check.is_available)
-            total_count = len(checks)
+        hourly_stats = [
+            {
+                "hour": bucket["bucket_start"].strftime("%Y-%m-%d %H:00"),
+                "availability_rate": bucket["availability_rate"],
+                "check_count": bucket["check_count"]
+            }
+            for bucket in await db.run_sync(
+                RollupService.get_trend, "hour", datetime.utcnow() - timedelta(hours=hours_to_show))
+        ]
 
-            hourly_stats.append({
-                "hour": (datetime.utcnow() - timedelta(hours=hour_offset)).strftime("%Y-%m-%d %H:00"),
-                "availability_rate": (available_count / total_count * 100) if total_count > 0 else 0,
-                "check_count": total_count
-            })
+        # Fleet response time percentiles over the time range from the latency sketches
+        latency = await db.run_sync(LatencyService.get_percentiles, start_time or datetime(1970, 1, 1))
 
         # Get monitoring settings
-        interval = AvailabilityService.get_check_interval(db)
+        interval = await db.run_sync(AvailabilityService.get_check_interval)
 
         # Check if any background tasks are running
-        async with check_results_lock:
-            has_running_checks = background_check_status["in_progress"]
+        has_running_checks = CheckJobRegistry().running() is not None
 
         # Get slowest devices based on the time range
-        slowest_devices_query = db.query(AvailabilityCheck).filter(
-            AvailabilityCheck.is_available == True,
-            AvailabilityCheck.response_time != None
-        )
-
-        if start_time:
-            slowest_devices_query = slowest_devices_query.filter(AvailabilityCheck.timestamp >= start_time)
-
-        slowest_devices_query = slowest_devices_query.order_by(
-            AvailabilityCheck.response_time.desc()
-        ).limit(5)
-
-        slowest_devices = []
-        for check in slowest_devices_query.all():
-            device = db.query(Device).filter(Device.id == check.device_id).first()
-            if device:
-                slowest_devices.append({
-                    "device_id": check.device_id,
-                    "device_name": device.name,
-                    "is_available": check.is_available,
-                    "response_time": check.response_time,
-                    "check_method": check.check_method,
-                    "timestamp": check.timestamp.isoformat(),
-                    "error": check.error_message
-                })
+        slowest_devices = LiveStats().slowest(time_range)
 
         # Prepare the response
         return {
@@ -549,10 +836,18 @@ async def get_monitoring_statistics(
                 "availability_rate": round(availability_rate, 2),
                 "avg_response_time_ms": round(avg_response_time, 2) if avg_response_time else None
             },
+            "latency_percentiles": {
+                "p50_ms": latency["p50"],
+                "p95_ms": latency["p95"],
+                "p99_ms": latency["p99"],
+                "sample_count": latency["count"],
+                "resolution": latency["resolution"]
+            },
             "check_methods": check_methods,
             "hourly_trend": hourly_stats,
             "recent_errors": error_summary,
-            "top_slowest_devices": slowest_devices
+            "top_slowest_devices": slowest_devices,
+            "http_clients": ServiceClients().stats()
         }
     except Exception as e:
         print(f"Error generating monitoring statistics: {str(e)}")
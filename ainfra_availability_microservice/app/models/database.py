@@ -1,5 +1,6 @@
 # app/models/database.py
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import config
@@ -13,8 +14,18 @@ engine = create_engine(
     pool_timeout=60
 )
 
+# Async engine for request handlers and services running on the event loop.
+# aiosqlite runs a thread per connection, keep the pool small on SQLite
+async_engine = create_async_engine(
+    config.ASYNC_DATABASE_URL,
+    pool_size=config.ASYNC_DB_POOL_SIZE,
+    max_overflow=config.ASYNC_DB_MAX_OVERFLOW,
+    pool_timeout=60
+)
+
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
 
 # Base class for models
 Base = declarative_base()
@@ -25,4 +36,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Dependency to get an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
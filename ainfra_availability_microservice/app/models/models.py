@@ -1,6 +1,6 @@
 # app/models/models.py
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey, func, and_
-from sqlalchemy.orm import relationship, Session
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey, JSON, Text, func, and_
+from sqlalchemy.orm import relationship, Session, declared_attr
 from datetime import datetime
 import pytz
 
@@ -16,7 +16,40 @@ class Device(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = Column(Boolean, default=True)
 
+    # Local monitoring configuration, not overwritten by device sync
+    probe_group = Column(String(100), nullable=True, index=True)
+    probe_policy_id = Column(Integer, ForeignKey("probe_policies.id"), nullable=True)
+    check_tier = Column(String(20), nullable=True)  # Key of config.CHECK_TIER_INTERVALS
+    check_interval_seconds = Column(Integer, nullable=True)  # Overrides the tier interval
+
     availability_checks = relationship("AvailabilityCheck", back_populates="device", cascade="all, delete-orphan")
+    probe_policy = relationship("ProbePolicy")
+    probe_memo = relationship("DeviceProbeMemo", uselist=False, cascade="all, delete-orphan")
+
+
+class ProbePolicy(Base):
+    __tablename__ = "probe_policies"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), unique=True, nullable=False)
+    group_name = Column(String(100), unique=True, nullable=True, index=True)  # Applies to devices with this probe_group
+    probes = Column(JSON, nullable=False)  # e.g. [{"method": "tcp", "port": 22}, {"method": "icmp"}]
+    mode = Column(String(20), default="parallel")  # "parallel" or "sequential"
+    quorum = Column(Integer, default=1)  # Successful probes needed to call the device available
+    probe_timeout = Column(Float, default=1.0)  # seconds
+    is_default = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def as_policy(self):
+        """Return a plain dict so probing does not need the ORM session"""
+        return {
+            "name": self.name,
+            "probes": list(self.probes or []),
+            "mode": self.mode or "parallel",
+            "quorum": self.quorum or 1,
+            "probe_timeout": self.probe_timeout or 1.0,
+        }
 
 
 class AvailabilityCheck(Base):
@@ -29,6 +62,7 @@ class AvailabilityCheck(Base):
     response_time = Column(Float, nullable=True)
     check_method = Column(String(50), nullable=False)
     error_message = Column(String(255), nullable=True)
+    probe_policy = Column(String(100), nullable=True)  # Name of the policy that produced this result
 
     device = relationship("Device", back_populates="availability_checks")
 
@@ -39,6 +73,104 @@ class AvailabilityCheck(Base):
         return local_dt.strftime("%Y-%m-%d %H:%M:%S %Z")
 
 
+class AvailabilityInterval(Base):
+    """
+    Run-length encoded availability history: one row per stretch of
+    unchanged state. Unchanged checks extend the open interval, a state
+    flip closes it and opens a new one.
+    """
+    __tablename__ = "availability_intervals"
+
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(Integer, ForeignKey("devices.id"), index=True)
+    is_available = Column(Boolean, nullable=False)
+    start_time = Column(DateTime, nullable=False, index=True)  # First check in this state
+    end_time = Column(DateTime, nullable=False, index=True)  # Last check in this state so far
+    is_open = Column(Boolean, default=True, index=True)
+    sample_count = Column(Integer, default=1)
+    latency_count = Column(Integer, default=0)  # Samples that had a response time
+    latency_min = Column(Float, nullable=True)
+    latency_avg = Column(Float, nullable=True)
+    latency_max = Column(Float, nullable=True)
+
+    device = relationship("Device")
+
+
+class DeviceLatestState(Base):
+    """Most recent check of each device, upserted by the result writer"""
+    __tablename__ = "device_latest_state"
+
+    device_id = Column(Integer, ForeignKey("devices.id"), primary_key=True)
+    timestamp = Column(DateTime, nullable=False)
+    is_available = Column(Boolean, default=False)
+    response_time = Column(Float, nullable=True)
+    check_method = Column(String(50), nullable=False)
+    error_message = Column(String(255), nullable=True)
+    probe_policy = Column(String(100), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)  # When this row last changed
+
+
+class RollupMixin:
+    """
+    Per-device availability counters for one time bucket, kept up to date
+    by the result writer. Averages are latency_sum / latency_count.
+    """
+    @declared_attr
+    def device_id(cls):
+        return Column(Integer, ForeignKey("devices.id"), primary_key=True)
+
+    bucket_start = Column(DateTime, primary_key=True, index=True)  # UTC, truncated to the bucket size
+    checks = Column(Integer, default=0)
+    ups = Column(Integer, default=0)
+    latency_count = Column(Integer, default=0)  # Checks that had a response time
+    latency_sum = Column(Float, default=0.0)
+    latency_max = Column(Float, nullable=True)
+
+
+class AvailabilityRollupMinute(RollupMixin, Base):
+    __tablename__ = "availability_rollup_minute"
+
+
+class AvailabilityRollupHour(RollupMixin, Base):
+    __tablename__ = "availability_rollup_hour"
+
+
+class AvailabilityRollupDay(RollupMixin, Base):
+    __tablename__ = "availability_rollup_day"
+
+
+class LatencySketch(Base):
+    """
+    Mergeable response time sketch (app.utils.sketch) for one time bucket,
+    per device (hour and day buckets) or for the whole fleet (device_id 0,
+    minute, hour and day buckets).
+    """
+    __tablename__ = "latency_sketches"
+
+    resolution = Column(String(10), primary_key=True)  # "minute", "hour" or "day"
+    device_id = Column(Integer, primary_key=True)  # 0 = all devices
+    bucket_start = Column(DateTime, primary_key=True, index=True)  # UTC, truncated to the bucket size
+    count = Column(Integer, default=0)
+    sketch = Column(Text, nullable=False)
+
+
+class DeviceProbeMemo(Base):
+    """Last probe that reached a device, tried first on the next check"""
+    __tablename__ = "device_probe_memo"
+
+    device_id = Column(Integer, ForeignKey("devices.id"), primary_key=True)
+    method = Column(String(20), nullable=False)  # "tcp" or "icmp"
+    port = Column(Integer, nullable=True)
+    hits = Column(Integer, default=0)  # Consecutive checks decided by this probe
+    last_success_at = Column(DateTime, default=datetime.utcnow)
+
+    def as_probe(self):
+        probe = {"method": self.method}
+        if self.port is not None:
+            probe["port"] = self.port
+        return probe
+
+
 class MonitoringSettings(Base):
     __tablename__ = "monitoring_settings"
 
@@ -0,0 +1,55 @@
+# app/models/schema.py
+"""
+Columns added to tables that already existed in earlier releases.
+
+create_all only creates missing tables, so a database built by an older
+version gets these columns through ALTER TABLE ... ADD COLUMN at startup.
+Only nullable columns without defaults belong here: every supported
+database adds those in place without rewriting the table.
+"""
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app.models.database import engine as default_engine
+from app.models.models import Device, AvailabilityCheck
+
+# (table, column name), oldest first
+ADDED_COLUMNS = [
+    (Device.__table__, "probe_group"),
+    (Device.__table__, "probe_policy_id"),
+    (AvailabilityCheck.__table__, "probe_policy"),
+    (Device.__table__, "check_tier"),
+    (Device.__table__, "check_interval_seconds"),
+]
+
+
+def upgrade_schema(engine: Engine = None) -> List[str]:
+    """Add the missing columns (and their indexes) to existing tables; returns "table.column" for each"""
+    engine = engine or default_engine
+    added = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing = {}
+        for table, column_name in ADDED_COLUMNS:
+            if not inspector.has_table(table.name):
+                continue  # create_all makes it complete
+            if table.name not in existing:
+                existing[table.name] = {column["name"] for column in inspector.get_columns(table.name)}
+            if column_name in existing[table.name]:
+                continue
+
+            column = table.c[column_name]
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column_name} {column.type.compile(dialect=conn.dialect)}"
+            for foreign_key in column.foreign_keys:
+                ddl += f" REFERENCES {foreign_key.column.table.name} ({foreign_key.column.name})"
+            conn.execute(text(ddl))
+            for index in table.indexes:
+                if [c.name for c in index.columns] == [column_name]:
+                    index.create(conn)
+            added.append(f"{table.name}.{column_name}")
+
+    if added:
+        print(f"Added columns to existing tables: {', '.join(added)}")
+    return added
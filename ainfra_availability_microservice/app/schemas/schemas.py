@@ -1,8 +1,10 @@
 # app/schemas/schemas.py
-from pydantic import BaseModel, Field, IPvAnyAddress
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field, IPvAnyAddress, field_validator, model_validator
+from typing import List, Dict, Any, Optional, Literal
 from datetime import datetime
 
+import config
+
 # Availability Check schemas
 class AvailabilityCheckBase(BaseModel):
     device_id: int
@@ -10,6 +12,7 @@ class AvailabilityCheckBase(BaseModel):
     response_time: Optional[float] = None
     check_method: str
     error_message: Optional[str] = None
+    probe_policy: Optional[str] = None
 
 
 class AvailabilityCheckCreate(AvailabilityCheckBase):
@@ -30,6 +33,22 @@ class AvailabilitySettingsUpdate(BaseModel):
                                        description="How often to check device availability (in minutes)")
 
 
+class AvailabilityIntervalResponse(BaseModel):
+    id: int
+    device_id: int
+    is_available: bool
+    start_time: datetime
+    end_time: datetime
+    is_open: bool
+    sample_count: int
+    latency_min: Optional[float] = None
+    latency_avg: Optional[float] = None
+    latency_max: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+
 class UptimeStats(BaseModel):
     device_id: int
     uptime_percent: float
@@ -59,4 +78,94 @@ class DeviceResponse(BaseModel):
     is_active: bool
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+# Probe policy schemas
+class ProbeSpec(BaseModel):
+    method: Literal["tcp", "icmp"]
+    port: Optional[int] = Field(None, ge=1, le=65535, description="Required for tcp probes")
+    count: Optional[int] = Field(None, ge=1, le=10, description="icmp: pings that all have to answer (default 1)")
+
+    @model_validator(mode="after")
+    def check_port(self):
+        if self.method == "tcp" and self.port is None:
+            raise ValueError("tcp probes require a port")
+        if self.method == "tcp" and self.count is not None:
+            raise ValueError("count only applies to icmp probes")
+        return self
+
+
+class ProbePolicyBase(BaseModel):
+    name: str
+    group_name: Optional[str] = Field(None, description="Apply to devices with this probe group")
+    probes: List[ProbeSpec] = Field(..., min_length=1)
+    mode: Literal["parallel", "sequential"] = "parallel"
+    quorum: int = Field(1, ge=1, description="Successful probes needed to call the device available")
+    probe_timeout: float = Field(1.0, gt=0, le=30, description="Per-probe timeout in seconds")
+    is_default: bool = False
+
+    @model_validator(mode="after")
+    def check_quorum(self):
+        if self.quorum > len(self.probes):
+            raise ValueError("quorum cannot be larger than the number of probes")
+        return self
+
+
+class ProbePolicyCreate(ProbePolicyBase):
+    pass
+
+
+class ProbePolicyResponse(ProbePolicyBase):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+
+class DeviceProbeAssignment(BaseModel):
+    probe_policy_id: Optional[int] = None
+    probe_group: Optional[str] = None
+
+
+class DeviceScheduleUpdate(BaseModel):
+    check_tier: Optional[str] = Field(None, description="Named check tier, e.g. 'critical' or 'low'")
+    check_interval_seconds: Optional[int] = Field(None, gt=0, le=86400,
+                                                  description="Per-device check interval, overrides the tier")
+
+    @field_validator("check_tier")
+    @classmethod
+    def check_tier_exists(cls, tier):
+        if tier is not None and tier not in config.CHECK_TIER_INTERVALS:
+            raise ValueError(f"check_tier must be one of {', '.join(config.CHECK_TIER_INTERVALS)}")
+        return tier
+
+
+class CheckJobCreate(BaseModel):
+    device_ids: Optional[List[int]] = Field(None, description="Devices to check; all active devices if omitted")
+    max_concurrent: int = Field(50, gt=0, le=1000, description="Maximum number of concurrent checks")
+
+
+class DeviceEvent(BaseModel):
+    event_type: Literal["device_created", "device_updated", "device_deleted"]
+    device_id: int
+    occurred_at: Optional[datetime] = None
+    device: Optional[Dict[str, Any]] = Field(None, description="Full device state; absent for deletions")
+
+    @model_validator(mode="after")
+    def check_device(self):
+        if self.event_type == "device_deleted":
+            return self
+        if not self.device:
+            raise ValueError("created and updated events need the device state")
+        missing = [key for key in ("id", "name", "ip_address") if not self.device.get(key)]
+        if missing:
+            raise ValueError(f"device state lacks {', '.join(missing)}")
+        if self.device["id"] != self.device_id:
+            raise ValueError("device.id does not match device_id")
+        return self
+
+
+class DeviceEventBatch(BaseModel):
+    # Validated one by one (DeviceEvent), so a malformed event is rejected alone
+    events: List[Any]
@@ -1,13 +1,21 @@
 # app/services/availability.py
-from sqlalchemy import func, and_
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import asyncio
 import time
-from typing import List, Dict, Any
-
-from app.models.models import Device, AvailabilityCheck, MonitoringSettings
-from app.utils.ping import ping_device_async
+from typing import List, Dict, Any, Optional
+
+from app.models.database import AsyncSessionLocal
+from app.models.models import (
+    Device, AvailabilityCheck, AvailabilityInterval, DeviceLatestState, MonitoringSettings
+)
+from app.services.probe import ProbeService
+from app.services.writer import ResultWriter
+from app.services.rollups import RollupService, ROLLUPS, truncate
+from app.services.live_stats import LiveStats
+from app.utils.downsample import bucket_bounds, iter_buckets, lttb_stream
 import config
 
 class AvailabilityService:
@@ -35,220 +43,222 @@ class AvailabilityService:
         )
 
     @staticmethod
-    async def _check_standard_ports(ip_address, timeout=1.0):
-        """Check if any standard ports are open on the device"""
-        start_time = time.time()
-
-        # Check standard ports
-        async def check_port(ip, port):
-            try:
-                # Use asyncio's create_connection which is non-blocking
-                future = asyncio.open_connection(host=str(ip), port=port)
-                # Set timeout for the connection attempt
-                reader, writer = await asyncio.wait_for(future, timeout=timeout)
-                # Close the connection if successful
-                writer.close()
-                await writer.wait_closed()
-                print(f"Successfully connected to {ip}:{port}")
-                return True
-            except (asyncio.TimeoutError, ConnectionRefusedError, OSError):
-                return False
-
-        # Test standard ports
-        test_ports = [80, 22, 443, 8080, 3389]
-
-        # Create tasks for all ports and run them concurrently
-        tasks = [check_port(ip_address, port) for port in test_ports]
-        results = await asyncio.gather(*tasks)
-
-        # If any port is open, the device is available
-        is_available = any(results)
-        response_time = (time.time() - start_time) * 1000 if is_available else None  # ms
-
-        return {
-            "is_available": is_available,
-            "response_time": response_time
-        }
-
-    @staticmethod
-    async def check_device_availability(device_id: int, db: Session) -> Dict[str, Any]:
-        """Check if a device is available using reliable ping and port checks."""
-        device = db.query(Device).filter(Device.id == device_id).first()
-        if not device:
-            return {"error": "Device not found"}
-
-        start_time = time.time()
-        is_available = False
-        error_message = None
-        response_time = None
-        check_method = "unknown"
+    async def probe_target(target: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Probe a device loaded by ProbeService.load_targets.
 
-        check_id = f"{device_id}-{int(time.time())}"
-        print(f"[{check_id}] Checking availability for: {device.name} ({device.ip_address})")
+        Touches no database session; the result carries everything the
+        result writer needs to persist it.
+        """
+        policy = target["policy"]
+        check_id = f"{target['device_id']}-{int(time.time())}"
+        print(f"[{check_id}] Checking availability for: {target['device_name']} ({target['ip_address']}) "
+              f"with policy '{policy['name']}'")
 
+        successful_probe = None
         try:
-            # 1. Try port check first
-            print(f"[{check_id}] Trying port check first...")
-            port_check_result = await AvailabilityService._check_standard_ports(device.ip_address)
-
-            if port_check_result["is_available"]:
-                is_available = True
-                response_time = port_check_result["response_time"]
-                check_method = "port_check"
-                print(f"[{check_id}] Port check SUCCESS for {device.name}")
-            else:
-                print(f"[{check_id}] Port check FAILED for {device.name}, trying ping...")
-
-                # 2. Try ping
-                successful_pings = 0
-                total_response_time = 0
-
-                # Multiple ping attempts for reliability
-                for attempt in range(3):
-                    print(f"[{check_id}] Ping attempt {attempt + 1}/3 for {device.name}")
-
-                    # Run ping in thread pool
-                    ping_success, ping_response_time = await ping_device_async(device.ip_address)
-
-                    if ping_success:
-                        successful_pings += 1
-                        if ping_response_time:
-                            total_response_time += ping_response_time
-
-                # Need at least two successful pings
-                if successful_pings > 2:
-                    is_available = True
-                    response_time = total_response_time / successful_pings if successful_pings > 0 else None
-                    check_method = "ping"
-                    print(f"[{check_id}] Ping SUCCESS for {device.name} ({successful_pings}/3 attempts)")
-                else:
-                    is_available = False
-                    error_message = "Device is not reachable via ports or ping"
-                    check_method = "all_failed"
-                    print(f"[{check_id}] Both methods FAILED for {device.name}")
-
+            outcome = await ProbeService.evaluate(target["ip_address"], policy, preferred=target["preferred"])
+            successful_probe = outcome["successful_probe"]
+            is_available = outcome["is_available"]
+            response_time = outcome["response_time"]
+            check_method = outcome["check_method"]
+            error_message = outcome["error_message"]
         except Exception as e:
             error_message = str(e)
             is_available = False
+            response_time = None
             check_method = "error"
-            print(f"[{check_id}] Error during check for {device.name}: {error_message}")
-
-        # Save to database
-        check = AvailabilityCheck(
-            device_id=device.id,
-            is_available=is_available,
-            response_time=response_time,
-            check_method=check_method,
-            error_message=error_message
-        )
-        db.add(check)
-        db.commit()
+            print(f"[{check_id}] Error during check for {target['device_name']}: {error_message}")
+
+        if successful_probe:
+            # Next check of this target starts with the probe that worked
+            target["preferred"] = successful_probe
 
         print(
-            f"[{check_id}] FINAL RESULT for {device.name}: {'Available' if is_available else 'Not available'} via {check_method}")
+            f"[{check_id}] FINAL RESULT for {target['device_name']}: {'Available' if is_available else 'Not available'} via {check_method}")
 
         return {
-            "device_id": device.id,
-            "device_name": device.name,
+            "device_id": target["device_id"],
+            "device_name": target["device_name"],
             "is_available": is_available,
             "response_time": response_time,
             "check_method": check_method,
-            "timestamp": check.timestamp.isoformat(),
-            "error": error_message
+            "probe_policy": policy["name"],
+            "timestamp": datetime.utcnow().isoformat(),
+            "error": error_message,
+            "successful_probe": successful_probe
         }
 
     @staticmethod
-    async def check_all_devices(db: Session, max_concurrent: int = config.MAX_CONCURRENT_CHECKS) -> List[Dict[str, Any]]:
+    async def _run_on_demand_check(device_id: int) -> Dict[str, Any]:
+        """Probe one device, persist the result and feed it to the check scheduler"""
+        # Imported here: the scheduler itself depends on this module
+        from app.services.device_scheduler import DeviceCheckScheduler
+
+        async with AsyncSessionLocal() as db:
+            # Inactive devices are not scheduled but can still be checked on request
+            target = (await db.run_sync(ProbeService.load_targets, [device_id], False)).get(device_id)
+
+        if not target:
+            return {"error": "Device not found"}
+
+        result = await AvailabilityService.probe_target(target)
+        ResultWriter().submit(result)
+        # The scheduler counts it as the device's latest check
+        DeviceCheckScheduler().record_result(result)
+        return result
+
+    # device_id -> in-flight on-demand check shared by all callers
+    _on_demand_checks: Dict[int, asyncio.Task] = {}
+
+    @staticmethod
+    async def check_device_availability(device_id: int, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Check if a device is available using the probe policy that applies to it.
+
+        With max_age, a result of any source (scheduled or on demand) that is
+        at most max_age seconds old is returned without probing. Concurrent
+        calls for the same device share one probe.
+        """
+        if max_age is not None:
+            state = LiveStats().get(device_id)
+            if state is not None and \
+                    (datetime.utcnow() - datetime.fromisoformat(state["timestamp"])).total_seconds() <= max_age:
+                return state
+
+        task = AvailabilityService._on_demand_checks.get(device_id)
+        if task is None:
+            task = asyncio.create_task(AvailabilityService._run_on_demand_check(device_id))
+            AvailabilityService._on_demand_checks[device_id] = task
+            task.add_done_callback(lambda _: AvailabilityService._on_demand_checks.pop(device_id, None))
+        # A caller that goes away does not cancel the probe for the others
+        return await asyncio.shield(task)
+
+    @staticmethod
+    async def check_all_devices(max_concurrent: int = config.MAX_CONCURRENT_CHECKS) -> List[Dict[str, Any]]:
         """
         Check availability for all active devices in parallel.
 
+        Targets are loaded up front, no session is held while probing and
+        all results are persisted in bulk at the end.
+
         Args:
-            db: Database session
             max_concurrent: Maximum number of concurrent checks
         """
-        # Get device IDs
-        devices = db.query(Device).filter(Device.is_active == True).all()
-        device_ids = [d.id for d in devices]
+        async with AsyncSessionLocal() as db:
+            targets = list((await db.run_sync(ProbeService.load_targets)).values())
 
         # Create a semaphore to limit concurrency
         semaphore = asyncio.Semaphore(max_concurrent)
 
-        async def check_with_semaphore(device_id):
+        async def check_with_semaphore(target):
             async with semaphore:
-                # Create new DB session for each check to avoid thread issues
-                from app.models.database import SessionLocal
-                local_db = SessionLocal()
-                try:
-                    return await AvailabilityService.check_device_availability(device_id, local_db)
-                finally:
-                    local_db.close()
-
-        # Create tasks for all devices
-        tasks = [check_with_semaphore(device_id) for device_id in device_ids]
+                return await AvailabilityService.probe_target(target)
 
         # Execute all tasks concurrently
-        results = []
-        if tasks:
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            # Handle any exceptions
-            final_results = []
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    print(f"Error checking device {device_ids[i]}: {str(result)}")
-                    # Add an error result
-                    final_results.append({
-                        "device_id": device_ids[i],
-                        "device_name": f"Device ID {device_ids[i]}",
-                        "is_available": False,
-                        "error": str(result),
-                        "check_method": "error",
-                        "timestamp": datetime.utcnow().isoformat()
-                    })
-                else:
-                    final_results.append(result)
-
-            return final_results
-
-        return results
+        results = await asyncio.gather(*(check_with_semaphore(t) for t in targets), return_exceptions=True)
+
+        await ResultWriter().write_many([r for r in results if not isinstance(r, Exception)])
+
+        # Handle any exceptions
+        final_results = []
+        for target, result in zip(targets, results):
+            if isinstance(result, Exception):
+                print(f"Error checking device {target['device_id']}: {str(result)}")
+                # Add an error result
+                final_results.append({
+                    "device_id": target["device_id"],
+                    "device_name": target["device_name"],
+                    "is_available": False,
+                    "error": str(result),
+                    "check_method": "error",
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+            else:
+                final_results.append(result)
+
+        return final_results
+
+    @staticmethod
+    def get_latest_states(db: Session) -> List[Dict[str, Any]]:
+        """
+        Latest (device_id, is_available) per device, without device details,
+        and since when the device has been in that state (start of its open
+        interval, None if it has none).
+        """
+        rows = db.query(
+            DeviceLatestState.device_id,
+            DeviceLatestState.is_available,
+            AvailabilityInterval.start_time
+        ).outerjoin(AvailabilityInterval, and_(
+            AvailabilityInterval.device_id == DeviceLatestState.device_id,
+            AvailabilityInterval.is_open == True
+        )).all()
+        return [{"device_id": device_id, "is_available": is_available, "state_since": state_since}
+                for device_id, is_available, state_since in rows]
 
     @staticmethod
-    async def get_latest_availability(db: Session) -> List[Dict[str, Any]]:
+    async def get_latest_availability(db: AsyncSession) -> List[Dict[str, Any]]:
         """
         Get latest availability status for all active devices
         from database without running new checks
         """
-        # Subquery to get the latest check for each device
-        subquery = db.query(
-            AvailabilityCheck.device_id,
-            func.max(AvailabilityCheck.timestamp).label('max_timestamp')
-        ).group_by(AvailabilityCheck.device_id).subquery()
-
-        # Join with the actual checks to get the full data
-        latest_checks = db.query(AvailabilityCheck).join(
-            subquery,
-            and_(
-                AvailabilityCheck.device_id == subquery.c.device_id,
-                AvailabilityCheck.timestamp == subquery.c.max_timestamp
-            )
-        ).all()
-
-        # Format results
-        results = []
-        for check in latest_checks:
-            device = db.query(Device).filter(Device.id == check.device_id).first()
-            if device:
-                results.append({
-                    "device_id": device.id,
-                    "device_name": device.name,
-                    "is_available": check.is_available,
-                    "response_time": check.response_time,
-                    "check_method": check.check_method,
-                    "timestamp": check.timestamp.isoformat(),
-                    "error": check.error_message
-                })
+        rows = (await db.execute(
+            select(
+                DeviceLatestState.device_id,
+                Device.name,
+                DeviceLatestState.is_available,
+                DeviceLatestState.response_time,
+                DeviceLatestState.check_method,
+                DeviceLatestState.probe_policy,
+                DeviceLatestState.timestamp,
+                DeviceLatestState.error_message
+            ).join(Device, Device.id == DeviceLatestState.device_id)
+        )).all()
+
+        return [
+            {
+                "device_id": device_id,
+                "device_name": device_name,
+                "is_available": is_available,
+                "response_time": response_time,
+                "check_method": check_method,
+                "probe_policy": probe_policy,
+                "timestamp": timestamp.isoformat(),
+                "error": error_message
+            }
+            for device_id, device_name, is_available, response_time, check_method, probe_policy, timestamp,
+            error_message in rows
+        ]
 
-        return results
+    @staticmethod
+    def get_slowest_checks(db: Session, since: datetime = None, limit: int = 5) -> List[Dict[str, Any]]:
+        """Slowest successful checks, newest data first when response times tie"""
+        query = db.query(AvailabilityCheck, Device.name).join(
+            Device, Device.id == AvailabilityCheck.device_id
+        ).filter(
+            AvailabilityCheck.is_available == True,
+            AvailabilityCheck.response_time != None
+        )
+        if since:
+            query = query.filter(AvailabilityCheck.timestamp >= since)
+
+        rows = query.order_by(
+            AvailabilityCheck.response_time.desc(),
+            AvailabilityCheck.timestamp.desc()
+        ).limit(limit).all()
+        return [
+            {
+                "device_id": check.device_id,
+                "device_name": device_name,
+                "is_available": check.is_available,
+                "response_time": check.response_time,
+                "check_method": check.check_method,
+                "timestamp": check.timestamp.isoformat(),
+                "error": check.error_message
+            }
+            for check, device_name in rows
+        ]
 
     @staticmethod
     def get_device_availability_history(
@@ -263,92 +273,121 @@ class AvailabilityService:
             AvailabilityCheck.timestamp.desc()
         ).limit(limit).all()
 
+    @staticmethod
+    def chart_source(days: int) -> str:
+        """
+        Where a chart over the last days comes from: "raw" checks for short
+        ranges while every check is stored, otherwise the finest rollup
+        resolution that is still kept and has at most CHART_MAX_ROLLUP_ROWS
+        buckets in the range.
+        """
+        if config.RAW_CHECKS == "all" and days <= config.CHART_RAW_MAX_DAYS:
+            return "raw"
+        for resolution, (_, step) in ROLLUPS.items():
+            if resolution == "minute" and days > config.MINUTE_ROLLUP_RETENTION_DAYS:
+                continue
+            if timedelta(days=days) / step <= config.CHART_MAX_ROLLUP_ROWS:
+                return resolution
+        return "day"
+
     @staticmethod
     def get_availability_chart_data(
             db: Session,
             device_id: int,
-            days: int = 7
+            days: int = 7,
+            max_points: Optional[int] = None,
+            availability_agg: str = "min",
+            source: str = "auto"
     ) -> Dict[str, Any]:
         """
         Get availability data formatted for charts
 
-        Returns timestamps and availability data for the specified time period
+        Returns timestamps and availability data for the specified time period,
+        from raw checks ("raw"), a rollup resolution ("minute", "hour", "day")
+        or, with "auto", whichever chart_source picks for the range. A rollup
+        bucket's availability is down if any of its checks failed ("min") or
+        the share of successful checks ("ratio"), its response time the mean.
+        With max_points (at least 3) the series are downsampled: response
+        times with LTTB, availability with the minimum or the mean of each
+        bucket.
+        Daily uptime comes from the day rollups.
         """
-        start_date = datetime.utcnow() - timedelta(days=days)
-
-        # Get check data
-        checks = db.query(AvailabilityCheck).filter(
-            AvailabilityCheck.device_id == device_id,
-            AvailabilityCheck.timestamp >= start_date
-        ).order_by(
-            AvailabilityCheck.timestamp
-        ).all()
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days)
+        if source == "auto":
+            source = AvailabilityService.chart_source(days)
+
+        # Points are (x, response time, timestamp, availability) with 1=available, 0=not available
+        if source == "raw":
+            query = db.query(
+                AvailabilityCheck.timestamp,
+                AvailabilityCheck.is_available,
+                AvailabilityCheck.response_time
+            ).filter(
+                AvailabilityCheck.device_id == device_id,
+                AvailabilityCheck.timestamp >= start_date,
+                AvailabilityCheck.timestamp <= end_date
+            ).order_by(
+                AvailabilityCheck.timestamp
+            )
 
-        # Format data for frontend chart
-        timestamps = []
-        availability = []
-        response_times = []
+            def to_point(row):
+                timestamp, is_available, response_time = row
+                return timestamp.timestamp(), response_time or 0, timestamp, 1 if is_available else 0
+        else:
+            model, _ = ROLLUPS[source]
+            query = db.query(
+                model.bucket_start,
+                model.checks,
+                model.ups,
+                model.latency_count,
+                model.latency_sum
+            ).filter(
+                model.device_id == device_id,
+                model.bucket_start >= truncate(start_date, source),
+                model.bucket_start <= end_date
+            ).order_by(
+                model.bucket_start
+            )
 
-        for check in checks:
-            timestamps.append(check.timestamp.isoformat())
-            availability.append(1 if check.is_available else 0)  # 1=available, 0=not available
-            response_times.append(check.response_time if check.response_time else 0)
+            def to_point(row):
+                bucket_start, checks, ups, latency_count, latency_sum = row
+                available = round(ups / checks, 4) if availability_agg == "ratio" else int(ups == checks)
+                response_time = latency_sum / latency_count if latency_count else 0
+                return bucket_start.timestamp(), response_time, bucket_start, available
+
+        # Streamed in pages, so a long range never holds more than a bucket of rows
+        points = (to_point(row) for row in query.yield_per(config.CHART_QUERY_PAGE_SIZE))
+        count = query.count() if max_points else 0
+        timestamps, availability, response_times = [], [], []
+        if max_points and count > max_points:
+            buckets = iter_buckets(points, bucket_bounds(count, max_points))
+            for bucket, kept in lttb_stream(buckets):
+                values = [point[3] for point in bucket]
+                timestamps.append(bucket[kept][2])
+                response_times.append(bucket[kept][1])
+                availability.append(
+                    round(sum(values) / len(values), 4) if availability_agg == "ratio" else min(values))
+        else:
+            for _, response_time, timestamp, available in points:
+                timestamps.append(timestamp)
+                response_times.append(response_time)
+                availability.append(available)
 
         # Calculate daily uptime percentage
-        daily_stats = AvailabilityService._calculate_daily_uptime(checks)
+        days_with_checks = [
+            day for day in RollupService.get_trend(db, "day", start_date, device_id=device_id) if day["check_count"]
+        ]
+        total_checks = sum(day["check_count"] for day in days_with_checks)
+        total_available = sum(day["available_count"] for day in days_with_checks)
 
         return {
             "device_id": device_id,
-            "timestamps": timestamps,
+            "source": source,
+            "timestamps": [timestamp.isoformat() for timestamp in timestamps],
             "availability": availability,
             "response_times": response_times,
-            "daily_uptime": daily_stats["daily_uptime"],
-            "daily_dates": daily_stats["daily_dates"],
-            "total_uptime_percent": daily_stats["total_uptime"]
+            "daily_uptime": [round(day["availability_rate"], 2) for day in days_with_checks],
+            "daily_dates": [day["bucket_start"].strftime("%Y-%m-%d") for day in days_with_checks],
+            "total_uptime_percent": round(total_available / total_checks * 100, 2) if total_checks else 0
         }
-
-    @staticmethod
-    def _calculate_daily_uptime(checks: List[AvailabilityCheck]) -> Dict[str, Any]:
-        """Calculate daily uptime percentages from check results"""
-        if not checks:
-            return {"daily_uptime": [], "daily_dates": [], "total_uptime": 0}
-
-        # Group daily checks
-        daily_checks = {}
-
-        for check in checks:
-            date_key = check.timestamp.strftime("%Y-%m-%d")
-            if date_key not in daily_checks:
-                daily_checks[date_key] = []
-            daily_checks[date_key].append(check)
-
-        # Calculate daily uptime percentages
-        daily_uptime = []
-        daily_dates = []
-        total_available = 0
-        total_checks = 0
-
-        for date_key in sorted(daily_checks.keys()):
-            day_checks = daily_checks[date_key]
-            available_count = sum(1 for c in day_checks if c.is_available)
-            total_count = len(day_checks)
-
-            if total_count > 0:
-                uptime_percent = (available_count / total_count) * 100
-            else:
-                uptime_percent = 0
-
-            daily_uptime.append(round(uptime_percent, 2))
-            daily_dates.append(date_key)
-
-            total_available += available_count
-            total_checks += total_count
-
-        # Total period uptime percentage
-        total_uptime = (total_available / total_checks) * 100 if total_checks > 0 else 0
-
-        return {
-            "daily_uptime": daily_uptime,
-            "daily_dates": daily_dates,
-            "total_uptime": round(total_uptime, 2)
-        }
\ No newline at end of file
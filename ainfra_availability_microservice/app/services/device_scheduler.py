@@ -0,0 +1,360 @@
+# app/services/device_scheduler.py
+import asyncio
+import collections
+import math
+import time
+import zlib
+from datetime import timezone
+from typing import Dict, Any, List, Optional
+
+from app.models.database import SessionLocal
+from app.models.models import Device
+from app.services.availability import AvailabilityService
+from app.services.probe import ProbeService
+from app.services.sharding import ShardedProbePool
+from app.services.writer import ResultWriter
+import config
+
+
+def phase(device_id: int) -> float:
+    """Stable position of a device within its interval, in [0, 1)"""
+    return zlib.crc32(str(device_id).encode()) / 2 ** 32
+
+
+def state_since(latest: Optional[Dict[str, Any]]) -> float:
+    """Wall-clock time a device entered its latest stored state; now if unknown"""
+    if latest and latest.get("state_since"):
+        return min(time.time(), latest["state_since"].replace(tzinfo=timezone.utc).timestamp())
+    return time.time()
+
+
+class DeviceCheckScheduler:
+    """
+    Per-device availability scheduler driven by a hashed timer wheel.
+
+    Every device has its own next-due time. The interval comes from the
+    device override, its tier or the global setting; after a state flip the
+    device is rechecked right away and then at a short interval until the
+    new state is confirmed, and devices that have been down for a long time
+    back off exponentially.
+
+    Regular checks land on a fixed phase of the device's interval taken
+    from a stable hash of its id, so the fleet is spread evenly over the
+    interval instead of being probed in one burst. The wheel has
+    SCHEDULER_WHEEL_SLOTS slots of SCHEDULER_TICK_SECONDS; every tick
+    handles a single slot, entries further out than one revolution stay in
+    their slot until their tick comes round.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(DeviceCheckScheduler, cls).__new__(cls)
+            cls._instance._reset_wheel()
+            cls._instance._devices = {}  # device_id -> schedule state
+            cls._instance._in_flight = set()
+            cls._instance._task = None
+            cls._instance._semaphore = None
+            cls._instance._default_interval = config.DEFAULT_CHECK_INTERVAL * 60
+        return cls._instance
+
+    def _reset_wheel(self):
+        # slot -> [(due_tick, device_id, generation)]
+        self._slots: List[list] = [[] for _ in range(config.SCHEDULER_WHEEL_SLOTS)]
+        self._origin = time.monotonic()
+        self._tick = 0
+        self._tick_lags = collections.deque(maxlen=config.SCHEDULER_WHEEL_SLOTS)
+        self._fired = collections.deque(maxlen=config.SCHEDULER_WHEEL_SLOTS)
+        self._max_tick_lag = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, default_interval_minutes: int = config.DEFAULT_CHECK_INTERVAL):
+        """Load devices and start the scheduling loop"""
+        if self.running:
+            return
+        self._default_interval = max(1, default_interval_minutes) * 60
+        self._reset_wheel()
+        # Every probe process gets its own share of concurrent checks
+        self._semaphore = asyncio.Semaphore(config.MAX_CONCURRENT_CHECKS * ShardedProbePool().size)
+        self.refresh_devices()
+        self._task = asyncio.create_task(self._run())
+        print(f"Device check scheduler started with {len(self._devices)} devices")
+
+    def stop(self):
+        """Stop the scheduling loop"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
+        self._reset_wheel()
+        self._devices = {}
+        print("Device check scheduler stopped")
+
+    def set_default_interval(self, minutes: int):
+        """Change the global interval used by devices without tier or override"""
+        self._default_interval = max(1, minutes) * 60
+        for device_id in list(self._devices):
+            self._schedule(device_id, self._base_interval(device_id), aligned=True, resume=True)
+
+    def _base_interval(self, device_id: int) -> float:
+        """Configured interval for a device, before state-based adjustments"""
+        state = self._devices[device_id]
+        if state["interval_override"]:
+            interval = state["interval_override"]
+        elif state["tier"] in config.CHECK_TIER_INTERVALS:
+            interval = config.CHECK_TIER_INTERVALS[state["tier"]]
+        else:
+            interval = self._default_interval
+        return max(config.MIN_CHECK_INTERVAL_SECONDS, interval)
+
+    @staticmethod
+    def _warn_unknown_tier(device_id: int, tier: str):
+        """Tiers missing from CHECK_TIER_INTERVALS (e.g. removed from the config) use the global interval"""
+        if tier is not None and tier not in config.CHECK_TIER_INTERVALS:
+            print(f"Warning: device {device_id} has unknown check tier '{tier}', using the global check interval")
+
+    def _aligned_delay(self, device_id: int, interval: float, resume: bool) -> float:
+        """
+        Delay to the device's next phase point on its interval grid. Wall-clock
+        based, so the phase is the same across restarts. After a check the
+        point is at least half an interval away; when resuming (startup,
+        interval change) the next point is taken.
+        """
+        now = time.time()
+        offset = phase(device_id) * interval
+        earliest = now if resume else now + interval / 2
+        due = offset + math.ceil((earliest - offset) / interval) * interval
+        return due - now
+
+    def _schedule(self, device_id: int, delay: float, aligned: bool = False, resume: bool = False):
+        """(Re)schedule a device; older wheel entries become stale"""
+        state = self._devices[device_id]
+        if aligned:
+            delay = self._aligned_delay(device_id, delay, resume)
+        state["generation"] += 1
+        tick = config.SCHEDULER_TICK_SECONDS
+        due_tick = max(self._tick + 1, math.ceil((time.monotonic() + max(0.0, delay) - self._origin) / tick))
+        state["next_due"] = self._origin + due_tick * tick
+        self._slots[due_tick % len(self._slots)].append((due_tick, device_id, state["generation"]))
+
+    def refresh_devices(self, db=None):
+        """Sync the schedule with the active devices in the database"""
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            rows = db.query(
+                Device.id, Device.check_tier, Device.check_interval_seconds
+            ).filter(Device.is_active == True).all()
+            targets = ProbeService.load_targets(db)
+            latest = {r["device_id"]: r for r in AvailabilityService.get_latest_states(db)}
+        finally:
+            if own_session:
+                db.close()
+
+        active_ids = set()
+        for device_id, tier, interval_override in rows:
+            active_ids.add(device_id)
+            state = self._devices.get(device_id)
+            target = targets[device_id]
+            if state is None:
+                self._warn_unknown_tier(device_id, tier)
+                last = latest.get(device_id)
+                self._devices[device_id] = {
+                    "target": target,
+                    "tier": tier,
+                    "interval_override": interval_override,
+                    "is_available": last["is_available"] if last else None,
+                    # Stored, so a restart keeps the backoff of a long-dead device
+                    "state_since": state_since(last),
+                    "confirm_remaining": 0,
+                    "backoff_interval": None,
+                    "interval": None,
+                    "generation": 0,
+                    "next_due": None,
+                }
+                # Devices never checked before go right away, known ones resume at their phase
+                if last:
+                    self._schedule(device_id, self._base_interval(device_id), aligned=True, resume=True)
+                else:
+                    self._schedule(device_id, 0)
+                continue
+
+            # Keep the learned probe if the stored memo has not caught up yet
+            target["preferred"] = target["preferred"] or state["target"]["preferred"]
+            state["target"] = target
+
+            if state["tier"] != tier or state["interval_override"] != interval_override:
+                if state["tier"] != tier:
+                    self._warn_unknown_tier(device_id, tier)
+                state["tier"] = tier
+                state["interval_override"] = interval_override
+                state["backoff_interval"] = None
+                self._schedule(device_id, self._base_interval(device_id), aligned=True, resume=True)
+
+        for device_id in set(self._devices) - active_ids:
+            # Stale wheel entries for removed devices are skipped by the loop
+            del self._devices[device_id]
+
+        ShardedProbePool().rebalance(self._devices)
+
+    def next_interval(self, device_id: int, is_available: bool) -> float:
+        """Record a check result and return the delay until the next check"""
+        state = self._devices[device_id]
+        base = self._base_interval(device_id)
+        now = time.time()
+
+        if state["is_available"] is not None and state["is_available"] != is_available:
+            # State flip: confirm it quickly
+            state["is_available"] = is_available
+            state["state_since"] = now
+            state["confirm_remaining"] = config.STATE_CHANGE_CONFIRM_CHECKS
+            state["backoff_interval"] = None
+            interval = 0
+        elif state["confirm_remaining"] > 0:
+            state["confirm_remaining"] -= 1
+            interval = min(base, config.STATE_CHANGE_RECHECK_SECONDS)
+        elif not is_available and now - state["state_since"] > config.DOWN_BACKOFF_AFTER_SECONDS:
+            # Long-dead host: double the interval on every check
+            previous = state["backoff_interval"] or base
+            state["backoff_interval"] = min(max(base, config.DOWN_BACKOFF_MAX_SECONDS), previous * 2)
+            interval = state["backoff_interval"]
+        else:
+            interval = base
+
+        state["is_available"] = is_available
+        state["interval"] = interval
+        return interval
+
+    def record_result(self, result: Dict[str, Any]):
+        """Feed a check result (from any source) back into the schedule"""
+        device_id = result.get("device_id")
+        if device_id not in self._devices or "is_available" not in result:
+            return
+        interval = self.next_interval(device_id, result["is_available"])
+        # Regular and backed-off checks keep the device's phase, rechecks go when due
+        self._schedule(device_id, interval, aligned=interval >= self._base_interval(device_id))
+
+    async def _check(self, device_id: int):
+        """Run one device check and reschedule it"""
+        result = None
+        try:
+            async with self._semaphore:
+                state = self._devices.get(device_id)
+                if state is not None:
+                    result = await ShardedProbePool().probe(state["target"])
+                    ResultWriter().submit(result)
+        except Exception as e:
+            print(f"Error checking device {device_id}: {str(e)}")
+        finally:
+            self._in_flight.discard(device_id)
+
+        if device_id not in self._devices:
+            return
+        if result and "is_available" in result:
+            self.record_result(result)
+        else:
+            self._schedule(device_id, self._base_interval(device_id), aligned=True)
+
+    def _advance(self, tick: int) -> int:
+        """Start the checks due in one tick's slot; returns how many were started"""
+        index = tick % len(self._slots)
+        slot = self._slots[index]
+        pending = []
+        fired = 0
+        for entry in slot:
+            due_tick, device_id, generation = entry
+            if due_tick > tick:
+                # Due in a later revolution
+                pending.append(entry)
+                continue
+            state = self._devices.get(device_id)
+            if state is None or state["generation"] != generation or device_id in self._in_flight:
+                continue
+            self._in_flight.add(device_id)
+            asyncio.create_task(self._check(device_id))
+            fired += 1
+        self._slots[index] = pending
+        return fired
+
+    async def _run(self):
+        """Advance the wheel one slot per tick and start the due checks"""
+        tick_seconds = config.SCHEDULER_TICK_SECONDS
+        while True:
+            try:
+                target = self._origin + (self._tick + 1) * tick_seconds
+                delay = target - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                now = time.monotonic()
+                lag = max(0.0, now - target)
+                self._tick_lags.append(lag)
+                self._max_tick_lag = max(self._max_tick_lag, lag)
+
+                # Catch up on every tick that has passed
+                current = int((now - self._origin) / tick_seconds)
+                while self._tick < current:
+                    self._tick += 1
+                    self._fired.append(self._advance(self._tick))
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                print(f"Error in device check scheduler: {str(e)}")
+                await asyncio.sleep(1)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Tick lag and slot load of the timer wheel"""
+        tick_seconds = config.SCHEDULER_TICK_SECONDS
+        lags = sorted(self._tick_lags)
+        p99 = lags[max(0, int(len(lags) * 0.99) - 1)] if lags else 0.0
+        load = [
+            sum(1 for _, device_id, generation in slot
+                if device_id in self._devices and self._devices[device_id]["generation"] == generation)
+            for slot in self._slots
+        ]
+        fired = list(self._fired)
+        return {
+            "devices": len(self._devices),
+            "in_flight": len(self._in_flight),
+            "tick_seconds": tick_seconds,
+            "slots": len(self._slots),
+            "revolution_seconds": round(tick_seconds * len(self._slots), 3),
+            "ticks": self._tick,
+            "tick_lag_ms": {
+                "last": round(self._tick_lags[-1] * 1000, 2) if lags else 0,
+                "avg": round(sum(lags) / len(lags) * 1000, 2) if lags else 0,
+                "p99": round(p99 * 1000, 2),
+                "max": round(self._max_tick_lag * 1000, 2),
+            },
+            # Scheduled checks waiting in each slot, whatever revolution they are due in
+            "slot_load": {
+                "min": min(load),
+                "max": max(load),
+                "avg": round(sum(load) / len(load), 2),
+                "per_slot": load,
+            },
+            # Checks started per tick over the last revolution
+            "fired_per_tick": {
+                "max": max(fired) if fired else 0,
+                "avg": round(sum(fired) / len(fired), 2) if fired else 0,
+            },
+        }
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Current schedule, soonest first"""
+        now = time.monotonic()
+        entries = []
+        for device_id, state in self._devices.items():
+            entries.append({
+                "device_id": device_id,
+                "tier": state["tier"],
+                "base_interval_seconds": self._base_interval(device_id),
+                "current_interval_seconds": state["interval"],
+                "next_check_in_seconds": round(state["next_due"] - now, 2) if state["next_due"] else None,
+                "is_available": state["is_available"],
+                "confirming_state_change": state["confirm_remaining"] > 0,
+                "in_flight": device_id in self._in_flight,
+            })
+        return sorted(entries, key=lambda e: e["next_check_in_seconds"] or 0)
@@ -0,0 +1,225 @@
+# app/services/export.py
+import csv
+import io
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Sequence
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.engine import Engine
+
+from app.models.database import engine as default_engine
+from app.models.models import AvailabilityCheck
+from app.services.rollups import ROLLUPS
+import config
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Format name -> (media type, file extension); arrow and parquet need pyarrow
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.file", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+# Exportable tables: raw checks or one of the rollup resolutions
+EXPORT_TABLES = ("checks",) + tuple(ROLLUPS)
+
+
+class _ChunkSink:
+    """Write-only file object that hands out what was written since the last take()"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _columns(table: str):
+    """Exported columns, the time column and the keyset tie-breaker column of a table"""
+    if table == "checks":
+        model = AvailabilityCheck
+        columns = [model.id, model.device_id, model.timestamp, model.is_available, model.response_time,
+                   model.check_method, model.error_message, model.probe_policy]
+        return columns, model.timestamp, model.id
+    model, _ = ROLLUPS[table]
+    columns = [model.device_id, model.bucket_start, model.checks, model.ups, model.latency_count,
+               model.latency_sum, model.latency_max]
+    return columns, model.bucket_start, model.device_id
+
+
+def _arrow_schema(table: str):
+    if table == "checks":
+        return pa.schema([
+            ("id", pa.int64()),
+            ("device_id", pa.int32()),
+            ("timestamp", pa.timestamp("us")),
+            ("is_available", pa.bool_()),
+            ("response_time", pa.float64()),
+            ("check_method", pa.string()),
+            ("error_message", pa.string()),
+            ("probe_policy", pa.string()),
+        ])
+    return pa.schema([
+        ("device_id", pa.int32()),
+        ("bucket_start", pa.timestamp("us")),
+        ("checks", pa.int64()),
+        ("ups", pa.int64()),
+        ("latency_count", pa.int64()),
+        ("latency_sum", pa.float64()),
+        ("latency_max", pa.float64()),
+    ])
+
+
+class ExportService:
+    """
+    Streaming bulk export of availability history.
+
+    Rows are read in chunks of EXPORT_CHUNK_SIZE with keyset pagination on
+    (time, id), so every chunk is a short indexed range query, no
+    connection is held while the consumer is slow, and memory stays at one
+    chunk whatever the size of the export. Each chunk is encoded right away
+    as CSV lines, an Arrow record batch or a Parquet row group.
+    """
+
+    @staticmethod
+    def check_format(export_format: str, table: str = "checks") -> None:
+        """Raise ValueError for an unknown format or table, or a columnar format without pyarrow"""
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+        if table not in EXPORT_TABLES:
+            raise ValueError(f"table must be one of {', '.join(EXPORT_TABLES)}")
+        if export_format != "csv" and pa is None:
+            raise ValueError(f"{export_format} export needs pyarrow (pip install pyarrow)")
+
+    @staticmethod
+    def iter_chunks(
+            table: str = "checks",
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None,
+            device_ids: Optional[Sequence[int]] = None,
+            chunk_size: int = None,
+            engine: Engine = None
+    ) -> Iterator[List[tuple]]:
+        """
+        Rows of a table in time order, chunk_size rows at a time; start
+        inclusive, end exclusive. Rows are plain tuples as the database
+        driver returns them (SQLite gives timestamps as text and booleans
+        as 0/1), which skips the per-value result processing.
+        """
+        chunk_size = chunk_size or config.EXPORT_CHUNK_SIZE
+        engine = engine or default_engine
+        columns, time_column, key_column = _columns(table)
+
+        query = select(*columns)
+        if start is not None:
+            query = query.where(time_column >= start)
+        if end is not None:
+            query = query.where(time_column < end)
+        if device_ids:
+            query = query.where(columns[0].table.c.device_id.in_(list(device_ids)))
+        query = query.order_by(time_column, key_column).limit(chunk_size)
+
+        time_index = columns.index(time_column)
+        key_index = columns.index(key_column)
+        last = None
+        while True:
+            page = query
+            if last is not None:
+                # Written out instead of a row value comparison so the time index is used everywhere
+                page = page.where(time_column >= last[0], or_(
+                    time_column > last[0], and_(time_column == last[0], key_column > last[1])))
+            with engine.connect() as conn:
+                rows = conn.execute(page).cursor.fetchall()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            last_time = rows[-1][time_index]
+            if isinstance(last_time, str):
+                last_time = datetime.fromisoformat(last_time)
+            last = (last_time, rows[-1][key_index])
+
+    @staticmethod
+    def column_names(table: str) -> List[str]:
+        return [column.name for column in _columns(table)[0]]
+
+    @staticmethod
+    def stream(
+            export_format: str,
+            table: str = "checks",
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None,
+            device_ids: Optional[Sequence[int]] = None,
+            chunk_size: int = None,
+            engine: Engine = None
+    ) -> Iterator[bytes]:
+        """Encoded export, one piece per chunk (blocking, iterate it on a worker thread)"""
+        ExportService.check_format(export_format, table)
+        chunks = ExportService.iter_chunks(table, start, end, device_ids, chunk_size, engine)
+        if export_format == "csv":
+            return ExportService._stream_csv(table, chunks)
+        return ExportService._stream_arrow(export_format, table, chunks)
+
+    @staticmethod
+    def _stream_csv(table: str, chunks: Iterator[List[tuple]]) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(ExportService.column_names(table))
+        for rows in chunks:
+            writer.writerows(
+                [value.isoformat(sep=" ") if isinstance(value, datetime) else value for value in row] for row in rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+    @staticmethod
+    def _stream_arrow(export_format: str, table: str, chunks: Iterator[List[tuple]]) -> Iterator[bytes]:
+        schema = _arrow_schema(table)
+        sink = _ChunkSink()
+        if export_format == "parquet":
+            writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        else:
+            writer = pa.ipc.new_file(sink, schema)
+        try:
+            for rows in chunks:
+                # Casting in Arrow also parses SQLite's text timestamps and 0/1 booleans
+                arrays = [pa.array(values).cast(field.type) for values, field in zip(zip(*rows), schema)]
+                if export_format == "parquet":
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                else:
+                    writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                yield sink.take()
+        finally:
+            writer.close()
+        yield sink.take()
+
+    @staticmethod
+    def to_file(path: str, export_format: str, table: str = "checks", **filters) -> Dict[str, Any]:
+        """Write an export to a file; returns the bytes written"""
+        written = 0
+        with open(path, "wb") as f:
+            for data in ExportService.stream(export_format, table, **filters):
+                f.write(data)
+                written += len(data)
+        return {"path": path, "format": export_format, "table": table, "bytes": written}
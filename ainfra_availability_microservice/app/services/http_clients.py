@@ -0,0 +1,95 @@
+# app/services/http_clients.py
+from typing import Dict, Any, Optional
+
+import httpx
+
+import config
+
+# Per-service counters; connections are counted from the transport's trace events
+_NEW_COUNTERS = {"requests": 0, "errors": 0, "connections_opened": 0, "active": 0}
+
+
+class ServiceClients:
+    """
+    Long-lived pooled HTTP clients, one per upstream service.
+
+    Device syncs reuse the main app client's keep-alive connections
+    instead of connecting on every call; its base URL is resolved once in
+    config. The service runs apart from the main app and keeps its own
+    copy of the main app's class (app/core/http_clients.py there).
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ServiceClients, cls).__new__(cls)
+            cls._instance._clients = {}
+            cls._instance._counters = {}
+            cls._instance._base_urls = {
+                "main_app": config.MAIN_APP_URL.rstrip("/"),
+            }
+        return cls._instance
+
+    def base_url(self, name: str) -> str:
+        return self._base_urls[name]
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """The shared client of a service, created on first use"""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            counters = self._counters.setdefault(name, dict(_NEW_COUNTERS))
+
+            async def trace(event: str, info: Dict[str, Any]):
+                # Connection pool events reported by the transport for each request
+                if event == "connection.connect_tcp.complete":
+                    counters["connections_opened"] += 1
+                elif event.endswith(".send_request_headers.started"):
+                    counters["active"] += 1
+                elif event.endswith(".response_closed.started"):
+                    counters["active"] -= 1
+
+            async def on_request(request):
+                counters["requests"] += 1
+                request.extensions["trace"] = trace
+
+            async def on_response(response):
+                if response.status_code >= 500:
+                    counters["errors"] += 1
+
+            client = self._clients[name] = httpx.AsyncClient(
+                base_url=self.base_url(name),
+                timeout=config.HTTP_CLIENT_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=config.HTTP_CLIENT_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.HTTP_CLIENT_MAX_KEEPALIVE,
+                    keepalive_expiry=config.HTTP_CLIENT_KEEPALIVE_SECONDS
+                ),
+                transport=httpx.AsyncHTTPTransport(retries=config.HTTP_CLIENT_RETRIES),
+                event_hooks={"request": [on_request], "response": [on_response]}
+            )
+        return client
+
+    def stats(self) -> Dict[str, Any]:
+        """Requests, connections opened and connections in use per service"""
+        stats = {}
+        for name, base_url in self._base_urls.items():
+            counters = self._counters.get(name, _NEW_COUNTERS)
+            client = self._clients.get(name)
+            entry = {
+                "base_url": base_url,
+                "open": client is not None and not client.is_closed,
+                "requests": counters["requests"],
+                "server_errors": counters["errors"],
+                # New connections against requests shows how well keep-alive works
+                "connections_opened": counters["connections_opened"],
+                "active_connections": counters["active"],
+            }
+            stats[name] = entry
+        return stats
+
+    async def close(self, name: Optional[str] = None):
+        """Close one or all clients; they are recreated on the next get()"""
+        for client_name in [name] if name else list(self._clients):
+            client = self._clients.pop(client_name, None)
+            if client is not None:
+                await client.aclose()
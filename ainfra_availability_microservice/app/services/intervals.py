@@ -0,0 +1,243 @@
+# app/services/intervals.py
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.models import AvailabilityCheck, AvailabilityInterval
+
+
+class IntervalService:
+    @staticmethod
+    def _extend(interval: AvailabilityInterval, row: Dict[str, Any]) -> None:
+        """Add one check to an interval"""
+        interval.sample_count = (interval.sample_count or 0) + 1
+        if row["timestamp"] > interval.end_time:
+            interval.end_time = row["timestamp"]
+        if row["timestamp"] < interval.start_time:
+            interval.start_time = row["timestamp"]
+
+        response_time = row.get("response_time")
+        if response_time is not None:
+            count = (interval.latency_count or 0) + 1
+            interval.latency_count = count
+            if count == 1:
+                interval.latency_min = interval.latency_max = interval.latency_avg = response_time
+            else:
+                interval.latency_min = min(interval.latency_min, response_time)
+                interval.latency_max = max(interval.latency_max, response_time)
+                interval.latency_avg += (response_time - interval.latency_avg) / count
+
+    @staticmethod
+    def _open(db: Session, row: Dict[str, Any]) -> AvailabilityInterval:
+        interval = AvailabilityInterval(
+            device_id=row["device_id"],
+            is_available=row["is_available"],
+            start_time=row["timestamp"],
+            end_time=row["timestamp"],
+            is_open=True,
+            sample_count=0,
+            latency_count=0
+        )
+        IntervalService._extend(interval, row)
+        db.add(interval)
+        return interval
+
+    @staticmethod
+    def apply_results(db: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Fold availability_checks rows into the interval store (caller commits).
+
+        Loads the open interval of every device in the batch with one query.
+        A check older than the open interval that disagrees with it arrived
+        late and is only kept in the raw table. Returns the checks the
+        intervals do not summarize: those that opened an interval and late ones.
+        """
+        if not rows:
+            return []
+
+        by_device: Dict[int, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_device.setdefault(row["device_id"], []).append(row)
+
+        open_intervals = {
+            interval.device_id: interval for interval in db.query(AvailabilityInterval).filter(
+                AvailabilityInterval.is_open == True,
+                AvailabilityInterval.device_id.in_(list(by_device))
+            ).all()
+        }
+
+        changes = []
+        for device_id, device_rows in by_device.items():
+            current = open_intervals.get(device_id)
+            for row in sorted(device_rows, key=lambda r: r["timestamp"]):
+                if current is None:
+                    current = IntervalService._open(db, row)
+                elif current.is_available == row["is_available"]:
+                    IntervalService._extend(current, row)
+                    continue
+                elif row["timestamp"] >= current.end_time:
+                    current.is_open = False
+                    current = IntervalService._open(db, row)
+                changes.append(row)
+        return changes
+
+    @staticmethod
+    def backfill(db: Session, batch_size: int = 10000) -> int:
+        """
+        Build intervals from raw checks if the interval store is empty.
+        Streams the raw table in device/timestamp order. Returns the number of checks folded in.
+        """
+        if db.query(AvailabilityInterval.id).first() is not None:
+            return 0
+
+        query = db.query(
+            AvailabilityCheck.device_id,
+            AvailabilityCheck.timestamp,
+            AvailabilityCheck.is_available,
+            AvailabilityCheck.response_time
+        ).order_by(AvailabilityCheck.device_id, AvailabilityCheck.timestamp).yield_per(batch_size)
+
+        processed = 0
+        batch = []
+        for device_id, timestamp, is_available, response_time in query:
+            batch.append({
+                "device_id": device_id,
+                "timestamp": timestamp,
+                "is_available": is_available,
+                "response_time": response_time
+            })
+            if len(batch) >= batch_size:
+                IntervalService.apply_results(db, batch)
+                db.flush()
+                processed += len(batch)
+                batch = []
+
+        IntervalService.apply_results(db, batch)
+        processed += len(batch)
+        db.commit()
+
+        if processed:
+            print(f"Backfilled availability intervals from {processed} checks")
+        return processed
+
+    @staticmethod
+    def get_intervals(
+            db: Session,
+            device_id: int,
+            start: datetime,
+            end: Optional[datetime] = None,
+            limit: Optional[int] = None
+    ) -> List[AvailabilityInterval]:
+        """Intervals of a device overlapping [start, end], oldest first"""
+        query = db.query(AvailabilityInterval).filter(
+            AvailabilityInterval.device_id == device_id,
+            AvailabilityInterval.end_time >= start
+        )
+        if end is not None:
+            query = query.filter(AvailabilityInterval.start_time <= end)
+        query = query.order_by(AvailabilityInterval.start_time)
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+
+    @staticmethod
+    def _overlap_fraction(interval: AvailabilityInterval, start: datetime, end: datetime) -> float:
+        """Share of an interval's samples that fall into [start, end), assuming even spacing"""
+        duration = (interval.end_time - interval.start_time).total_seconds()
+        if duration <= 0:
+            return 1.0 if start <= interval.start_time < end else 0.0
+        overlap = (min(interval.end_time, end) - max(interval.start_time, start)).total_seconds()
+        return max(0.0, min(1.0, overlap / duration))
+
+    @staticmethod
+    def get_uptime(db: Session, device_id: int, days: int = 7) -> Optional[Dict[str, Any]]:
+        """Uptime over the last days, computed from intervals"""
+        end = datetime.utcnow()
+        start = end - timedelta(days=days)
+        intervals = IntervalService.get_intervals(db, device_id, start)
+        if not intervals:
+            return None
+
+        up_samples = 0.0
+        total_samples = 0.0
+        for interval in intervals:
+            samples = interval.sample_count * IntervalService._overlap_fraction(interval, start, end)
+            total_samples += samples
+            if interval.is_available:
+                up_samples += samples
+
+        return {
+            "device_id": device_id,
+            "uptime_percent": round(up_samples / total_samples * 100, 2) if total_samples else 0,
+            "checks_count": round(total_samples),
+            "first_check": max(intervals[0].start_time, start),
+            "last_check": intervals[-1].end_time,
+            "last_state": intervals[-1].is_available
+        }
+
+    @staticmethod
+    def get_chart_data(db: Session, device_id: int, days: int = 7) -> Dict[str, Any]:
+        """
+        Chart data in the same shape as AvailabilityService.get_availability_chart_data,
+        with one point at the start and end of each interval.
+        """
+        end = datetime.utcnow()
+        start = end - timedelta(days=days)
+        intervals = IntervalService.get_intervals(db, device_id, start)
+
+        timestamps = []
+        availability = []
+        response_times = []
+        daily: Dict[str, List[float]] = {}
+
+        for interval in intervals:
+            value = 1 if interval.is_available else 0
+            latency = interval.latency_avg or 0
+            points = [max(interval.start_time, start)]
+            if interval.end_time > points[0]:
+                points.append(interval.end_time)
+            for point in points:
+                timestamps.append(point.isoformat())
+                availability.append(value)
+                response_times.append(latency)
+
+            # Spread samples over the days the interval touches
+            day = max(interval.start_time, start).replace(hour=0, minute=0, second=0, microsecond=0)
+            while day <= interval.end_time:
+                next_day = day + timedelta(days=1)
+                samples = interval.sample_count * IntervalService._overlap_fraction(
+                    interval, max(day, start), next_day)
+                if samples:
+                    counts = daily.setdefault(day.strftime("%Y-%m-%d"), [0.0, 0.0])
+                    counts[1] += samples
+                    if interval.is_available:
+                        counts[0] += samples
+                day = next_day
+
+        daily_dates = sorted(daily)
+        daily_uptime = [round(daily[d][0] / daily[d][1] * 100, 2) if daily[d][1] else 0 for d in daily_dates]
+        total_up = sum(daily[d][0] for d in daily_dates)
+        total = sum(daily[d][1] for d in daily_dates)
+
+        return {
+            "device_id": device_id,
+            "timestamps": timestamps,
+            "availability": availability,
+            "response_times": response_times,
+            "daily_uptime": daily_uptime,
+            "daily_dates": daily_dates,
+            "total_uptime_percent": round(total_up / total * 100, 2) if total else 0
+        }
+
+    @staticmethod
+    def get_storage_stats(db: Session) -> Dict[str, Any]:
+        """Row counts of the raw and interval stores"""
+        raw_rows = db.query(func.count(AvailabilityCheck.id)).scalar()
+        interval_rows = db.query(func.count(AvailabilityInterval.id)).scalar()
+        return {
+            "raw_checks": raw_rows,
+            "intervals": interval_rows,
+            "compression_ratio": round(raw_rows / interval_rows, 1) if interval_rows else None
+        }
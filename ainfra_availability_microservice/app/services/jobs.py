@@ -0,0 +1,167 @@
+# app/services/jobs.py
+import asyncio
+import time
+import uuid
+from typing import Dict, Any, List, Optional, AsyncIterator
+
+from app.services.availability import AvailabilityService
+import config
+
+FINISHED_STATES = ("completed", "cancelled", "failed")
+
+
+class CheckJobRegistry:
+    """
+    Manual availability sweeps as jobs.
+
+    Every sweep gets an id, checks a set of devices with bounded
+    concurrency and keeps its results by device. Subscribers receive every
+    result as it is produced, cancelled jobs stop their remaining probes,
+    and finished jobs are kept for CHECK_JOB_RETENTION_SECONDS.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CheckJobRegistry, cls).__new__(cls)
+            cls._instance._jobs = {}  # job_id -> job state
+        return cls._instance
+
+    def _purge(self):
+        """Forget finished jobs past their retention"""
+        cutoff = time.time() - config.CHECK_JOB_RETENTION_SECONDS
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job["finished_at"] and job["finished_at"] < cutoff]:
+            del self._jobs[job_id]
+
+    def start(self, device_ids: List[int], max_concurrent: int = config.MAX_CONCURRENT_CHECKS) -> Dict[str, Any]:
+        """Create a job for the devices and start it in the background"""
+        self._purge()
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "status": "running",
+            "device_ids": list(dict.fromkeys(device_ids)),
+            "max_concurrent": max_concurrent,
+            "completed_count": 0,
+            "start_time": time.time(),
+            "finished_at": None,
+            "error": None,
+            "results": {},
+            "subscribers": [],
+        }
+        self._jobs[job_id] = job
+        job["task"] = asyncio.create_task(self._run(job))
+        return self.status(job_id)
+
+    def _publish(self, job: Dict[str, Any], event: str, data: Dict[str, Any]):
+        for queue in job["subscribers"]:
+            queue.put_nowait((event, data))
+
+    async def _run(self, job: Dict[str, Any]):
+        semaphore = asyncio.Semaphore(job["max_concurrent"])
+
+        async def check(device_id: int):
+            async with semaphore:
+                try:
+                    result = await AvailabilityService.check_device_availability(device_id)
+                except Exception as e:
+                    print(f"Error checking device {device_id}: {str(e)}")
+                    result = {"device_id": device_id, "is_available": False, "check_method": "error",
+                              "error": str(e)}
+            job["results"][device_id] = result
+            job["completed_count"] += 1
+            self._publish(job, "result", result)
+
+        try:
+            await asyncio.gather(*(check(device_id) for device_id in job["device_ids"]))
+            job["status"] = "completed"
+        except asyncio.CancelledError:
+            job["status"] = "cancelled"
+        except Exception as e:
+            print(f"Error in availability check job {job['id']}: {str(e)}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+        finally:
+            job["finished_at"] = time.time()
+            self._publish(job, "done", self.status(job["id"]))
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Progress of a job, with an estimate of the total run time while it runs"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        elapsed_seconds = (job["finished_at"] or time.time()) - job["start_time"]
+        total_count = len(job["device_ids"])
+        estimated_total = 0
+        if job["completed_count"] > 0:
+            estimated_total = (elapsed_seconds / job["completed_count"]) * total_count
+        return {
+            "id": job["id"],
+            "status": job["status"],
+            "in_progress": job["status"] == "running",
+            "completed_count": job["completed_count"],
+            "total_count": total_count,
+            "max_concurrent": job["max_concurrent"],
+            "start_time": job["start_time"],
+            "finished_at": job["finished_at"],
+            "elapsed_seconds": elapsed_seconds,
+            "estimated_total_seconds": estimated_total,
+            "error": job["error"],
+        }
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        """All retained jobs, newest first"""
+        self._purge()
+        return sorted((self.status(job_id) for job_id in self._jobs), key=lambda j: j["start_time"], reverse=True)
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Most recently started job"""
+        jobs = self.jobs()
+        return jobs[0] if jobs else None
+
+    def running(self) -> Optional[Dict[str, Any]]:
+        """Most recently started job that is still running"""
+        return next((job for job in self.jobs() if job["in_progress"]), None)
+
+    def results(self, job_id: str) -> Optional[List[Dict[str, Any]]]:
+        job = self._jobs.get(job_id)
+        return list(job["results"].values()) if job else None
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a running job and wait for it to stop; results so far are kept"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job["status"] == "running":
+            job["task"].cancel()
+            await asyncio.gather(job["task"], return_exceptions=True)
+        return self.status(job_id)
+
+    async def events(self, job_id: str) -> AsyncIterator[tuple]:
+        """
+        (event, data) pairs for a job: the results produced so far, then
+        every new result, then a final "done" with the job status.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+
+        queue = asyncio.Queue()
+        # Replay and subscribe in one step so no result is missed or sent twice
+        for result in list(job["results"].values()):
+            queue.put_nowait(("result", result))
+        if job["status"] in FINISHED_STATES:
+            queue.put_nowait(("done", self.status(job_id)))
+        else:
+            job["subscribers"].append(queue)
+
+        try:
+            while True:
+                event, data = await queue.get()
+                yield event, data
+                if event == "done":
+                    return
+        finally:
+            if queue in job["subscribers"]:
+                job["subscribers"].remove(queue)
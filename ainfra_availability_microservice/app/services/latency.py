@@ -0,0 +1,173 @@
+# app/services/latency.py
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from app.models.models import AvailabilityCheck, LatencySketch
+from app.services.rollups import truncate
+from app.utils.sketch import QuantileSketch
+
+# Device id of the fleet-wide sketches
+FLEET = 0
+# Bucket sizes kept per device and for the whole fleet
+DEVICE_RESOLUTIONS = ("hour", "day")
+FLEET_RESOLUTIONS = ("minute", "hour", "day")
+
+
+def pick_resolution(start: datetime, end: datetime, fleet: bool) -> str:
+    """Finest resolution that keeps the number of merged buckets small"""
+    span = end - start
+    if fleet and span <= timedelta(hours=6):
+        return "minute"
+    if span <= timedelta(days=7):
+        return "hour"
+    return "day"
+
+
+class LatencyService:
+    """
+    Response time percentiles from stored quantile sketches.
+
+    The result writer adds every response time to the sketch of its
+    device and of the fleet for each bucket size; percentiles for a window
+    merge the sketches of the buckets it covers, so no raw rows are read.
+    Window edges are as precise as the bucket size used.
+    """
+
+    @staticmethod
+    def apply_results(db: Session, rows: List[Dict[str, Any]]) -> None:
+        """Add the response times of availability_checks rows to the sketches (caller commits)"""
+        sketches: Dict[Tuple[str, int, datetime], QuantileSketch] = {}
+        for row in rows:
+            response_time = row.get("response_time")
+            if response_time is None:
+                continue
+            for resolution in FLEET_RESOLUTIONS:
+                bucket_start = truncate(row["timestamp"], resolution)
+                keys = [(resolution, FLEET, bucket_start)]
+                if resolution in DEVICE_RESOLUTIONS:
+                    keys.append((resolution, row["device_id"], bucket_start))
+                for key in keys:
+                    sketch = sketches.get(key)
+                    if sketch is None:
+                        sketch = sketches[key] = QuantileSketch()
+                    sketch.add(response_time)
+        if not sketches:
+            return
+
+        existing = {
+            (r.resolution, r.device_id, r.bucket_start): r for r in db.query(LatencySketch).filter(
+                tuple_(LatencySketch.resolution, LatencySketch.device_id, LatencySketch.bucket_start).in_(
+                    list(sketches))
+            ).all()
+        }
+        for key, sketch in sketches.items():
+            stored = existing.get(key)
+            if stored is None:
+                resolution, device_id, bucket_start = key
+                db.add(LatencySketch(resolution=resolution, device_id=device_id, bucket_start=bucket_start,
+                                     count=sketch.count, sketch=sketch.to_json()))
+                continue
+            merged = QuantileSketch.from_json(stored.sketch).merge(sketch)
+            stored.count = merged.count
+            stored.sketch = merged.to_json()
+
+    @staticmethod
+    def backfill(db: Session, batch_size: int = 10000) -> int:
+        """
+        Build the sketches from raw checks if there are none yet.
+        Returns the number of checks folded in.
+        """
+        if db.query(LatencySketch.device_id).first() is not None:
+            return 0
+
+        query = db.query(
+            AvailabilityCheck.device_id,
+            AvailabilityCheck.timestamp,
+            AvailabilityCheck.response_time
+        ).filter(AvailabilityCheck.response_time.isnot(None)).order_by(
+            AvailabilityCheck.timestamp).yield_per(batch_size)
+
+        processed = 0
+        batch = []
+        for device_id, timestamp, response_time in query:
+            batch.append({"device_id": device_id, "timestamp": timestamp, "response_time": response_time})
+            if len(batch) >= batch_size:
+                LatencyService.apply_results(db, batch)
+                db.flush()
+                processed += len(batch)
+                batch = []
+
+        LatencyService.apply_results(db, batch)
+        processed += len(batch)
+        db.commit()
+
+        if processed:
+            print(f"Backfilled latency sketches from {processed} checks")
+        return processed
+
+    @staticmethod
+    def _merge(db: Session, resolution: str, start: datetime, end: datetime,
+               device_id: Optional[int] = None, per_device: bool = False) -> Dict[int, QuantileSketch]:
+        """Merged sketch per device id (FLEET for the fleet) over the buckets in [start, end]"""
+        query = db.query(LatencySketch.device_id, LatencySketch.sketch).filter(
+            LatencySketch.resolution == resolution,
+            LatencySketch.bucket_start >= truncate(start, resolution),
+            LatencySketch.bucket_start <= end
+        )
+        if device_id is not None:
+            query = query.filter(LatencySketch.device_id == device_id)
+        elif per_device:
+            query = query.filter(LatencySketch.device_id != FLEET)
+        else:
+            query = query.filter(LatencySketch.device_id == FLEET)
+
+        merged: Dict[int, QuantileSketch] = {}
+        for sketch_device_id, data in query.yield_per(5000):
+            sketch = QuantileSketch.from_json(data)
+            if sketch_device_id in merged:
+                merged[sketch_device_id].merge(sketch)
+            else:
+                merged[sketch_device_id] = sketch
+        return merged
+
+    @staticmethod
+    def get_percentiles(
+            db: Session,
+            start: datetime,
+            end: Optional[datetime] = None,
+            device_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """p50/p95/p99 response time of the fleet or one device between start and end"""
+        end = end or datetime.utcnow()
+        scope = FLEET if device_id is None else device_id
+        resolution = pick_resolution(start, end, fleet=device_id is None)
+        sketch = LatencyService._merge(db, resolution, start, end, device_id=scope).get(scope) or QuantileSketch()
+        return {
+            "device_id": device_id,
+            "start": truncate(start, resolution),
+            "end": end,
+            "resolution": resolution,
+            "count": sketch.count,
+            **sketch.percentiles(),
+        }
+
+    @staticmethod
+    def get_device_percentiles(
+            db: Session,
+            start: datetime,
+            end: Optional[datetime] = None,
+            limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """p50/p95/p99 response time of every device between start and end, slowest p99 first"""
+        end = end or datetime.utcnow()
+        resolution = pick_resolution(start, end, fleet=False)
+        merged = LatencyService._merge(db, resolution, start, end, per_device=True)
+        devices = [
+            {"device_id": device_id, "count": sketch.count, **sketch.percentiles()}
+            for device_id, sketch in merged.items()
+        ]
+        devices.sort(key=lambda d: d["p99"] or 0, reverse=True)
+        return devices[:limit] if limit else devices
@@ -0,0 +1,92 @@
+# app/services/latest_state.py
+from datetime import datetime
+from typing import Dict, Any, List
+
+from sqlalchemy import func, and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.models import Device, AvailabilityCheck, DeviceLatestState
+
+
+class LatestStateService:
+    @staticmethod
+    def save(db: Session, rows: List[Dict[str, Any]]) -> None:
+        """Upsert device_latest_state from availability_checks rows (caller commits)"""
+        newest: Dict[int, Dict[str, Any]] = {}
+        for row in rows:
+            current = newest.get(row["device_id"])
+            if current is None or row["timestamp"] >= current["timestamp"]:
+                newest[row["device_id"]] = row
+        if not newest:
+            return
+
+        existing = {
+            state.device_id: state for state in db.query(DeviceLatestState).filter(
+                DeviceLatestState.device_id.in_(list(newest))
+            ).all()
+        }
+        now = datetime.utcnow()
+        for device_id, row in newest.items():
+            state = existing.get(device_id)
+            if state is None:
+                state = DeviceLatestState(device_id=device_id)
+                db.add(state)
+            elif state.timestamp > row["timestamp"]:
+                continue
+            state.timestamp = row["timestamp"]
+            state.is_available = row["is_available"]
+            state.response_time = row.get("response_time")
+            state.check_method = row["check_method"]
+            state.error_message = row.get("error_message")
+            state.probe_policy = row.get("probe_policy")
+            state.updated_at = now
+
+    @staticmethod
+    def backfill(db: Session) -> int:
+        """Fill device_latest_state from the raw checks if it is empty"""
+        if db.query(DeviceLatestState.device_id).first() is not None:
+            return 0
+
+        subquery = db.query(
+            AvailabilityCheck.device_id,
+            func.max(AvailabilityCheck.timestamp).label('max_timestamp')
+        ).group_by(AvailabilityCheck.device_id).subquery()
+
+        latest_checks = db.query(AvailabilityCheck).join(
+            subquery,
+            and_(
+                AvailabilityCheck.device_id == subquery.c.device_id,
+                AvailabilityCheck.timestamp == subquery.c.max_timestamp
+            )
+        ).all()
+
+        LatestStateService.save(db, [
+            {
+                "device_id": check.device_id,
+                "timestamp": check.timestamp,
+                "is_available": check.is_available,
+                "response_time": check.response_time,
+                "check_method": check.check_method,
+                "error_message": check.error_message,
+                "probe_policy": check.probe_policy
+            }
+            for check in latest_checks
+        ])
+        db.commit()
+        return len(latest_checks)
+
+    @staticmethod
+    async def get_version(db: AsyncSession) -> str:
+        """
+        Cheap fingerprint of the /latest payload: changes whenever a latest
+        state or a device row changes.
+        """
+        count, last_update = (await db.execute(
+            select(func.count(DeviceLatestState.device_id), func.max(DeviceLatestState.updated_at))
+        )).one()
+        device_count, last_device_update = (await db.execute(
+            select(func.count(Device.id), func.max(Device.updated_at))
+        )).one()
+        return f"{count}-{last_update and last_update.timestamp()}-{device_count}-" \
+               f"{last_device_update and last_device_update.timestamp()}"
@@ -0,0 +1,182 @@
+# app/services/live_stats.py
+import heapq
+import itertools
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import pytz
+
+import config
+
+# Windows accepted by /stats time_range, in seconds; "all" has no window
+STATS_WINDOWS = {
+    "30m": 30 * 60,
+    "1h": 60 * 60,
+    "6h": 6 * 60 * 60,
+    "24h": 24 * 60 * 60,
+    "7d": 7 * 24 * 60 * 60,
+}
+
+
+def _epoch(timestamp: str) -> float:
+    """Seconds since the epoch for a naive UTC ISO timestamp"""
+    return datetime.fromisoformat(timestamp).replace(tzinfo=pytz.utc).timestamp()
+
+
+class LiveStats:
+    """
+    Real-time monitoring aggregates kept in memory and updated with every
+    persisted check result, so /stats needs no SQL for them.
+
+    Holds the latest state per device, check method counters and running
+    sums over those states, and per window a ring of time buckets each
+    holding a size-K min-heap of the slowest checks. A window query merges
+    at most STATS_WINDOW_BUCKETS + 1 heaps; buckets are 1/STATS_WINDOW_BUCKETS
+    of the window wide, so the window edge is that precise.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(LiveStats, cls).__new__(cls)
+            cls._instance._counter = itertools.count()
+            cls._instance._reset()
+        return cls._instance
+
+    def _reset(self):
+        self._latest: Dict[int, Dict[str, Any]] = {}
+        self._method_counts: Dict[str, int] = {}
+        self._up_count = 0
+        self._response_time_sum = 0.0
+        self._response_time_count = 0
+        # window -> {bucket index -> min-heap of (response_time, seq, check)}
+        self._slowest: Dict[str, Dict[int, list]] = {window: {} for window in STATS_WINDOWS}
+        self._slowest_all: list = []
+
+    def load(self, latest: List[Dict[str, Any]], slow_checks: List[Dict[str, Any]]):
+        """Seed from the database on startup: latest states and recent slow checks"""
+        self._reset()
+        for state in latest:
+            self._set_latest(state)
+        seen = set()
+        for check in slow_checks:
+            # The same check can be among the slowest of several windows
+            if (check["device_id"], check["timestamp"]) not in seen:
+                seen.add((check["device_id"], check["timestamp"]))
+                self._add_slow(check)
+
+    def _contribution(self, state: Dict[str, Any], sign: int):
+        self._method_counts[state["check_method"]] = self._method_counts.get(state["check_method"], 0) + sign
+        if not self._method_counts[state["check_method"]]:
+            del self._method_counts[state["check_method"]]
+        if state["is_available"]:
+            self._up_count += sign
+            if state["response_time"]:
+                self._response_time_sum += sign * state["response_time"]
+                self._response_time_count += sign
+
+    def _set_latest(self, state: Dict[str, Any]):
+        previous = self._latest.get(state["device_id"])
+        if previous is not None:
+            if previous["timestamp"] > state["timestamp"]:
+                return
+            self._contribution(previous, -1)
+        self._latest[state["device_id"]] = state
+        self._contribution(state, 1)
+
+    def _push(self, heap: list, check: Dict[str, Any]):
+        entry = (check["response_time"], next(self._counter), check)
+        if len(heap) < config.STATS_TOP_K:
+            heapq.heappush(heap, entry)
+        elif entry[0] > heap[0][0]:
+            heapq.heapreplace(heap, entry)
+
+    def _add_slow(self, check: Dict[str, Any]):
+        """File an available check with a response time under every window"""
+        if not check["is_available"] or not check["response_time"]:
+            return
+        now = datetime.utcnow().replace(tzinfo=pytz.utc).timestamp()
+        at = _epoch(check["timestamp"])
+        self._push(self._slowest_all, check)
+        for window, seconds in STATS_WINDOWS.items():
+            width = seconds / config.STATS_WINDOW_BUCKETS
+            index = int(at // width)
+            oldest = int(now // width) - config.STATS_WINDOW_BUCKETS
+            if index < oldest:
+                continue
+            buckets = self._slowest[window]
+            self._push(buckets.setdefault(index, []), check)
+            for stale in [i for i in buckets if i < oldest]:
+                del buckets[stale]
+
+    def record(self, result: Dict[str, Any]):
+        """Apply one check result"""
+        state = {
+            "device_id": result["device_id"],
+            "device_name": result.get("device_name"),
+            "is_available": result["is_available"],
+            "response_time": result.get("response_time"),
+            "check_method": result.get("check_method") or "unknown",
+            "probe_policy": result.get("probe_policy"),
+            "timestamp": result["timestamp"],
+            "error": result.get("error"),
+        }
+        self._set_latest(state)
+        self._add_slow(state)
+
+    def record_many(self, results: List[Dict[str, Any]]):
+        for result in results:
+            self.record(result)
+
+    def forget(self, device_ids: List[int]):
+        """Drop devices that no longer exist"""
+        for device_id in device_ids:
+            previous = self._latest.pop(device_id, None)
+            if previous is not None:
+                self._contribution(previous, -1)
+
+    def get(self, device_id: int) -> Optional[Dict[str, Any]]:
+        """Latest state of one device"""
+        return self._latest.get(device_id)
+
+    def latest(self) -> List[Dict[str, Any]]:
+        """Latest state of every device, same shape as get_latest_availability"""
+        return list(self._latest.values())
+
+    def summary(self) -> Dict[str, Any]:
+        """Counts over the latest states"""
+        total = len(self._latest)
+        return {
+            "devices_available": self._up_count,
+            "devices_unavailable": total - self._up_count,
+            "availability_rate": (self._up_count / total) * 100 if total else 0,
+            "avg_response_time_ms": (self._response_time_sum / self._response_time_count)
+            if self._response_time_count else 0,
+            "check_methods": dict(self._method_counts),
+        }
+
+    def slowest(self, time_range: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Slowest available checks within a /stats time range ("all" or None for all time)"""
+        if time_range not in STATS_WINDOWS:
+            heaps = [self._slowest_all]
+        else:
+            width = STATS_WINDOWS[time_range] / config.STATS_WINDOW_BUCKETS
+            oldest = int(datetime.utcnow().replace(tzinfo=pytz.utc).timestamp() // width) - config.STATS_WINDOW_BUCKETS
+            heaps = [heap for index, heap in self._slowest[time_range].items() if index >= oldest]
+
+        # Skip checks of devices removed since
+        entries = heapq.nlargest(config.STATS_TOP_K, (
+            entry for entry in itertools.chain.from_iterable(heaps) if entry[2]["device_id"] in self._latest
+        ))
+        return [
+            {
+                "device_id": check["device_id"],
+                "device_name": self._latest[check["device_id"]]["device_name"],
+                "is_available": check["is_available"],
+                "response_time": check["response_time"],
+                "check_method": check["check_method"],
+                "timestamp": check["timestamp"],
+                "error": check["error"]
+            }
+            for _, _, check in entries
+        ]
@@ -0,0 +1,314 @@
+# app/services/probe.py
+import asyncio
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.models import Device, ProbePolicy, DeviceProbeMemo
+from app.schemas.schemas import ProbePolicyCreate, DeviceProbeAssignment
+from app.utils.ping import ping_device_async
+from app.utils.tcp_connect import TcpConnectProber
+
+# Used when neither the device, its group nor the settings name a policy.
+# Same verdict as the original check: any open standard port is enough,
+# otherwise all of three pings must answer. The ports and the pings run
+# side by side and the first success decides, so a host that is down fails
+# after one probe timeout instead of one per port.
+DEFAULT_PROBE_POLICY = {
+    "name": "default",
+    "probes": [
+        {"method": "tcp", "port": 80},
+        {"method": "tcp", "port": 22},
+        {"method": "tcp", "port": 443},
+        {"method": "tcp", "port": 8080},
+        {"method": "tcp", "port": 3389},
+        {"method": "icmp", "count": 3},
+    ],
+    "mode": "parallel",
+    "quorum": 1,
+    "probe_timeout": 1.0,
+}
+
+# Check method labels stored with results
+METHOD_LABELS = {"tcp": "port_check", "icmp": "ping"}
+
+
+class ProbeService:
+    @staticmethod
+    def get_policies(db: Session) -> List[ProbePolicy]:
+        """Get all stored probe policies"""
+        return db.query(ProbePolicy).order_by(ProbePolicy.name).all()
+
+    @staticmethod
+    def save_policy(db: Session, data: ProbePolicyCreate, policy_id: Optional[int] = None) -> Optional[ProbePolicy]:
+        """Create a policy, or replace an existing one when policy_id is given"""
+        if policy_id is None:
+            policy = ProbePolicy()
+            db.add(policy)
+        else:
+            policy = db.query(ProbePolicy).filter(ProbePolicy.id == policy_id).first()
+            if not policy:
+                return None
+
+        if data.is_default:
+            # Only one policy can be the default
+            db.query(ProbePolicy).filter(ProbePolicy.is_default == True).update({"is_default": False})
+
+        values = data.model_dump()
+        values["probes"] = [probe.model_dump(exclude_none=True) for probe in data.probes]
+        for key, value in values.items():
+            setattr(policy, key, value)
+
+        db.commit()
+        db.refresh(policy)
+        return policy
+
+    @staticmethod
+    def delete_policy(db: Session, policy_id: int) -> bool:
+        """Delete a policy and detach it from its devices"""
+        policy = db.query(ProbePolicy).filter(ProbePolicy.id == policy_id).first()
+        if not policy:
+            return False
+
+        db.query(Device).filter(Device.probe_policy_id == policy_id).update({"probe_policy_id": None})
+        db.delete(policy)
+        db.commit()
+        return True
+
+    @staticmethod
+    def assign_device(db: Session, device_id: int, assignment: DeviceProbeAssignment) -> Optional[Device]:
+        """Set the policy and/or probe group of a device"""
+        device = db.query(Device).filter(Device.id == device_id).first()
+        if not device:
+            return None
+
+        for key, value in assignment.model_dump(exclude_unset=True).items():
+            setattr(device, key, value)
+
+        db.commit()
+        db.refresh(device)
+        return device
+
+    @staticmethod
+    def resolve_policy(db: Session, device: Device) -> Dict[str, Any]:
+        """
+        Pick the probe policy for a device.
+
+        Order: policy assigned to the device, policy of its probe group,
+        policy flagged as default, built-in default.
+        """
+        if device.probe_policy_id and device.probe_policy:
+            return device.probe_policy.as_policy()
+
+        if device.probe_group:
+            group_policy = db.query(ProbePolicy).filter(ProbePolicy.group_name == device.probe_group).first()
+            if group_policy:
+                return group_policy.as_policy()
+
+        default_policy = db.query(ProbePolicy).filter(ProbePolicy.is_default == True).first()
+        if default_policy:
+            return default_policy.as_policy()
+
+        return dict(DEFAULT_PROBE_POLICY)
+
+    @staticmethod
+    def load_targets(
+            db: Session,
+            device_ids: Optional[List[int]] = None,
+            active_only: bool = True
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Load everything needed to probe devices in a constant number of queries.
+        Scheduled checks and sweeps probe active devices only; an on-demand
+        check of a single device passes active_only=False.
+
+        Returns device_id -> {device_id, device_name, ip_address, policy, preferred};
+        the result is plain data so probing needs no database session.
+        """
+        policies = db.query(ProbePolicy).all()
+        by_id = {p.id: p.as_policy() for p in policies}
+        by_group = {p.group_name: p.as_policy() for p in policies if p.group_name}
+        default_policy = next((p.as_policy() for p in policies if p.is_default), dict(DEFAULT_PROBE_POLICY))
+
+        query = db.query(Device)
+        if active_only:
+            query = query.filter(Device.is_active == True)
+        if device_ids is not None:
+            query = query.filter(Device.id.in_(device_ids))
+        devices = query.all()
+
+        memo_query = db.query(DeviceProbeMemo)
+        if device_ids is not None:
+            memo_query = memo_query.filter(DeviceProbeMemo.device_id.in_(device_ids))
+        memos = {m.device_id: m.as_probe() for m in memo_query.all()}
+
+        targets = {}
+        for device in devices:
+            policy = by_id.get(device.probe_policy_id) or by_group.get(device.probe_group) or default_policy
+            targets[device.id] = {
+                "device_id": device.id,
+                "device_name": device.name,
+                "ip_address": device.ip_address,
+                "policy": policy,
+                "preferred": memos.get(device.id),
+            }
+        return targets
+
+    @staticmethod
+    async def _tcp_probe(ip_address: str, port: int, timeout: float) -> Tuple[bool, Optional[float]]:
+        """Connect to a TCP port, returns (success, connect_time_ms)"""
+        return await TcpConnectProber().connect(str(ip_address), port, timeout)
+
+    @staticmethod
+    async def run_probe(ip_address: str, probe: Dict[str, Any], timeout: float) -> Tuple[bool, Optional[float]]:
+        """Run a single probe, returns (success, response_time_ms)"""
+        if probe["method"] == "tcp":
+            return await ProbeService._tcp_probe(ip_address, probe["port"], timeout)
+        if probe["method"] == "icmp":
+            # Every one of count pings has to answer
+            response_times = []
+            for _ in range(probe.get("count") or 1):
+                ok, response_time = await ping_device_async(ip_address, timeout=timeout)
+                if not ok:
+                    return False, None
+                if response_time:
+                    response_times.append(response_time)
+            return True, sum(response_times) / len(response_times) if response_times else None
+        raise ValueError(f"Unknown probe method: {probe['method']}")
+
+    @staticmethod
+    def _describe(probe: Dict[str, Any]) -> str:
+        if probe["method"] == "tcp":
+            return f"tcp:{probe['port']}"
+        count = probe.get("count") or 1
+        return f"{probe['method']}x{count}" if count > 1 else probe["method"]
+
+    @staticmethod
+    def _same_probe(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+        """Same method and port; memos do not store probe options such as the ping count"""
+        return a["method"] == b["method"] and a.get("port") == b.get("port")
+
+    @staticmethod
+    async def evaluate(
+            ip_address: str,
+            policy: Dict[str, Any],
+            preferred: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Run the policy's probes until the verdict is decided.
+
+        With n probes and a quorum of k the device is up as soon as k probes
+        succeed and down as soon as n - k + 1 probes fail; remaining probes
+        are skipped (sequential) or cancelled (parallel).
+
+        If preferred names one of the policy's probes (the one that answered
+        last time) it runs alone first, so a healthy device usually costs a
+        single probe and the rest are only fanned out when it fails.
+        """
+        probes = policy["probes"]
+        quorum = min(policy["quorum"], len(probes))
+        max_failures = len(probes) - quorum
+        timeout = policy["probe_timeout"]
+
+        successes = []  # (probe, response_time)
+        failures = 0
+        probes_run = []
+
+        def decided():
+            return len(successes) >= quorum or failures > max_failures
+
+        def record(probe, ok, response_time):
+            nonlocal failures
+            probes_run.append({"probe": ProbeService._describe(probe), "success": ok, "response_time": response_time})
+            if ok:
+                successes.append((probe, response_time))
+            else:
+                failures += 1
+
+        remaining = list(probes)
+        preferred = next((p for p in remaining if preferred and ProbeService._same_probe(p, preferred)), None)
+        if preferred is not None:
+            remaining.remove(preferred)
+            ok, response_time = await ProbeService.run_probe(ip_address, preferred, timeout)
+            record(preferred, ok, response_time)
+
+        if decided():
+            remaining = []
+
+        if policy["mode"] == "sequential":
+            for probe in remaining:
+                ok, response_time = await ProbeService.run_probe(ip_address, probe, timeout)
+                record(probe, ok, response_time)
+                if decided():
+                    break
+        elif remaining:
+            tasks = {
+                asyncio.create_task(ProbeService.run_probe(ip_address, probe, timeout)): probe
+                for probe in remaining
+            }
+            pending = set(tasks)
+            try:
+                while pending and not decided():
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        try:
+                            ok, response_time = task.result()
+                        except Exception:
+                            ok, response_time = False, None
+                        record(tasks[task], ok, response_time)
+            finally:
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.gather(*pending, return_exceptions=True)
+
+        is_available = len(successes) >= quorum
+        if is_available:
+            response_times = [rt for _, rt in successes if rt]
+            # The probe that completed the quorum names the method
+            check_method = METHOD_LABELS.get(successes[-1][0]["method"], successes[-1][0]["method"])
+            return {
+                "is_available": True,
+                "response_time": sum(response_times) / len(response_times) if response_times else None,
+                "check_method": check_method,
+                "error_message": None,
+                "probe_policy": policy["name"],
+                "probes_run": probes_run,
+                "successful_probe": successes[0][0],
+            }
+
+        return {
+            "is_available": False,
+            "response_time": None,
+            "check_method": "all_failed",
+            "error_message": f"Device is not reachable ({len(successes)}/{quorum} probes succeeded)",
+            "probe_policy": policy["name"],
+            "probes_run": probes_run,
+            "successful_probe": successes[0][0] if successes else None,
+        }
+
+    @staticmethod
+    def save_memos(db: Session, successful_probes: Dict[int, Dict[str, Any]]) -> None:
+        """Remember the probes that reached devices (caller commits)"""
+        if not successful_probes:
+            return
+
+        existing = {
+            memo.device_id: memo for memo in db.query(DeviceProbeMemo).filter(
+                DeviceProbeMemo.device_id.in_(list(successful_probes))
+            ).all()
+        }
+        now = datetime.utcnow()
+        for device_id, probe in successful_probes.items():
+            memo = existing.get(device_id)
+            if memo and memo.as_probe() == probe:
+                memo.hits = (memo.hits or 0) + 1
+            else:
+                if not memo:
+                    memo = DeviceProbeMemo(device_id=device_id)
+                    db.add(memo)
+                memo.method = probe["method"]
+                memo.port = probe.get("port")
+                memo.hits = 1
+            memo.last_success_at = now
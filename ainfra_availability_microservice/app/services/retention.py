@@ -0,0 +1,259 @@
+# app/services/retention.py
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List
+
+from sqlalchemy import delete, inspect, select, text
+
+from app.models.database import Base, SessionLocal, engine
+from app.models.models import AvailabilityCheck, AvailabilityRollupMinute, LatencySketch
+import config
+
+CHECKS_TABLE = AvailabilityCheck.__tablename__
+PARTITION_PREFIX = f"{CHECKS_TABLE}_p"
+
+# Raw checks partitioned by day; the primary key has to include the partition column
+PARTITIONED_CHECKS_DDL = f"""
+CREATE TABLE {CHECKS_TABLE} (
+    id SERIAL,
+    device_id INTEGER REFERENCES devices (id),
+    timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    is_available BOOLEAN,
+    response_time DOUBLE PRECISION,
+    check_method VARCHAR(50) NOT NULL,
+    error_message VARCHAR(255),
+    probe_policy VARCHAR(100),
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp)
+"""
+
+
+class RetentionService:
+    """
+    Keeps raw check storage bounded.
+
+    Raw checks older than RAW_RETENTION_DAYS are deleted in batches of
+    RETENTION_BATCH_SIZE with a short pause in between, so the result writer
+    is never blocked for long. On SQLite the freed pages are returned with
+    incremental vacuum. With CHECK_PARTITIONING=day on PostgreSQL the checks
+    live in daily partitions and expired days are dropped as a whole.
+    """
+    last_run: Dict[str, Any] = {}
+
+    @staticmethod
+    def _is_sqlite() -> bool:
+        return engine.dialect.name == "sqlite"
+
+    @staticmethod
+    def _partitioned() -> bool:
+        return config.CHECK_PARTITIONING == "day" and engine.dialect.name == "postgresql"
+
+    @staticmethod
+    def prepare_storage() -> None:
+        """Storage setup that has to happen before the tables are created"""
+        if config.CHECK_PARTITIONING == "day" and not RetentionService._partitioned():
+            print(f"Day partitioning needs PostgreSQL, {engine.dialect.name} uses batched deletes only")
+
+        if RetentionService._is_sqlite() and config.RAW_RETENTION_DAYS > 0:
+            with engine.connect() as conn:
+                if conn.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+                    # Takes effect for new databases right away. Existing ones need a full VACUUM,
+                    # which locks the database for as long as it takes, so it is not run at startup
+                    conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+                    conn.commit()
+                    if inspect(conn).has_table(CHECKS_TABLE):
+                        print("Deleted checks are not returned to the file system until incremental vacuum "
+                              "is enabled, run `python maintenance.py vacuum` while the service is stopped")
+
+        if RetentionService._partitioned() and not inspect(engine).has_table(CHECKS_TABLE):
+            tables = [t for t in Base.metadata.sorted_tables if t.name != CHECKS_TABLE]
+            Base.metadata.create_all(bind=engine, tables=tables)
+            with engine.begin() as conn:
+                conn.execute(text(PARTITIONED_CHECKS_DDL))
+                conn.execute(text(f"CREATE INDEX ix_{CHECKS_TABLE}_timestamp ON {CHECKS_TABLE} (timestamp)"))
+                conn.execute(text(
+                    f"CREATE INDEX ix_{CHECKS_TABLE}_device_timestamp ON {CHECKS_TABLE} (device_id, timestamp)"))
+                # Catches rows outside the prepared days instead of failing the insert
+                conn.execute(text(f"CREATE TABLE {CHECKS_TABLE}_default PARTITION OF {CHECKS_TABLE} DEFAULT"))
+            print("Created day-partitioned availability_checks table")
+
+    @staticmethod
+    def _partition_days(conn) -> List[datetime]:
+        names = conn.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table"
+        ), {"table": CHECKS_TABLE}).scalars().all()
+        days = []
+        for name in names:
+            if name.startswith(PARTITION_PREFIX):
+                try:
+                    days.append(datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d"))
+                except ValueError:
+                    continue
+        return sorted(days)
+
+    @staticmethod
+    def ensure_partitions() -> int:
+        """Create the daily partitions from today to CHECK_PARTITIONS_AHEAD_DAYS ahead"""
+        if not RetentionService._partitioned():
+            return 0
+
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        created = 0
+        with engine.begin() as conn:
+            existing = set(RetentionService._partition_days(conn))
+            for offset in range(config.CHECK_PARTITIONS_AHEAD_DAYS + 1):
+                day = today + timedelta(days=offset)
+                if day in existing:
+                    continue
+                conn.execute(text(
+                    f"CREATE TABLE {PARTITION_PREFIX}{day:%Y%m%d} PARTITION OF {CHECKS_TABLE} "
+                    f"FOR VALUES FROM ('{day:%Y-%m-%d}') TO ('{day + timedelta(days=1):%Y-%m-%d}')"
+                ))
+                created += 1
+        return created
+
+    @staticmethod
+    def drop_expired_partitions(cutoff: datetime) -> int:
+        """Drop daily partitions that end before the cutoff"""
+        if not RetentionService._partitioned():
+            return 0
+
+        dropped = 0
+        with engine.begin() as conn:
+            for day in RetentionService._partition_days(conn):
+                if day + timedelta(days=1) <= cutoff:
+                    conn.execute(text(f"DROP TABLE {PARTITION_PREFIX}{day:%Y%m%d}"))
+                    dropped += 1
+        return dropped
+
+    @staticmethod
+    def purge_raw_checks(cutoff: datetime) -> int:
+        """Delete raw checks older than the cutoff, RETENTION_BATCH_SIZE rows per transaction"""
+        deleted = 0
+        while True:
+            db = SessionLocal()
+            try:
+                batch = select(AvailabilityCheck.id).where(
+                    AvailabilityCheck.timestamp < cutoff
+                ).limit(config.RETENTION_BATCH_SIZE)
+                count = db.execute(
+                    delete(AvailabilityCheck).where(AvailabilityCheck.id.in_(batch)),
+                    execution_options={"synchronize_session": False}
+                ).rowcount
+                db.commit()
+            finally:
+                db.close()
+
+            deleted += count
+            if count < config.RETENTION_BATCH_SIZE:
+                return deleted
+            # Let the result writer in between batches
+            time.sleep(config.RETENTION_BATCH_PAUSE_SECONDS)
+
+    @staticmethod
+    def purge_minute_rollups(cutoff: datetime) -> int:
+        """Delete minute rollups older than the cutoff, about RETENTION_BATCH_SIZE rows per transaction"""
+        deleted = 0
+        while True:
+            db = SessionLocal()
+            try:
+                # Bucket boundary RETENTION_BATCH_SIZE rows in, or the cutoff for the last batch
+                boundary = db.query(AvailabilityRollupMinute.bucket_start).filter(
+                    AvailabilityRollupMinute.bucket_start < cutoff
+                ).order_by(AvailabilityRollupMinute.bucket_start).offset(config.RETENTION_BATCH_SIZE).limit(1).scalar()
+                if boundary is None:
+                    condition = AvailabilityRollupMinute.bucket_start < cutoff
+                else:
+                    condition = AvailabilityRollupMinute.bucket_start <= boundary
+                count = db.query(AvailabilityRollupMinute).filter(condition).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+
+            deleted += count
+            if boundary is None:
+                return deleted
+            time.sleep(config.RETENTION_BATCH_PAUSE_SECONDS)
+
+    @staticmethod
+    def purge_minute_sketches(cutoff: datetime) -> int:
+        """Delete minute latency sketches older than the cutoff (fleet only, one row per minute)"""
+        db = SessionLocal()
+        try:
+            count = db.query(LatencySketch).filter(
+                LatencySketch.resolution == "minute",
+                LatencySketch.bucket_start < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+            return count
+        finally:
+            db.close()
+
+    @staticmethod
+    def enable_incremental_vacuum() -> bool:
+        """
+        Switch an existing SQLite database to incremental vacuum with a full
+        VACUUM. Rewrites the whole file, so run it while the service is
+        stopped. Returns False when there was nothing to do.
+        """
+        if not RetentionService._is_sqlite():
+            return False
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+                return False
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+            return conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2
+
+    @staticmethod
+    def vacuum() -> None:
+        """Give freed space back: incremental vacuum on SQLite, VACUUM ANALYZE on PostgreSQL"""
+        if RetentionService._is_sqlite():
+            with engine.connect() as conn:
+                conn.execute(text("PRAGMA incremental_vacuum"))
+                conn.commit()
+        elif engine.dialect.name == "postgresql" and not RetentionService._partitioned():
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(f"VACUUM (ANALYZE) {CHECKS_TABLE}"))
+
+    @staticmethod
+    def run() -> Dict[str, Any]:
+        """One retention pass (blocking, run it on a worker thread)"""
+        start = time.perf_counter()
+        now = datetime.utcnow()
+        summary = {
+            "started_at": now.isoformat(),
+            "partitions_created": RetentionService.ensure_partitions(),
+            "partitions_dropped": 0,
+            "raw_checks_deleted": 0,
+            "minute_rollups_deleted": 0,
+        }
+
+        if config.RAW_RETENTION_DAYS > 0:
+            cutoff = now - timedelta(days=config.RAW_RETENTION_DAYS)
+            summary["partitions_dropped"] = RetentionService.drop_expired_partitions(cutoff)
+            # Partial days and rows outside the partitions
+            summary["raw_checks_deleted"] = RetentionService.purge_raw_checks(cutoff)
+
+        if config.MINUTE_ROLLUP_RETENTION_DAYS > 0:
+            minute_cutoff = now - timedelta(days=config.MINUTE_ROLLUP_RETENTION_DAYS)
+            summary["minute_rollups_deleted"] = RetentionService.purge_minute_rollups(minute_cutoff)
+            summary["minute_rollups_deleted"] += RetentionService.purge_minute_sketches(minute_cutoff)
+
+        if summary["raw_checks_deleted"] or summary["minute_rollups_deleted"]:
+            RetentionService.vacuum()
+
+        summary["duration_seconds"] = round(time.perf_counter() - start, 3)
+        RetentionService.last_run = summary
+        return summary
+
+
+async def run_retention():
+    """Scheduled retention pass"""
+    summary = await asyncio.to_thread(RetentionService.run)
+    if summary["raw_checks_deleted"] or summary["partitions_dropped"] or summary["minute_rollups_deleted"]:
+        print(f"Retention: {summary}")
@@ -0,0 +1,168 @@
+# app/services/rollups.py
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+
+from app.models.models import (
+    AvailabilityCheck,
+    AvailabilityRollupMinute,
+    AvailabilityRollupHour,
+    AvailabilityRollupDay,
+)
+
+# Resolution name -> (rollup table, bucket size)
+ROLLUPS = {
+    "minute": (AvailabilityRollupMinute, timedelta(minutes=1)),
+    "hour": (AvailabilityRollupHour, timedelta(hours=1)),
+    "day": (AvailabilityRollupDay, timedelta(days=1)),
+}
+
+
+def truncate(timestamp: datetime, resolution: str) -> datetime:
+    """Start of the bucket a timestamp falls into"""
+    if resolution == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if resolution == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown rollup resolution: {resolution}")
+
+
+class RollupService:
+    @staticmethod
+    def _aggregate(rows: List[Dict[str, Any]], resolution: str) -> Dict[Tuple[int, datetime], Dict[str, Any]]:
+        """Sum rows per (device_id, bucket_start)"""
+        buckets: Dict[Tuple[int, datetime], Dict[str, Any]] = {}
+        for row in rows:
+            key = (row["device_id"], truncate(row["timestamp"], resolution))
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = {"checks": 0, "ups": 0, "latency_count": 0, "latency_sum": 0.0,
+                                         "latency_max": None}
+            bucket["checks"] += 1
+            if row["is_available"]:
+                bucket["ups"] += 1
+            response_time = row.get("response_time")
+            if response_time is not None:
+                bucket["latency_count"] += 1
+                bucket["latency_sum"] += response_time
+                if bucket["latency_max"] is None or response_time > bucket["latency_max"]:
+                    bucket["latency_max"] = response_time
+        return buckets
+
+    @staticmethod
+    def apply_results(db: Session, rows: List[Dict[str, Any]]) -> None:
+        """
+        Add availability_checks rows to the minute, hour and day rollups (caller commits).
+
+        One query per resolution loads the buckets the batch touches; missing
+        buckets are created.
+        """
+        if not rows:
+            return
+
+        for resolution, (model, _) in ROLLUPS.items():
+            buckets = RollupService._aggregate(rows, resolution)
+            existing = {
+                (r.device_id, r.bucket_start): r for r in db.query(model).filter(
+                    tuple_(model.device_id, model.bucket_start).in_(list(buckets))
+                ).all()
+            }
+
+            for (device_id, bucket_start), values in buckets.items():
+                rollup = existing.get((device_id, bucket_start))
+                if rollup is None:
+                    db.add(model(device_id=device_id, bucket_start=bucket_start, **values))
+                    continue
+                rollup.checks += values["checks"]
+                rollup.ups += values["ups"]
+                rollup.latency_count += values["latency_count"]
+                rollup.latency_sum += values["latency_sum"]
+                if values["latency_max"] is not None and (
+                        rollup.latency_max is None or values["latency_max"] > rollup.latency_max):
+                    rollup.latency_max = values["latency_max"]
+
+    @staticmethod
+    def backfill(db: Session, batch_size: int = 10000) -> int:
+        """
+        Build the rollups from raw checks if they are empty.
+        Streams the raw table in timestamp order. Returns the number of checks folded in.
+        """
+        if db.query(AvailabilityRollupMinute.device_id).first() is not None:
+            return 0
+
+        query = db.query(
+            AvailabilityCheck.device_id,
+            AvailabilityCheck.timestamp,
+            AvailabilityCheck.is_available,
+            AvailabilityCheck.response_time
+        ).order_by(AvailabilityCheck.timestamp).yield_per(batch_size)
+
+        processed = 0
+        batch = []
+        for device_id, timestamp, is_available, response_time in query:
+            batch.append({
+                "device_id": device_id,
+                "timestamp": timestamp,
+                "is_available": is_available,
+                "response_time": response_time
+            })
+            if len(batch) >= batch_size:
+                RollupService.apply_results(db, batch)
+                db.flush()
+                processed += len(batch)
+                batch = []
+
+        RollupService.apply_results(db, batch)
+        processed += len(batch)
+        db.commit()
+
+        if processed:
+            print(f"Backfilled availability rollups from {processed} checks")
+        return processed
+
+    @staticmethod
+    def get_trend(
+            db: Session,
+            resolution: str,
+            start: datetime,
+            end: Optional[datetime] = None,
+            device_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Availability per bucket from start to end, across all devices or one.
+        Every bucket in the range is returned, empty ones with zero checks.
+        """
+        model, step = ROLLUPS[resolution]
+        end = end or datetime.utcnow()
+        first_bucket = truncate(start, resolution)
+
+        query = db.query(
+            model.bucket_start,
+            func.sum(model.checks),
+            func.sum(model.ups),
+            func.sum(model.latency_count),
+            func.sum(model.latency_sum),
+            func.max(model.latency_max)
+        ).filter(model.bucket_start >= first_bucket, model.bucket_start <= end)
+        if device_id is not None:
+            query = query.filter(model.device_id == device_id)
+        totals = {row[0]: row[1:] for row in query.group_by(model.bucket_start).all()}
+
+        trend = []
+        bucket_start = first_bucket
+        while bucket_start <= end:
+            checks, ups, latency_count, latency_sum, latency_max = totals.get(bucket_start, (0, 0, 0, 0.0, None))
+            trend.append({
+                "bucket_start": bucket_start,
+                "check_count": checks or 0,
+                "available_count": ups or 0,
+                "availability_rate": (ups / checks * 100) if checks else 0,
+                "avg_response_time": (latency_sum / latency_count) if latency_count else None,
+                "max_response_time": latency_max
+            })
+            bucket_start += step
+        return trend
@@ -5,6 +5,8 @@ from typing import Dict, Any, Callable
 import concurrent.futures
 from datetime import datetime
 
+from app.services.device_scheduler import DeviceCheckScheduler
+
 # Thread pool for background tasks
 thread_pool_executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
 
@@ -97,21 +99,21 @@ class AvailabilityScheduler:
     def stop(self):
         """Stop the scheduler"""
         self._scheduler.stop()
+        DeviceCheckScheduler().stop()
 
-    def schedule_availability_checks(self, coroutine_func, interval_minutes=1):
-        """Schedule availability checks for all devices"""
+    def schedule_availability_checks(self, interval_minutes=1):
+        """Start per-device availability checks, or update their default interval"""
         # Ensure valid interval
         if interval_minutes < 1:
             interval_minutes = 1
         elif interval_minutes > 1440:  # 24*60 = 1440 minutes in a day
             interval_minutes = 1440
 
-        # Schedule the task
-        self._scheduler.schedule_task(
-            task_id="check_all_devices_availability",
-            coroutine_func=coroutine_func,
-            interval_minutes=interval_minutes
-        )
+        device_scheduler = DeviceCheckScheduler()
+        if device_scheduler.running:
+            device_scheduler.set_default_interval(interval_minutes)
+        else:
+            device_scheduler.start(default_interval_minutes=interval_minutes)
 
     def schedule_device_sync(self, coroutine_func, interval_minutes=1):
         """Schedule device synchronization from main system"""
@@ -126,23 +128,10 @@ class AvailabilityScheduler:
             interval_minutes=interval_minutes
         )
 
-# Background task management
-background_check_status = {
-    "in_progress": False,
-    "completed_count": 0,
-    "total_count": 0,
-    "start_time": None,
-}
-
-# Store check results
-check_results = {}
-check_results_lock = asyncio.Lock()
-
-async def update_check_result(result):
-    """Update the check results with a new result"""
-    global check_results
-    if not result or "device_id" not in result:
-        return
-
-    async with check_results_lock:
-        check_results[result["device_id"]] = result
\ No newline at end of file
+    def schedule_retention(self, coroutine_func, interval_minutes=60):
+        """Schedule raw check retention and vacuum"""
+        self._scheduler.schedule_task(
+            task_id="retention",
+            coroutine_func=coroutine_func,
+            interval_minutes=max(1, interval_minutes)
+        )
@@ -0,0 +1,317 @@
+# app/services/sharding.py
+import asyncio
+import bisect
+import itertools
+import multiprocessing
+import pickle
+import socket
+import struct
+import zlib
+from typing import Dict, Any, Iterable, List, Optional
+
+from app.services.availability import AvailabilityService
+import config
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes; adding or removing a node only moves that node's keys"""
+
+    def __init__(self, virtual_nodes: int = 256):
+        self.virtual_nodes = virtual_nodes
+        self._points: List[int] = []
+        self._owners: Dict[int, int] = {}  # point -> node
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return zlib.crc32(value.encode())
+
+    def add(self, node: int):
+        for replica in range(self.virtual_nodes):
+            point = self._hash(f"worker-{node}-{replica}")
+            if point not in self._owners:
+                bisect.insort(self._points, point)
+                self._owners[point] = node
+
+    def remove(self, node: int):
+        self._points = [point for point in self._points if self._owners[point] != node]
+        self._owners = {point: owner for point, owner in self._owners.items() if owner != node}
+
+    def node_for(self, key: int) -> Optional[int]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, self._hash(f"device-{key}")) % len(self._points)
+        return self._owners[self._points[index]]
+
+
+# Messages between coordinator and workers: 4-byte length, then the pickled message
+FRAME_HEADER = struct.Struct("!I")
+
+
+def _send(writer: asyncio.StreamWriter, message: Any):
+    """Queue one message; the stream buffers it, so this never blocks the loop"""
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(FRAME_HEADER.pack(len(data)) + data)
+
+
+async def _receive(reader: asyncio.StreamReader) -> Any:
+    """Next message; raises asyncio.IncompleteReadError when the other side is gone"""
+    size, = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    return pickle.loads(await reader.readexactly(size))
+
+
+def _worker_main(sock: socket.socket, index: int):
+    """Entry point of a probe worker process"""
+    try:
+        asyncio.run(_serve(sock))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+
+
+async def _serve(sock: socket.socket):
+    """
+    Probe targets sent by the coordinator with this process's own event
+    loop and probe engines, and send every result back as it completes.
+    """
+    reader, writer = await asyncio.open_connection(sock=sock)
+    semaphore = asyncio.Semaphore(config.MAX_CONCURRENT_CHECKS)
+    probes = set()
+
+    async def probe(request_id: int, target: Dict[str, Any]):
+        async with semaphore:
+            try:
+                reply = (request_id, await AvailabilityService.probe_target(target), None)
+            except Exception as e:
+                reply = (request_id, None, str(e))
+        try:
+            _send(writer, reply)
+            await writer.drain()
+        except ConnectionError:
+            pass  # The coordinator is gone, the read loop ends as well
+
+    try:
+        while True:
+            message = await _receive(reader)
+            if message is None:
+                break
+            task = asyncio.create_task(probe(*message))
+            probes.add(task)
+            task.add_done_callback(probes.discard)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+class ShardedProbePool:
+    """
+    Spreads scheduled probes over worker processes.
+
+    The coordinator (the API process) keeps scheduling, aggregation and
+    persistence; devices are assigned to workers on a consistent hash
+    ring, each worker runs its own event loop with its own ICMP engine and
+    TCP prober, and targets and results travel as asyncio streams over a
+    socket pair per worker, so a busy worker never blocks the coordinator's
+    loop. A worker that dies is dropped from the ring, its devices move
+    to the others, and it is restarted and takes them back. Without
+    workers (AVAILABILITY_WORKERS <= 1) probes run in this process.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ShardedProbePool, cls).__new__(cls)
+            cls._instance._workers = {}  # index -> worker state
+            cls._instance._ring = HashRing(config.SHARD_VIRTUAL_NODES)
+            cls._instance._assignment = {}  # device_id -> worker index
+            cls._instance._pending = {}  # request_id -> (future, worker index)
+            cls._instance._counter = itertools.count()
+            cls._instance._loop = None
+            cls._instance._last_moved = 0
+        return cls._instance
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    @property
+    def size(self) -> int:
+        """Processes probing: the workers, or this process alone"""
+        return max(1, len(self._workers))
+
+    def start(self, workers: int = config.AVAILABILITY_WORKERS):
+        """Start the worker processes; one worker or fewer keeps probing in-process"""
+        if self.running or workers <= 1:
+            return
+        self._loop = asyncio.get_running_loop()
+        for index in range(workers):
+            self._spawn(index)
+        print(f"Started {workers} probe worker processes")
+
+    def _spawn(self, index: int):
+        context = multiprocessing.get_context("spawn")
+        parent, child = socket.socketpair()
+        process = context.Process(target=_worker_main, args=(child, index), daemon=True,
+                                  name=f"availability-worker-{index}")
+        process.start()
+        child.close()
+
+        previous = self._workers.get(index)
+        worker = self._workers[index] = {
+            "process": process,
+            "writer": self._loop.create_future(),
+            "alive": True,
+            "dispatched": previous["dispatched"] if previous else 0,
+            "completed": previous["completed"] if previous else 0,
+            "restarts": previous["restarts"] + 1 if previous else 0,
+        }
+        worker["reader"] = self._loop.create_task(self._read_results(index, worker, parent))
+        self._ring.add(index)
+        self.rebalance(self._assignment)
+
+    async def stop(self):
+        """Stop all workers and fail outstanding probes"""
+        workers, self._workers = self._workers, {}
+        for worker in workers.values():
+            writer = worker["writer"].result() if worker["writer"].done() else None
+            if writer is not None and not writer.is_closing():
+                _send(writer, None)
+                writer.close()
+        for worker in workers.values():
+            # Joined on a thread, the loop keeps serving while workers finish
+            await asyncio.to_thread(worker["process"].join, 5)
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+            worker["reader"].cancel()
+            if not worker["writer"].done():
+                worker["writer"].cancel()
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError("Probe worker pool stopped"))
+        self._pending = {}
+        self._ring = HashRing(config.SHARD_VIRTUAL_NODES)
+        if workers:
+            print("Probe worker processes stopped")
+
+    def rebalance(self, device_ids: Iterable[int]) -> int:
+        """Assign devices to workers on the ring; returns how many changed worker"""
+        assignment = {device_id: self._ring.node_for(device_id) for device_id in device_ids}
+        moved = sum(1 for device_id, worker in assignment.items()
+                    if device_id in self._assignment and self._assignment[device_id] != worker)
+        self._assignment = assignment
+        self._last_moved = moved
+        return moved
+
+    async def _read_results(self, index: int, worker: Dict[str, Any], sock: socket.socket):
+        """Reader task of one worker: resolves probes as their results arrive"""
+        writer = None
+        try:
+            reader, writer = await asyncio.open_connection(sock=sock)
+            worker["writer"].set_result(writer)
+            while True:
+                request_id, result, error = await _receive(reader)
+                worker["completed"] += 1
+                future, _ = self._pending.pop(request_id, (None, None))
+                if future is None or future.done():
+                    continue
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(RuntimeError(error))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if writer is None:
+                sock.close()
+            else:
+                writer.close()
+        # The worker's end closed: it exited, unless the pool is stopping
+        if self._workers.get(index) is worker:
+            self._worker_died(index)
+
+    def _worker_died(self, index: int):
+        worker = self._workers.get(index)
+        if worker is None or not worker["alive"]:
+            return
+        worker["alive"] = False
+        if worker["writer"].done():
+            worker["writer"].result().close()
+        else:
+            worker["writer"].set_exception(ConnectionResetError(f"Probe worker {index} exited"))
+        self._ring.remove(index)
+        moved = self.rebalance(self._assignment)
+        print(f"Probe worker {index} exited, {moved} devices moved to other workers")
+
+        for request_id, (future, owner) in list(self._pending.items()):
+            if owner == index:
+                del self._pending[request_id]
+                if not future.done():
+                    future.set_exception(ConnectionResetError(f"Probe worker {index} exited"))
+        self._loop.call_later(config.SHARD_RESTART_DELAY_SECONDS, self._restart, index)
+
+    def _restart(self, index: int):
+        if index in self._workers and not self._workers[index]["alive"]:
+            self._spawn(index)
+            print(f"Probe worker {index} restarted")
+
+    async def probe(self, target: Dict[str, Any]) -> Dict[str, Any]:
+        """Probe a target on the worker that owns the device (in-process without workers, or if it exits)"""
+        index = self._assignment.get(target["device_id"])
+        if index is None:
+            index = self._ring.node_for(target["device_id"])
+        worker = self._workers.get(index) if index is not None else None
+        if worker is None or not worker["alive"]:
+            return await AvailabilityService.probe_target(target)
+
+        request_id = next(self._counter)
+        future = self._loop.create_future()
+        self._pending[request_id] = (future, index)
+        try:
+            try:
+                writer = await worker["writer"]
+                _send(writer, (request_id, target))
+                # Waits only while the worker is behind on reading
+                await writer.drain()
+                worker["dispatched"] += 1
+            except ConnectionError:
+                # Fails this request along with the others pending on the worker
+                self._worker_died(index)
+            result = await asyncio.wait_for(future, timeout=config.SHARD_PROBE_TIMEOUT_SECONDS)
+        except ConnectionError:
+            # The worker exited before answering
+            return await AvailabilityService.probe_target(target)
+        finally:
+            self._pending.pop(request_id, None)
+
+        # The worker learned the probe on its copy of the target
+        if result.get("successful_probe"):
+            target["preferred"] = result["successful_probe"]
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Workers, their share of the devices and their traffic"""
+        devices: Dict[int, int] = {}
+        for index in self._assignment.values():
+            devices[index] = devices.get(index, 0) + 1
+        in_flight: Dict[int, int] = {}
+        for _, index in self._pending.values():
+            in_flight[index] = in_flight.get(index, 0) + 1
+        return {
+            "mode": "sharded" if self.running else "in-process",
+            "virtual_nodes": self._ring.virtual_nodes,
+            "devices_moved_on_last_rebalance": self._last_moved,
+            "workers": [
+                {
+                    "index": index,
+                    "pid": worker["process"].pid,
+                    "alive": worker["alive"],
+                    "devices": devices.get(index, 0),
+                    "in_flight": in_flight.get(index, 0),
+                    "dispatched": worker["dispatched"],
+                    "completed": worker["completed"],
+                    "restarts": worker["restarts"],
+                }
+                for index, worker in sorted(self._workers.items())
+            ],
+        }
@@ -1,94 +1,275 @@
 # app/services/sync.py
 import httpx
 import asyncio
+import json
+import time
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Iterable
 
-from app.models.models import Device, AvailabilityCheck
-from app.models.database import SessionLocal
+from app.models.models import Device, AvailabilityCheck, AvailabilityInterval, DeviceLatestState, LatencySketch
+from app.models.database import AsyncSessionLocal
+from app.schemas.schemas import DeviceEvent
+from app.services.device_scheduler import DeviceCheckScheduler
+from app.services.rollups import ROLLUPS
+from app.services.live_stats import LiveStats
+from app.services.http_clients import ServiceClients
 import config
 
 
-async def sync_devices():
+# Position in the main app's change feed: its cursor and the ETag of its last answer
+sync_state = {"cursor": None, "etag": None, "last_full_sync": None}
+
+
+async def sync_devices(full: bool = False):
     """
     Synchronize devices from the main API to local database.
-    Handles updates, creates, and hard-deletes devices that are no longer in the main system.
+
+    Asks the main app only for the changes since the previous sync, so a
+    quiet minute costs a single 304. A full sync (reconcile_devices) runs
+    first, every DEVICE_FULL_SYNC_INTERVAL minutes and when forced; it also
+    hard-deletes devices that are no longer in the main system, in case a
+    deletion was missed.
     """
-    print(f"Starting device synchronization: {datetime.now()}")
-    db = SessionLocal()
+    now = time.monotonic()
+    full = (full or sync_state["cursor"] is None
+            or now - sync_state["last_full_sync"] >= config.DEVICE_FULL_SYNC_INTERVAL * 60)
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(config.MAIN_API_URL)
+        client = ServiceClients().get("main_app")
+        if full:
+            cursor = await reconcile_devices(client)
+            if cursor is not None:
+                sync_state.update(cursor=cursor, etag=None, last_full_sync=now)
+            return
+
+        headers = {"If-None-Match": sync_state["etag"]} if sync_state["etag"] else {}
+        response = await client.get(config.MAIN_API_URL, params={"updated_since": sync_state["cursor"]},
+                                    headers=headers)
+        if response.status_code == 304:
+            return
+        if response.status_code != 200:
+            print(f"Error fetching devices: {response.status_code}")
+            return
+
+        changes = response.json()
+
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(apply_devices, changes["devices"], changes["deleted"])
+
+        sync_state["cursor"] = changes["cursor"]
+        sync_state["etag"] = response.headers.get("etag")
+
+    except Exception as e:
+        print(f"Error during device synchronization: {str(e)}")
+
+
+async def reconcile_devices(client: httpx.AsyncClient) -> Optional[str]:
+    """
+    Full sync from the main system's NDJSON device export.
+
+    Devices are applied DEVICE_SYNC_BATCH_SIZE at a time while the export
+    streams in, so memory is one batch plus the set of IDs seen. Devices
+    missing from the export are deleted only if it was read up to its end
+    line, so a cut-off stream never deletes anything. Returns the change
+    cursor from the end line, or None if the export did not complete.
+    """
+    seen_ids = set()
+    changed = 0
+    end = None
+    async with AsyncSessionLocal() as db:
+        async with client.stream("GET", config.DEVICE_EXPORT_URL) as response:
             if response.status_code != 200:
-                print(f"Error fetching devices: {response.status_code}")
-                return
+                print(f"Error exporting devices: {response.status_code}")
+                return None
 
-            main_devices = response.json()
+            batch = []
+            async for line in response.aiter_lines():
+                # Read on past the end line so the connection goes back to the pool
+                if not line or end is not None:
+                    continue
+                record = json.loads(line)
+                if record.get("end"):
+                    end = record
+                    continue
+                batch.append(record)
+                seen_ids.add(record["id"])
+                if len(batch) >= config.DEVICE_SYNC_BATCH_SIZE:
+                    changed += await db.run_sync(apply_devices, batch, (), False)
+                    batch = []
+            if batch:
+                changed += await db.run_sync(apply_devices, batch, (), False)
 
-        # Current devices in the monitoring system
+        complete = end is not None and end["count"] == len(seen_ids)
+        if complete:
+            changed += await db.run_sync(delete_missing_devices, seen_ids)
+        else:
+            print(f"Device export ended early after {len(seen_ids)} devices, not deleting missing devices")
+        if changed:
+            print(f"Device reconciliation complete: {len(seen_ids)} devices, {changed} changes")
+            await db.run_sync(refresh_scheduler)
+    return end["cursor"] if complete else None
+
+
+def apply_devices(
+        db: Session,
+        main_devices: List[Dict[str, Any]],
+        deleted_ids: Optional[Iterable[int]] = None,
+        refresh: bool = True
+) -> int:
+    """
+    Apply devices from the main system (runs through AsyncSession.run_sync).
+    Without deleted_ids main_devices is the complete list and devices missing
+    from it are deleted; otherwise only the devices in deleted_ids are.
+    With refresh, changes are logged and handed to the check scheduler.
+    Returns the number of devices added, updated or deleted.
+    """
+    # Current devices in the monitoring system; only the ones concerned for a partial list
+    if deleted_ids is None:
         current_device_map = {d.id: d for d in db.query(Device).all()}
+    else:
+        deleted_ids = set(deleted_ids)
+        wanted_ids = {device_data["id"] for device_data in main_devices} | deleted_ids
+        current_device_map = {d.id: d for d in db.query(Device).filter(Device.id.in_(wanted_ids)).all()}
 
-        # Keep track of devices found in main system
-        found_device_ids = set()
+    # Keep track of devices found in main system
+    found_device_ids = set()
+    added = updated = 0
 
-        # Update or create devices
-        for device_data in main_devices:
-            device_id = device_data["id"]
-            found_device_ids.add(device_id)
+    # Update or create devices, touching only the ones that changed
+    for device_data in main_devices:
+        device_id = device_data["id"]
+        found_device_ids.add(device_id)
+        name = device_data["name"]
+        ip_address = device_data["ip_address"]
+        is_active = device_data.get("is_active", True)
 
-            if device_id in current_device_map:
-                # Update existing device
-                device = current_device_map[device_id]
-                device.name = device_data["name"]
-                device.ip_address = device_data["ip_address"]
-                device.is_active = device_data.get("is_active", True)
+        if device_id in current_device_map:
+            device = current_device_map[device_id]
+            if (device.name, device.ip_address, device.is_active) != (name, ip_address, is_active):
+                device.name = name
+                device.ip_address = ip_address
+                device.is_active = is_active
                 device.updated_at = datetime.utcnow()
-                print(f"Updated device: {device.name} (ID: {device_id})")
-            else:
-                # Create new device
-                new_device = Device(
-                    id=device_id,
-                    name=device_data["name"],
-                    ip_address=device_data["ip_address"],
-                    is_active=device_data.get("is_active", True)
-                )
-                db.add(new_device)
-                print(f"New device added: {device_data['name']} (ID: {device_id})")
-
-        # Delete devices that no longer exist in main system
+                updated += 1
+        else:
+            db.add(Device(id=device_id, name=name, ip_address=ip_address, is_active=is_active))
+            added += 1
+
+    # Delete devices that no longer exist in main system
+    if deleted_ids is None:
         devices_to_delete = [device_id for device_id in current_device_map.keys()
                              if device_id not in found_device_ids]
+    else:
+        devices_to_delete = [device_id for device_id in deleted_ids
+                             if device_id in current_device_map and device_id not in found_device_ids]
+
+    if devices_to_delete:
+        # First, delete associated availability checks
+        for device_id in devices_to_delete:
+            device = current_device_map[device_id]
+
+            # Log before deletion
+            print(f"Deleting device and its availability history: {device.name} (ID: {device_id})")
+
+            # Option 1: Delete all availability checks for this device
+            db.query(AvailabilityCheck).filter(
+                AvailabilityCheck.device_id == device_id
+            ).delete(synchronize_session=False)
+
+            db.query(AvailabilityInterval).filter(
+                AvailabilityInterval.device_id == device_id
+            ).delete(synchronize_session=False)
+
+            db.query(DeviceLatestState).filter(
+                DeviceLatestState.device_id == device_id
+            ).delete(synchronize_session=False)
+
+            for model, _ in ROLLUPS.values():
+                db.query(model).filter(model.device_id == device_id).delete(synchronize_session=False)
+
+            db.query(LatencySketch).filter(
+                LatencySketch.device_id == device_id
+            ).delete(synchronize_session=False)
+
+            # Option 2: Delete the device (will cascade delete checks if configured)
+            db.delete(device)
+
+        print(f"Deleted {len(devices_to_delete)} devices that no longer exist in the main system")
+        LiveStats().forget(devices_to_delete)
 
-        if devices_to_delete:
-            # First, delete associated availability checks
-            for device_id in devices_to_delete:
-                device = current_device_map[device_id]
+    db.commit()
+    changed = added + updated + len(devices_to_delete)
+    if changed and refresh:
+        print(f"Device synchronization complete: {added} added, {updated} updated, {len(devices_to_delete)} deleted")
+        refresh_scheduler(db)
+    return changed
 
-                # Log before deletion
-                print(f"Deleting device and its availability history: {device.name} (ID: {device_id})")
 
-                # Option 1: Delete all availability checks for this device
-                db.query(AvailabilityCheck).filter(
-                    AvailabilityCheck.device_id == device_id
-                ).delete(synchronize_session=False)
+def delete_missing_devices(db: Session, seen_ids: set) -> int:
+    """Delete devices that are not among the IDs of a complete device export"""
+    missing_ids = [device_id for (device_id,) in db.query(Device.id).yield_per(config.DEVICE_SYNC_BATCH_SIZE)
+                   if device_id not in seen_ids]
+    return apply_devices(db, [], missing_ids, refresh=False) if missing_ids else 0
 
-                # Option 2: Delete the device (will cascade delete checks if configured)
-                db.delete(device)
 
-            print(f"Deleted {len(devices_to_delete)} devices that no longer exist in the main system")
+def refresh_scheduler(db: Session):
+    """Pick up added, removed and re-tiered devices"""
+    device_scheduler = DeviceCheckScheduler()
+    if device_scheduler.running:
+        device_scheduler.refresh_devices(db)
 
-        db.commit()
-        print(f"Device synchronization complete. {len(main_devices)} devices processed.")
 
+def _apply_events(db: Session, events: List[DeviceEvent], refresh: bool = True) -> int:
+    devices = [event.device for event in events if event.event_type != "device_deleted"]
+    deleted_ids = [event.device_id for event in events if event.event_type == "device_deleted"]
+    return apply_devices(db, devices, deleted_ids, refresh=refresh)
+
+
+def apply_device_events(db: Session, events: List[Any]) -> Dict[str, Any]:
+    """
+    Apply device change events pushed by the main system (runs through AsyncSession.run_sync).
+    Events carry the full device state, so only the last one per device counts
+    and redelivered events change nothing.
+
+    An event that is malformed or cannot be stored is rejected by itself and
+    the others still apply; the sender dead-letters rejected events instead
+    of retrying them. Returns the number of devices touched and the rejected
+    events as {"device_id", "error"}.
+    """
+    rejected = []
+    latest: Dict[int, DeviceEvent] = {}
+    for raw in events:
+        try:
+            event = DeviceEvent.model_validate(raw)
+        except ValidationError as e:
+            device_id = raw.get("device_id") if isinstance(raw, dict) else None
+            rejected.append({"device_id": device_id, "error": "; ".join(
+                ".".join(str(part) for part in error["loc"]) + ": " + error["msg"] if error["loc"] else error["msg"]
+                for error in e.errors()
+            )})
+            continue
+        latest[event.device_id] = event
+
+    try:
+        _apply_events(db, list(latest.values()))
     except Exception as e:
         db.rollback()
-        print(f"Error during device synchronization: {str(e)}")
-    finally:
-        db.close()
+        print(f"Error applying {len(latest)} device events, applying them one by one: {str(e)}")
+        for device_id, event in list(latest.items()):
+            try:
+                _apply_events(db, [event], refresh=False)
+            except Exception as e:
+                db.rollback()
+                del latest[device_id]
+                rejected.append({"device_id": device_id, "error": f"{type(e).__name__}: {str(e)}"})
+        refresh_scheduler(db)
+
+    return {"applied": len(latest), "rejected": rejected}
 
 
 # Helper function for triggering sync in background
-async def run_device_sync():
+async def run_device_sync(full: bool = False):
     """Run device synchronization in the background"""
-    await sync_devices()
+    await sync_devices(full)
     return {"status": "Device synchronization completed"}
\ No newline at end of file
@@ -0,0 +1,210 @@
+# app/services/writer.py
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Any, List
+
+from sqlalchemy import insert
+
+from app.models.database import SessionLocal
+from app.models.models import AvailabilityCheck
+from app.services.probe import ProbeService
+from app.services.intervals import IntervalService
+from app.services.rollups import RollupService
+from app.services.latency import LatencyService
+from app.services.live_stats import LiveStats
+from app.services.latest_state import LatestStateService
+import config
+
+
+class ResultWriter:
+    """
+    Dedicated writer for availability check results.
+
+    Probes hand their results over without touching the database; the writer
+    collects them and persists each batch with one bulk insert, the interval,
+    rollup, latency sketch and latest-state updates and one commit on a worker thread. Only one batch is
+    written at a time. Raw check rows are written for state changes only
+    unless RAW_CHECKS is "all".
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ResultWriter, cls).__new__(cls)
+            cls._instance._queue = None
+            cls._instance._task = None
+            cls._instance._write_lock = None
+            cls._instance._write_lock_loop = None
+            cls._instance._stats = {
+                "rows_written": 0,
+                "batches_written": 0,
+                "failed_rows": 0,
+                "write_seconds": 0.0,
+                "last_batch_rows": 0,
+                "last_batch_seconds": 0.0,
+                "last_batch_at": None,
+            }
+        return cls._instance
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the background flush loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        print("Result writer started")
+
+    async def stop(self):
+        """Flush queued results and stop the flush loop"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._queue is not None and not self._queue.empty():
+            await self.write_many(self._drain())
+        print("Result writer stopped")
+
+    def submit(self, result: Dict[str, Any]):
+        """Queue a result for the next batch"""
+        if self.running:
+            self._queue.put_nowait(result)
+        else:
+            # No flush loop (e.g. scripts); write it on its own
+            asyncio.get_running_loop().create_task(self.write_many([result]))
+
+    def _drain(self, limit: int = None) -> List[Dict[str, Any]]:
+        batch = []
+        while not self._queue.empty() and (limit is None or len(batch) < limit):
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        """Collect queued results into batches and write them"""
+        while True:
+            try:
+                batch = [await self._queue.get()]
+                # Give the batch a moment to fill up
+                deadline = time.monotonic() + config.RESULT_WRITER_FLUSH_SECONDS
+                while len(batch) < config.RESULT_WRITER_BATCH_SIZE:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                    except asyncio.TimeoutError:
+                        break
+                    batch.extend(self._drain(config.RESULT_WRITER_BATCH_SIZE - len(batch)))
+
+                await self.write_many(batch)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                print(f"Error in result writer: {str(e)}")
+
+    def _lock(self) -> asyncio.Lock:
+        """The write lock of the running event loop; a lock is bound to the loop it is used in"""
+        loop = asyncio.get_running_loop()
+        if self._write_lock_loop is not loop:
+            self._write_lock = asyncio.Lock()
+            self._write_lock_loop = loop
+        return self._write_lock
+
+    async def write_many(self, results: List[Dict[str, Any]]) -> int:
+        """Persist results now, in batches of RESULT_WRITER_BATCH_SIZE"""
+        written = 0
+        batch_size = config.RESULT_WRITER_BATCH_SIZE
+        for i in range(0, len(results), batch_size):
+            batch = results[i:i + batch_size]
+            async with self._lock():
+                written += await self._write_or_split(batch)
+        return written
+
+    async def _write_or_split(self, batch: List[Dict[str, Any]], retry: bool = True) -> int:
+        """
+        Write a batch. A failed batch is retried once, then written as two
+        halves, so only results that cannot be written at all (such as those
+        of a device deleted while they were queued) are dropped.
+        """
+        try:
+            written = await asyncio.to_thread(self._write_batch, batch)
+        except Exception as e:
+            if retry:
+                print(f"Error writing {len(batch)} availability results, retrying: {str(e)}")
+                await asyncio.sleep(config.RESULT_WRITER_RETRY_SECONDS)
+                return await self._write_or_split(batch, retry=False)
+            if len(batch) == 1:
+                self._stats["failed_rows"] += 1
+                print(f"Dropping availability result for device {batch[0]['device_id']}: {str(e)}")
+                return 0
+            middle = len(batch) // 2
+            return (await self._write_or_split(batch[:middle], retry=False)
+                    + await self._write_or_split(batch[middle:], retry=False))
+
+        LiveStats().record_many(batch)
+        return written
+
+    def _write_batch(self, results: List[Dict[str, Any]]) -> int:
+        """Bulk insert one batch in a single transaction (runs on a worker thread)"""
+        if not results:
+            return 0
+
+        start = time.perf_counter()
+        rows = [ResultWriter.to_row(result) for result in results]
+        memos = {r["device_id"]: r["successful_probe"] for r in results if r.get("successful_probe")}
+
+        db = SessionLocal()
+        try:
+            changes = IntervalService.apply_results(db, rows)
+            raw_rows = rows if config.RAW_CHECKS == "all" else changes
+            if raw_rows:
+                db.execute(insert(AvailabilityCheck), raw_rows)
+            RollupService.apply_results(db, rows)
+            LatencyService.apply_results(db, rows)
+            LatestStateService.save(db, rows)
+            ProbeService.save_memos(db, memos)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        elapsed = time.perf_counter() - start
+        self._stats["rows_written"] += len(rows)
+        self._stats["batches_written"] += 1
+        self._stats["write_seconds"] += elapsed
+        self._stats["last_batch_rows"] = len(rows)
+        self._stats["last_batch_seconds"] = elapsed
+        self._stats["last_batch_at"] = datetime.utcnow().isoformat()
+        return len(rows)
+
+    @staticmethod
+    def to_row(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Map a check result to an availability_checks row"""
+        return {
+            "device_id": result["device_id"],
+            "timestamp": datetime.fromisoformat(result["timestamp"]),
+            "is_available": result["is_available"],
+            "response_time": result.get("response_time"),
+            "check_method": result.get("check_method") or "unknown",
+            "error_message": (result.get("error") or None) and result["error"][:255],
+            "probe_policy": result.get("probe_policy"),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Write path throughput"""
+        stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        stats["rows_per_second"] = round(
+            stats["rows_written"] / stats["write_seconds"], 1) if stats["write_seconds"] else None
+        stats["last_batch_rows_per_second"] = round(
+            stats["last_batch_rows"] / stats["last_batch_seconds"], 1) if stats["last_batch_seconds"] else None
+        return stats
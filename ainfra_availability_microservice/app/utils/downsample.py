@@ -0,0 +1,77 @@
+# app/utils/downsample.py
+"""
+Series downsampling for chart payloads.
+
+Largest-Triangle-Three-Buckets keeps the visual shape of a line with a
+fixed number of points: the first and last points are kept and every
+bucket in between contributes the point that forms the largest triangle
+with the point picked in the previous bucket and the average of the next.
+"""
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+
+# LTTB keeps the first and last point and at least one in between
+MIN_THRESHOLD = 3
+
+
+def bucket_bounds(length: int, threshold: int) -> List[Tuple[int, int]]:
+    """
+    Split indices [0, length) into threshold buckets as LTTB does:
+    the first and last points on their own, the rest evenly in between.
+    Thresholds below MIN_THRESHOLD are raised to it.
+    """
+    threshold = max(threshold, MIN_THRESHOLD)
+    if threshold >= length:
+        return [(i, i + 1) for i in range(length)]
+
+    bounds = [(0, 1)]
+    every = (length - 2) / (threshold - 2)
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        bounds.append((start, min(end, length - 1)))
+    bounds.append((length - 1, length))
+    return bounds
+
+
+def iter_buckets(points: Iterable[tuple], bounds: List[Tuple[int, int]]) -> Iterator[List[tuple]]:
+    """Group a stream of points into the buckets from bucket_bounds, one bucket in memory at a time"""
+    points = iter(points)
+    for start, end in bounds:
+        bucket = list(islice(points, end - start))
+        if not bucket:
+            return
+        yield bucket
+
+
+def lttb_stream(buckets: Iterable[List[tuple]]) -> Iterator[Tuple[List[tuple], int]]:
+    """
+    LTTB over a stream of buckets of (x, y, ...) points, holding only the
+    current and the next bucket. Yields every bucket with the position of
+    the point kept from it: the first point of the first bucket, the last
+    of the last one.
+    """
+    buckets = iter(buckets)
+    current = next(buckets, None)
+    if current is None:
+        return
+    yield current, 0
+    prev_x, prev_y = current[0][0], current[0][1]
+
+    current = next(buckets, None)
+    for following in buckets:
+        avg_x = sum(point[0] for point in following) / len(following)
+        avg_y = sum(point[1] for point in following) / len(following)
+
+        best, best_area = 0, -1.0
+        for i, (x, y, *_) in enumerate(current):
+            # Twice the triangle area; the factor does not change the argmax
+            area = abs((prev_x - avg_x) * (y - prev_y) - (prev_x - x) * (avg_y - prev_y))
+            if area > best_area:
+                best, best_area = i, area
+        yield current, best
+        prev_x, prev_y = current[best][0], current[best][1]
+        current = following
+
+    if current is not None:
+        yield current, len(current) - 1
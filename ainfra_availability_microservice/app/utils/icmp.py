@@ -0,0 +1,211 @@
+# app/utils/icmp.py
+import asyncio
+import ipaddress
+import os
+import socket
+import struct
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import config
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+_HEADER = struct.Struct("!BBHHH")
+_TIMESTAMP = struct.Struct("!d")
+
+
+def _checksum(data: bytes) -> int:
+    """Internet checksum (RFC 1071)"""
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _build_echo_request(identifier: int, sequence: int, payload_size: int = 56) -> bytes:
+    """Build an ICMP echo request carrying the send time in its payload"""
+    payload = _TIMESTAMP.pack(time.perf_counter()).ljust(payload_size, b"Q")
+    header = _HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    checksum = _checksum(header + payload)
+    return _HEADER.pack(ICMP_ECHO_REQUEST, 0, checksum, identifier, sequence) + payload
+
+
+class IcmpEngine:
+    """
+    Multiplexed ICMP echo engine.
+
+    All echo requests go out through one socket that is watched by the event
+    loop, and replies are matched back to their waiters by identifier and
+    sequence number, so thousands of hosts can be pinged concurrently
+    without a thread per ping.
+
+    An unprivileged datagram ICMP socket is preferred (Linux, needs
+    net.ipv4.ping_group_range); a raw socket is used as fallback when the
+    process has CAP_NET_RAW. If neither can be opened the engine reports
+    itself unavailable and callers fall back to ping3.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(IcmpEngine, cls).__new__(cls)
+            cls._instance._sock = None
+            cls._instance._loop = None
+            cls._instance._raw = False
+            cls._instance._identifier = os.getpid() & 0xFFFF
+            cls._instance._sequence = 0
+            cls._instance._pending = {}
+            cls._instance._unavailable_reason = None
+            cls._instance._in_flight = None
+        return cls._instance
+
+    @property
+    def mode(self) -> Optional[str]:
+        """'dgram', 'raw' or None when no socket is open"""
+        if self._sock is None:
+            return None
+        return "raw" if self._raw else "dgram"
+
+    def _open(self) -> bool:
+        """Open the ICMP socket for the running loop, returns False if not possible"""
+        loop = asyncio.get_running_loop()
+        if self._sock is not None and self._loop is loop:
+            return True
+
+        self.close()
+
+        sock = None
+        errors = []
+        for sock_type, raw in ((socket.SOCK_DGRAM, False), (socket.SOCK_RAW, True)):
+            try:
+                sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+                self._raw = raw
+                break
+            except OSError as e:
+                errors.append(f"{'raw' if raw else 'dgram'}: {e}")
+
+        if sock is None:
+            self._unavailable_reason = "; ".join(errors)
+            return False
+
+        sock.setblocking(False)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        except OSError:
+            pass
+
+        self._sock = sock
+        self._loop = loop
+        self._pending = {}
+        self._in_flight = asyncio.Semaphore(config.ICMP_MAX_IN_FLIGHT)
+        self._unavailable_reason = None
+        loop.add_reader(sock.fileno(), self._on_readable)
+        print(f"ICMP engine started using {self.mode} socket")
+        return True
+
+    def close(self):
+        """Close the socket and fail all outstanding pings"""
+        if self._sock is not None:
+            try:
+                self._loop.remove_reader(self._sock.fileno())
+            except Exception:
+                pass
+            self._sock.close()
+        for future in self._pending.values():
+            if not future.done():
+                future.set_result(None)
+        self._sock = None
+        self._loop = None
+        self._pending = {}
+
+    def available(self) -> bool:
+        """Check whether the engine can be used in the running loop"""
+        if not config.ICMP_ENGINE_ENABLED:
+            return False
+        return self._open()
+
+    def _next_sequence(self) -> int:
+        """Next free 16-bit sequence number"""
+        for _ in range(0x10000):
+            self._sequence = (self._sequence + 1) & 0xFFFF
+            if self._sequence not in self._pending:
+                return self._sequence
+        raise RuntimeError("ICMP engine has no free sequence numbers")
+
+    def _on_readable(self):
+        """Drain every datagram currently queued on the socket"""
+        received_at = time.perf_counter()
+        while True:
+            try:
+                packet, address = self._sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+
+            if self._raw:
+                # Raw sockets deliver the IP header and every ICMP packet on the host
+                header_length = (packet[0] & 0x0F) * 4
+                packet = packet[header_length:]
+
+            if len(packet) < _HEADER.size + _TIMESTAMP.size:
+                continue
+
+            icmp_type, _, _, identifier, sequence = _HEADER.unpack_from(packet)
+            if icmp_type != ICMP_ECHO_REPLY:
+                continue
+            # Datagram sockets rewrite the identifier and the kernel only hands us our own replies
+            if self._raw and identifier != self._identifier:
+                continue
+
+            entry = self._pending.get(sequence)
+            if entry is None:
+                continue
+            future, expected_ip = entry
+            if address[0] != expected_ip or future.done():
+                continue
+
+            sent_at, = _TIMESTAMP.unpack_from(packet, _HEADER.size)
+            future.set_result((received_at - sent_at) * 1000)
+
+    async def ping(self, ip_address: str, timeout: float = 1.0) -> Tuple[bool, Optional[float]]:
+        """
+        Send one echo request and wait for the matching reply.
+        Returns (is_available, response_time_ms)
+        """
+        if not self._open():
+            raise RuntimeError(f"ICMP engine unavailable: {self._unavailable_reason}")
+
+        async with self._in_flight:
+            sequence = self._next_sequence()
+            future = self._loop.create_future()
+            self._pending[sequence] = (future, ip_address)
+            try:
+                packet = _build_echo_request(self._identifier, sequence)
+                await self._loop.sock_sendto(self._sock, packet, (ip_address, 0))
+                rtt = await asyncio.wait_for(future, timeout=timeout)
+            except (asyncio.TimeoutError, OSError):
+                return False, None
+            finally:
+                self._pending.pop(sequence, None)
+
+        if rtt is None or rtt <= 0:
+            return False, None
+        return True, rtt
+
+    async def ping_many(self, ip_addresses: Iterable[str], timeout: float = 1.0) -> Dict[str, Tuple[bool, Optional[float]]]:
+        """Ping many hosts concurrently through the shared socket"""
+        ip_addresses = list(dict.fromkeys(ip_addresses))
+        results = await asyncio.gather(*(self.ping(ip, timeout) for ip in ip_addresses))
+        return dict(zip(ip_addresses, results))
+
+
+def is_ipv4_literal(address: str) -> bool:
+    """The engine only speaks ICMPv4 to literal addresses"""
+    try:
+        return isinstance(ipaddress.ip_address(str(address)), ipaddress.IPv4Address)
+    except ValueError:
+        return False
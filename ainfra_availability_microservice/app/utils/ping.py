@@ -3,6 +3,8 @@ from ping3 import ping as ping3_ping
 import asyncio
 import concurrent.futures
 
+from app.utils.icmp import IcmpEngine, is_ipv4_literal
+
 # Thread pool for background ping tasks
 thread_pool_executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
 
@@ -32,13 +34,24 @@ def check_host_availability(ip_address, timeout=1):
         print(f"Ping3 error for {ip_address}: {str(e)}")
         return False, None
 
-async def ping_device_async(ip_address):
-    """Execute ping using ping3 package in a non-blocking way"""
+async def ping_device_async(ip_address, timeout=1):
+    """
+    Ping a device without blocking the event loop.
+
+    Uses the shared multiplexed ICMP engine when it can open a socket and falls
+    back to ping3 on the thread pool otherwise (e.g. no ICMP permissions or a
+    non-IPv4 address).
+    """
+    engine = IcmpEngine()
+    if is_ipv4_literal(ip_address) and engine.available():
+        return await engine.ping(str(ip_address), timeout=timeout)
+
     loop = asyncio.get_running_loop()
 
     # Run ping in a thread to avoid blocking the event loop
     return await loop.run_in_executor(
         thread_pool_executor,
         check_host_availability,
-        ip_address
-    )
\ No newline at end of file
+        ip_address,
+        timeout
+    )
@@ -0,0 +1,77 @@
+# app/utils/sketch.py
+"""
+Mergeable quantile sketch for response times.
+
+Values are counted in logarithmic buckets whose width grows with the
+value (as in DDSketch / HDR histograms): bucket i holds values in
+(gamma^(i-1), gamma^i], so any quantile is answered within the relative
+accuracy. Two sketches merge by adding their bucket counts, which makes
+per-bucket sketches combinable into any larger window.
+"""
+import json
+import math
+from typing import Dict, Iterable, Optional
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+# Values at or below this (ms) are counted as zero
+MIN_VALUE = 1e-3
+
+
+class QuantileSketch:
+    __slots__ = ("counts", "zero_count", "count")
+
+    def __init__(self, counts: Optional[Dict[int, int]] = None, zero_count: int = 0):
+        self.counts: Dict[int, int] = counts or {}
+        self.zero_count = zero_count
+        self.count = zero_count + sum(self.counts.values())
+
+    def add(self, value: float):
+        if value <= MIN_VALUE:
+            self.zero_count += 1
+        else:
+            index = math.ceil(math.log(value) / LOG_GAMMA)
+            self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q (0..1), None for an empty sketch"""
+        if not self.count:
+            return None
+        # Nearest rank: the smallest value with at least q of the values at or below it
+        rank = max(0, math.ceil(q * self.count) - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if rank < seen:
+                # Midpoint of the bucket in relative terms
+                return 2 * GAMMA ** index / (GAMMA + 1)
+        return 2 * GAMMA ** max(self.counts) / (GAMMA + 1)
+
+    def percentiles(self, quantiles: Iterable[float] = (0.5, 0.95, 0.99)) -> Dict[str, Optional[float]]:
+        """{"p50": ..., "p95": ..., "p99": ...} rounded to 0.001 ms"""
+        result = {}
+        for q in quantiles:
+            value = self.quantile(q)
+            result[f"p{q * 100:g}"] = round(value, 3) if value is not None else None
+        return result
+
+    def to_json(self) -> str:
+        return json.dumps({"z": self.zero_count, "b": self.counts}, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, data: Optional[str]) -> "QuantileSketch":
+        if not data:
+            return cls()
+        parsed = json.loads(data)
+        return cls({int(index): count for index, count in parsed["b"].items()}, parsed["z"])
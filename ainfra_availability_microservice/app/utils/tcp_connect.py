@@ -0,0 +1,197 @@
+# app/utils/tcp_connect.py
+import asyncio
+import collections
+import errno
+import ipaddress
+import socket
+import struct
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import config
+
+# SO_LINGER on with a zero timeout: close() drops the connection with a RST
+_ABORT = struct.pack("ii", 1, 0)
+_IN_PROGRESS = {errno.EINPROGRESS, errno.EAGAIN, errno.EWOULDBLOCK, errno.EALREADY}
+
+
+def _fd_budget() -> int:
+    """In-flight connect limit, kept to half of the process file descriptor limit"""
+    limit = config.TCP_PROBE_MAX_IN_FLIGHT
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY:
+            limit = min(limit, max(64, soft // 2))
+    except (ImportError, ValueError, OSError):
+        pass
+    return max(1, limit)
+
+
+class TcpConnectProber:
+    """
+    Bulk TCP connect prober.
+
+    Every probe is a bare non-blocking socket: the connect is issued right
+    away, the event loop's selector (epoll on Linux) reports when it
+    completes, the connect time is taken as the RTT and the socket is
+    aborted with a RST instead of a graceful close. No stream reader/writer
+    or task is created per probe, and at most _fd_budget() sockets are open
+    at a time; further probes wait in a FIFO until a slot frees up.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(TcpConnectProber, cls).__new__(cls)
+            cls._instance._loop = None
+            cls._instance._limit = _fd_budget()
+            cls._instance._waiting = collections.deque()  # (family, address, future, timeout)
+            cls._instance._active = {}  # fd -> (sock, future, start, timer)
+            cls._instance._stats = {"started": 0, "succeeded": 0, "failed": 0, "timed_out": 0}
+        return cls._instance
+
+    def _bind(self) -> asyncio.AbstractEventLoop:
+        """Use the running loop; probes left on a previous loop are dropped"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            for sock, _, _, _ in self._active.values():
+                sock.close()
+            self._active = {}
+            self._waiting.clear()
+            self._loop = loop
+        return loop
+
+    def _submit(self, family: int, address: tuple, timeout: float) -> asyncio.Future:
+        future = self._loop.create_future()
+        self._waiting.append((family, address, future, timeout))
+        self._launch()
+        return future
+
+    def _launch(self):
+        """Start waiting probes while there are free slots"""
+        while self._waiting and len(self._active) < self._limit:
+            family, address, future, timeout = self._waiting.popleft()
+            if not future.done():
+                self._start(family, address, future, timeout)
+
+    def _start(self, family: int, address: tuple, future: asyncio.Future, timeout: float):
+        self._stats["started"] += 1
+        try:
+            sock = socket.socket(family, socket.SOCK_STREAM)
+        except OSError:
+            self._stats["failed"] += 1
+            future.set_result((False, None))
+            return
+
+        sock.setblocking(False)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _ABORT)
+        start = time.perf_counter()
+        error = sock.connect_ex(address)
+        if error not in _IN_PROGRESS:
+            # Completed (or refused) synchronously
+            response_time = (time.perf_counter() - start) * 1000
+            sock.close()
+            self._stats["succeeded" if error == 0 else "failed"] += 1
+            future.set_result((True, response_time) if error == 0 else (False, None))
+            return
+
+        fd = sock.fileno()
+        timer = self._loop.call_later(timeout, self._finish, fd, None)
+        self._active[fd] = (sock, future, start, timer)
+        self._loop.add_writer(fd, self._on_writable, fd)
+        # A cancelled caller releases its socket right away
+        future.add_done_callback(self._on_cancelled(fd))
+
+    def _on_cancelled(self, fd: int):
+        def callback(future: asyncio.Future):
+            entry = self._active.get(fd)
+            # The fd may already belong to a newer probe
+            if future.cancelled() and entry is not None and entry[1] is future:
+                self._finish(fd, False)
+        return callback
+
+    def _on_writable(self, fd: int):
+        entry = self._active.get(fd)
+        if entry is not None:
+            error = entry[0].getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            self._finish(fd, error == 0)
+
+    def _finish(self, fd: int, connected: Optional[bool]):
+        """Resolve and abort one probe; connected is None on timeout"""
+        entry = self._active.pop(fd, None)
+        if entry is None:
+            return
+        sock, future, start, timer = entry
+        response_time = (time.perf_counter() - start) * 1000
+        self._loop.remove_writer(fd)
+        timer.cancel()
+        sock.close()
+
+        if connected:
+            self._stats["succeeded"] += 1
+        else:
+            self._stats["timed_out" if connected is None else "failed"] += 1
+        if not future.done():
+            future.set_result((True, response_time) if connected else (False, None))
+        self._launch()
+
+    @staticmethod
+    def _literal(host: str, port: int) -> Optional[Tuple[int, tuple]]:
+        """(family, socket address) for an IP literal, None for hostnames"""
+        try:
+            ip = ipaddress.ip_address(host)
+        except ValueError:
+            return None
+        return (socket.AF_INET6, (host, port, 0, 0)) if ip.version == 6 else (socket.AF_INET, (host, port))
+
+    async def _resolve(self, host: str, port: int) -> Optional[Tuple[int, tuple]]:
+        """(family, socket address) for a literal address or hostname"""
+        target = self._literal(host, port)
+        if target is not None:
+            return target
+        try:
+            infos = await self._loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError:
+            return None
+        return (infos[0][0], infos[0][4]) if infos else None
+
+    async def connect(self, host: str, port: int, timeout: float = 1.0) -> Tuple[bool, Optional[float]]:
+        """
+        Probe one TCP port.
+        Returns (connected, connect_time_ms)
+        """
+        self._bind()
+        target = await self._resolve(str(host), port)
+        if target is None:
+            return False, None
+        return await self._submit(target[0], target[1], timeout)
+
+    async def connect_many(
+            self,
+            targets: Iterable[Tuple[str, int]],
+            timeout: float = 1.0
+    ) -> Dict[Tuple[str, int], Tuple[bool, Optional[float]]]:
+        """Probe a batch of (host, port) pairs; every connect is queued up front, bounded by the fd budget"""
+        self._bind()
+        targets = list(dict.fromkeys((str(host), port) for host, port in targets))
+        resolved = {key: self._literal(*key) for key in targets}
+        # Only hostnames need a lookup
+        names = [key for key, target in resolved.items() if target is None]
+        if names:
+            resolved.update(zip(names, await asyncio.gather(*(self._resolve(*key) for key in names))))
+
+        futures = {key: self._submit(*target, timeout) for key, target in resolved.items() if target is not None}
+        results = {}
+        for key in targets:
+            results[key] = await futures[key] if key in futures else (False, None)
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        """Probe counters and current load"""
+        return {
+            **self._stats,
+            "in_flight": len(self._active),
+            "waiting": len(self._waiting),
+            "max_in_flight": self._limit,
+        }
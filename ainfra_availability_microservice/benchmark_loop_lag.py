@@ -0,0 +1,138 @@
+# benchmark_loop_lag.py
+"""
+Event-loop lag regression check under a simulated fleet.
+
+Creates a throwaway SQLite database with N loopback devices (every address
+in 127.0.0.0/8 answers on Linux) and some check history, starts the service
+in-process, and while the scheduler probes the whole fleet keeps hitting the
+read endpoints. A ticker measures how late the event loop wakes up; the run
+fails if the worst lag exceeds the limit:
+
+    python benchmark_loop_lag.py --devices 5000 --max-lag-ms 500
+"""
+import argparse
+import asyncio
+import ipaddress
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def loopback_hosts(count):
+    """Distinct loopback addresses starting at 127.0.1.1"""
+    base = int(ipaddress.IPv4Address("127.0.1.1"))
+    return [str(ipaddress.IPv4Address(base + i)) for i in range(count)]
+
+
+def seed(devices, history):
+    """Devices plus a few checks each, written through the sync engine"""
+    from sqlalchemy import insert
+
+    from app.models.database import Base, SessionLocal, engine
+    from app.models.models import Device, AvailabilityCheck
+
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        db.execute(insert(Device), [
+            {"id": i + 1, "name": f"device-{i + 1}", "ip_address": host, "is_active": True}
+            for i, host in enumerate(loopback_hosts(devices))
+        ])
+        if history:
+            db.execute(insert(AvailabilityCheck), [
+                {
+                    "device_id": device_id,
+                    "timestamp": now - timedelta(minutes=n),
+                    "is_available": random.random() > 0.1,
+                    "response_time": random.uniform(0.1, 50.0),
+                    "check_method": "ping",
+                }
+                for device_id in range(1, devices + 1)
+                for n in range(history)
+            ])
+        db.commit()
+    finally:
+        db.close()
+
+
+async def monitor_lag(samples, stop, interval):
+    """Sleep for interval and record how much later than that the loop woke us"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def hammer(client, devices, stop, counts, timings):
+    """Keep one request in flight against the read endpoints"""
+    paths = ["/stats?time_range=24h", "/latest", "/trend?hours=6", "/storage/stats"]
+    while not stop.is_set():
+        device_id = random.randint(1, devices)
+        path = random.choice(paths + [f"/{device_id}/chart-data", f"/{device_id}/history?limit=50"])
+        start = time.perf_counter()
+        response = await client.get(path)
+        endpoint = path.split("?")[0] if not path[1].isdigit() else "/{device_id}/" + path.split("/")[2].split("?")[0]
+        timings.setdefault(endpoint, []).append((time.perf_counter() - start) * 1000)
+        counts[response.status_code] = counts.get(response.status_code, 0) + 1
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=5000, help="Number of simulated devices")
+    parser.add_argument("--history", type=int, default=10, help="Seeded checks per device")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to measure")
+    parser.add_argument("--clients", type=int, default=20, help="Concurrent request loops")
+    parser.add_argument("--tick-ms", type=float, default=10.0, help="Lag ticker interval")
+    parser.add_argument("--max-lag-ms", type=float, default=500.0, help="Fail if the worst lag exceeds this")
+    args = parser.parse_args()
+
+    seed(args.devices, args.history)
+
+    import httpx
+    from app.main import app
+
+    samples, counts, timings = [], {}, {}
+    stop = asyncio.Event()
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            started = time.perf_counter()
+            tasks = [asyncio.create_task(monitor_lag(samples, stop, args.tick_ms / 1000))]
+            tasks += [asyncio.create_task(hammer(client, args.devices, stop, counts, timings)) for _ in range(args.clients)]
+            await asyncio.sleep(args.duration)
+            stop.set()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            elapsed = time.perf_counter() - started
+
+            from app.services.writer import ResultWriter
+            writer = ResultWriter().stats()
+
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1] if samples else 0
+    worst = samples[-1] if samples else 0
+    requests = sum(counts.values())
+    print(f"devices={args.devices} duration={elapsed:.1f}s requests={requests} ({requests / elapsed:,.0f}/s) "
+          f"status={counts}")
+    for endpoint, values in sorted(timings.items()):
+        print(f"  {endpoint:<24} n={len(values):<5} median={statistics.median(values):.1f}ms max={max(values):.1f}ms")
+    print(f"results written={writer['rows_written']} rows/s={writer['rows_per_second']}")
+    print(f"loop lag ms: median={statistics.median(samples) if samples else 0:.2f} p99={p99:.2f} max={worst:.2f}")
+
+    if worst > args.max_lag_ms:
+        print(f"FAIL: event loop lag {worst:.1f}ms exceeds {args.max_lag_ms:.0f}ms")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    workdir = tempfile.mkdtemp(prefix="loop-lag-")
+    os.environ.setdefault("AVAILABILITY_DB_URL", f"sqlite:///{os.path.join(workdir, 'benchmark.db')}")
+    # The main system is not running; keep sync attempts short
+    os.environ.setdefault("MAIN_API_URL", "http://127.0.0.1:9/api/v1/devices/")
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,76 @@
+# benchmark_ping.py
+"""
+Loopback benchmark: ping3 on the thread pool vs. the multiplexed ICMP engine.
+
+Every address in 127.0.0.0/8 answers on Linux, so N distinct loopback hosts
+can be pinged without touching the network:
+
+    python benchmark_ping.py --hosts 2000
+"""
+import argparse
+import asyncio
+import ipaddress
+import time
+
+from app.utils.icmp import IcmpEngine
+from app.utils.ping import check_host_availability, thread_pool_executor
+
+
+def loopback_hosts(count):
+    """Distinct loopback addresses starting at 127.0.1.1"""
+    base = int(ipaddress.IPv4Address("127.0.1.1"))
+    return [str(ipaddress.IPv4Address(base + i)) for i in range(count)]
+
+
+async def run_thread_pool(hosts, timeout):
+    """Current implementation: one blocking ping3 call per host on the thread pool"""
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*(
+        loop.run_in_executor(thread_pool_executor, check_host_availability, host, timeout)
+        for host in hosts
+    ))
+
+
+async def run_engine(hosts, timeout):
+    """All hosts through the single engine socket"""
+    results = await IcmpEngine().ping_many(hosts, timeout=timeout)
+    return list(results.values())
+
+
+def report(name, hosts, results, elapsed):
+    successes = [rtt for ok, rtt in results if ok]
+    avg_rtt = sum(successes) / len(successes) if successes else 0
+    print(
+        f"{name:<12} hosts={len(hosts):<6} ok={len(successes):<6} "
+        f"elapsed={elapsed:.3f}s rate={len(hosts) / elapsed:,.0f} hosts/s avg_rtt={avg_rtt:.3f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=1000, help="Number of loopback hosts to ping")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Per-ping timeout in seconds")
+    parser.add_argument("--skip-thread-pool", action="store_true", help="Only benchmark the engine")
+    args = parser.parse_args()
+
+    hosts = loopback_hosts(args.hosts)
+
+    engine = IcmpEngine()
+    if engine.available():
+        start = time.perf_counter()
+        results = await run_engine(hosts, args.timeout)
+        report(f"engine/{engine.mode}", hosts, results, time.perf_counter() - start)
+    else:
+        print(f"ICMP engine unavailable: {engine._unavailable_reason}")
+
+    if not args.skip_thread_pool:
+        start = time.perf_counter()
+        results = await run_thread_pool(hosts, args.timeout)
+        report("ping3/pool", hosts, results, time.perf_counter() - start)
+
+    engine.close()
+    thread_pool_executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
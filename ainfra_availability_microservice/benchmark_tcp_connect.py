@@ -0,0 +1,113 @@
+# benchmark_tcp_connect.py
+"""
+Loopback benchmark: asyncio.open_connection per port vs. the bulk TCP connect prober.
+
+A listener on 0.0.0.0 answers for every address in 127.0.0.0/8, so N distinct
+loopback hosts can be probed on one open and a few closed ports without
+touching the network:
+
+    python benchmark_tcp_connect.py --hosts 5000
+"""
+import argparse
+import asyncio
+import ipaddress
+import resource
+import socket
+import time
+
+from app.utils.tcp_connect import TcpConnectProber
+
+CLOSED_PORTS = (22, 443, 8080, 3389)
+
+
+def loopback_hosts(count):
+    """Distinct loopback addresses starting at 127.0.1.1"""
+    base = int(ipaddress.IPv4Address("127.0.1.1"))
+    return [str(ipaddress.IPv4Address(base + i)) for i in range(count)]
+
+
+async def open_connection_probe(host, port, timeout):
+    """Previous implementation: stream connect, then a graceful close"""
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host=host, port=port), timeout=timeout)
+    except (asyncio.TimeoutError, OSError):
+        return False, None
+    response_time = (time.perf_counter() - start) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True, response_time
+
+
+async def run_open_connection(targets, timeout, limit):
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(host, port):
+        async with semaphore:
+            return await open_connection_probe(host, port, timeout)
+
+    return await asyncio.gather(*(bounded(host, port) for host, port in targets))
+
+
+async def run_prober(targets, timeout):
+    results = await TcpConnectProber().connect_many(targets, timeout=timeout)
+    return list(results.values())
+
+
+def report(name, targets, results, elapsed):
+    successes = [rtt for ok, rtt in results if ok]
+    avg_rtt = sum(successes) / len(successes) if successes else 0
+    print(
+        f"{name:<16} probes={len(targets):<6} ok={len(successes):<6} "
+        f"elapsed={elapsed:.3f}s rate={len(targets) / elapsed:,.0f} probes/s avg_rtt={avg_rtt:.3f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=2000, help="Number of loopback hosts to probe")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Per-connect timeout in seconds")
+    parser.add_argument("--skip-open-connection", action="store_true", help="Only benchmark the prober")
+    args = parser.parse_args()
+
+    # Accept everything on one port; the accept queue is drained so it never fills up
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("0.0.0.0", 0))
+    listener.listen(4096)
+    listener.setblocking(False)
+    open_port = listener.getsockname()[1]
+
+    def drain():
+        while True:
+            try:
+                listener.accept()[0].close()
+            except (BlockingIOError, InterruptedError):
+                return
+
+    asyncio.get_running_loop().add_reader(listener.fileno(), drain)
+
+    hosts = loopback_hosts(args.hosts)
+    targets = [(host, port) for host in hosts for port in (open_port,) + CLOSED_PORTS]
+    print(f"fd limit={resource.getrlimit(resource.RLIMIT_NOFILE)[0]} "
+          f"prober max in flight={TcpConnectProber().stats()['max_in_flight']}")
+
+    start = time.perf_counter()
+    results = await run_prober(targets, args.timeout)
+    report("prober", targets, results, time.perf_counter() - start)
+    print(f"prober stats: {TcpConnectProber().stats()}")
+
+    if not args.skip_open_connection:
+        start = time.perf_counter()
+        results = await run_open_connection(targets, args.timeout, TcpConnectProber().stats()["max_in_flight"])
+        report("open_connection", targets, results, time.perf_counter() - start)
+
+    asyncio.get_running_loop().remove_reader(listener.fileno())
+    listener.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
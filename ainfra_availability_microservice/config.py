@@ -13,9 +13,31 @@ def is_running_in_docker():
 # Use appropriate host based on environment
 HOST_NAME = "app" if is_running_in_docker() else "localhost"
 
+
+def to_async_url(url):
+    """Same database through an asyncio driver (aiosqlite / asyncpg)"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith("postgresql:") or url.startswith("postgresql+psycopg2:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+
 # Database configuration
 DATABASE_URL = os.getenv("AVAILABILITY_DB_URL", "sqlite:///./availability_monitor.db")
-MAIN_API_URL = os.getenv("MAIN_API_URL", f"http://{HOST_NAME}:8000/api/v1/devices/")
+ASYNC_DATABASE_URL = os.getenv("AVAILABILITY_ASYNC_DB_URL", to_async_url(DATABASE_URL))
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "5" if DATABASE_URL.startswith("sqlite") else "20"))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "5" if DATABASE_URL.startswith("sqlite") else "30"))
+# Main app address, resolved once at startup; its client is shared (app/services/http_clients.py)
+MAIN_APP_URL = os.getenv("MAIN_APP_URL", f"http://{HOST_NAME}:8000")
+MAIN_API_URL = os.getenv("MAIN_API_URL", MAIN_APP_URL.rstrip("/") + "/api/v1/devices/")
+# Device syncs fetch only changes; a full reconciliation runs this often (minutes)
+DEVICE_FULL_SYNC_INTERVAL = int(os.getenv("DEVICE_FULL_SYNC_INTERVAL", "60"))
+# Full reconciliation streams the main app's NDJSON device export, applied this many devices at a time
+DEVICE_EXPORT_URL = os.getenv("DEVICE_EXPORT_URL", MAIN_API_URL.rstrip("/") + "/export")
+DEVICE_SYNC_BATCH_SIZE = int(os.getenv("DEVICE_SYNC_BATCH_SIZE", "1000"))
+# Shared secret the main app sends with pushed device events; empty refuses pushes (syncs still run)
+DEVICE_EVENT_SECRET = os.getenv("DEVICE_EVENT_SECRET", "")
 
 # Server configuration
 HOST = os.getenv("HOST", "0.0.0.0")
@@ -23,5 +45,77 @@ PORT = int(os.getenv("PORT", "8001"))
 
 # Monitoring settings
 DEFAULT_CHECK_INTERVAL = 1  # minutes
-DEFAULT_SYNC_INTERVAL = 1   # minutes
-MAX_CONCURRENT_CHECKS = 50
\ No newline at end of file
+DEFAULT_SYNC_INTERVAL = int(os.getenv("DEVICE_SYNC_INTERVAL", "10"))  # minutes; changes are pushed, this is a fallback
+MAX_CONCURRENT_CHECKS = 50
+# Probe worker processes; devices are sharded across them on a consistent hash ring.
+# 1, the default, probes in-process; set it up to the CPU count for large fleets
+AVAILABILITY_WORKERS = int(os.getenv("AVAILABILITY_WORKERS", "1"))
+SHARD_VIRTUAL_NODES = int(os.getenv("SHARD_VIRTUAL_NODES", "256"))
+SHARD_PROBE_TIMEOUT_SECONDS = float(os.getenv("SHARD_PROBE_TIMEOUT_SECONDS", "60"))
+SHARD_RESTART_DELAY_SECONDS = float(os.getenv("SHARD_RESTART_DELAY_SECONDS", "1"))
+# Finished manual check jobs are kept this long (seconds)
+CHECK_JOB_RETENTION_SECONDS = int(os.getenv("CHECK_JOB_RETENTION_SECONDS", "3600"))
+
+# ICMP engine settings
+ICMP_ENGINE_ENABLED = os.getenv("ICMP_ENGINE_ENABLED", "true").lower() == "true"
+ICMP_MAX_IN_FLIGHT = int(os.getenv("ICMP_MAX_IN_FLIGHT", "4096"))
+
+# TCP connect prober: sockets open at once (also capped at half the fd limit)
+TCP_PROBE_MAX_IN_FLIGHT = int(os.getenv("TCP_PROBE_MAX_IN_FLIGHT", "4096"))
+
+# Per-device check scheduling (seconds)
+MIN_CHECK_INTERVAL_SECONDS = int(os.getenv("MIN_CHECK_INTERVAL_SECONDS", "5"))
+# Named tiers; devices without a tier or interval use the global check interval setting
+CHECK_TIER_INTERVALS = {
+    "critical": int(os.getenv("CHECK_INTERVAL_CRITICAL_SECONDS", "10")),
+    "low": int(os.getenv("CHECK_INTERVAL_LOW_SECONDS", "300")),
+}
+# Timer wheel: one slot per tick, a revolution of slots * tick seconds
+SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", "0.1"))
+SCHEDULER_WHEEL_SLOTS = int(os.getenv("SCHEDULER_WHEEL_SLOTS", "600"))
+# Rechecks right after a state flip to confirm it quickly
+STATE_CHANGE_RECHECK_SECONDS = int(os.getenv("STATE_CHANGE_RECHECK_SECONDS", "5"))
+STATE_CHANGE_CONFIRM_CHECKS = int(os.getenv("STATE_CHANGE_CONFIRM_CHECKS", "3"))
+# Devices down for longer than this are checked exponentially less often, up to the max interval
+DOWN_BACKOFF_AFTER_SECONDS = int(os.getenv("DOWN_BACKOFF_AFTER_SECONDS", "3600"))
+DOWN_BACKOFF_MAX_SECONDS = int(os.getenv("DOWN_BACKOFF_MAX_SECONDS", "3600"))
+
+# Result writer: checks are persisted in bulk batches
+RESULT_WRITER_BATCH_SIZE = int(os.getenv("RESULT_WRITER_BATCH_SIZE", "500"))
+RESULT_WRITER_FLUSH_SECONDS = float(os.getenv("RESULT_WRITER_FLUSH_SECONDS", "1.0"))
+# A failed batch is retried after this long, then split to drop only the rows that cannot be written
+RESULT_WRITER_RETRY_SECONDS = float(os.getenv("RESULT_WRITER_RETRY_SECONDS", "1.0"))
+
+# Live /stats aggregates: top slowest checks kept per window, window edge precision in buckets
+STATS_TOP_K = int(os.getenv("STATS_TOP_K", "5"))
+STATS_WINDOW_BUCKETS = int(os.getenv("STATS_WINDOW_BUCKETS", "30"))
+
+# Raw check rows: "changes" (the default) stores only the checks that changed a device's state,
+# "all" every check. Every check still updates the intervals, rollups and latency sketches
+RAW_CHECKS = os.getenv("RAW_CHECKS", "changes").lower()
+# Charts read raw checks for ranges up to this many days (with RAW_CHECKS=all), longer ranges rollups
+CHART_RAW_MAX_DAYS = int(os.getenv("CHART_RAW_MAX_DAYS", "1"))
+# Rollup charts use the finest resolution with at most this many buckets in the range
+CHART_MAX_ROLLUP_ROWS = int(os.getenv("CHART_MAX_ROLLUP_ROWS", "20000"))
+# Chart rows are read this many at a time and downsampled as they come
+CHART_QUERY_PAGE_SIZE = int(os.getenv("CHART_QUERY_PAGE_SIZE", "5000"))
+# Retention of raw checks (0, the default, keeps everything); deletes run in bounded batches.
+# Setting it deletes older history for good, rollups and intervals are kept
+RAW_RETENTION_DAYS = int(os.getenv("RAW_RETENTION_DAYS", "0"))
+MINUTE_ROLLUP_RETENTION_DAYS = int(os.getenv("MINUTE_ROLLUP_RETENTION_DAYS", "7"))
+RETENTION_INTERVAL_MINUTES = int(os.getenv("RETENTION_INTERVAL_MINUTES", "60"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+RETENTION_BATCH_PAUSE_SECONDS = float(os.getenv("RETENTION_BATCH_PAUSE_SECONDS", "0.05"))
+# "day" stores raw checks in daily range partitions (PostgreSQL only); "none" uses one table
+CHECK_PARTITIONING = os.getenv("CHECK_PARTITIONING", "none").lower()
+CHECK_PARTITIONS_AHEAD_DAYS = int(os.getenv("CHECK_PARTITIONS_AHEAD_DAYS", "3"))
+
+# Shared HTTP clients to other services: timeouts (seconds), pool size and connect retries
+HTTP_CLIENT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CLIENT_TIMEOUT_SECONDS", "30"))
+HTTP_CLIENT_MAX_CONNECTIONS = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", "20"))
+HTTP_CLIENT_MAX_KEEPALIVE = int(os.getenv("HTTP_CLIENT_MAX_KEEPALIVE", "5"))
+HTTP_CLIENT_KEEPALIVE_SECONDS = float(os.getenv("HTTP_CLIENT_KEEPALIVE_SECONDS", "60"))
+HTTP_CLIENT_RETRIES = int(os.getenv("HTTP_CLIENT_RETRIES", "2"))
+
+# Bulk history export: rows read per query (and per Parquet row group / Arrow record batch)
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "100000"))
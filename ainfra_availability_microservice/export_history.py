@@ -0,0 +1,50 @@
+# export_history.py
+"""
+Export availability history straight from the database to files.
+
+    python export_history.py --format parquet --start 2025-01-01 --end 2026-01-01 --out history
+    python export_history.py --format csv --device 12 --device 40 --rollups hour,day --out history
+
+Writes <out>.<ext> with the raw checks (unless --no-checks) and
+<out>_<resolution>.<ext> for every requested rollup. Rows are read in
+chunks of --chunk-size, so memory stays bounded however much is exported.
+"""
+import argparse
+import time
+from datetime import datetime
+
+from app.services.export import ExportService, EXPORT_FORMATS
+import config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export availability history")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="parquet")
+    parser.add_argument("--out", default="availability", help="Output path without extension")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="UTC start (inclusive), ISO format")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="UTC end (exclusive), ISO format")
+    parser.add_argument("--device", type=int, action="append", dest="device_ids", help="Device id (repeatable)")
+    parser.add_argument("--rollups", default="", help="Comma separated rollups to export too: minute,hour,day")
+    parser.add_argument("--no-checks", action="store_true", help="Skip the raw checks")
+    parser.add_argument("--chunk-size", type=int, default=config.EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    tables = [] if args.no_checks else ["checks"]
+    tables += [table.strip() for table in args.rollups.split(",") if table.strip()]
+    try:
+        for table in tables:
+            ExportService.check_format(args.format, table)
+    except ValueError as e:
+        parser.error(str(e))
+
+    extension = EXPORT_FORMATS[args.format][1]
+    for table in tables:
+        path = f"{args.out}.{extension}" if table == "checks" else f"{args.out}_{table}.{extension}"
+        start = time.perf_counter()
+        summary = ExportService.to_file(path, args.format, table, start=args.start, end=args.end,
+                                        device_ids=args.device_ids, chunk_size=args.chunk_size)
+        print(f"{table}: {summary['bytes'] / 1e6:.1f} MB -> {path} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
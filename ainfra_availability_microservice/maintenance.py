@@ -0,0 +1,31 @@
+# maintenance.py
+"""
+Maintenance tasks that are too slow to run at service startup.
+
+    python maintenance.py vacuum
+
+vacuum: switch an existing SQLite database to incremental vacuum, so space
+freed by RAW_RETENTION_DAYS is returned to the file system. Runs a full
+VACUUM that rewrites the database file; stop the service first.
+"""
+import argparse
+import time
+
+from app.services.retention import RetentionService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Availability database maintenance")
+    parser.add_argument("task", choices=["vacuum"])
+    args = parser.parse_args()
+
+    if args.task == "vacuum":
+        start = time.perf_counter()
+        if RetentionService.enable_incremental_vacuum():
+            print(f"Incremental vacuum enabled in {time.perf_counter() - start:.1f}s")
+        else:
+            print("Nothing to do: not SQLite, or incremental vacuum is already enabled")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# tests/conftest.py
+import asyncio
+import os
+import tempfile
+
+# Throwaway database and no outside services, set before config is imported
+_tmp_dir = tempfile.mkdtemp(prefix="availability-tests-")
+os.environ["AVAILABILITY_DB_URL"] = f"sqlite:///{_tmp_dir}/test.db"
+os.environ["AVAILABILITY_WORKERS"] = "1"
+os.environ["MAIN_APP_URL"] = "http://127.0.0.1:9"
+
+import pytest
+
+from app.models.database import Base, engine, async_engine, SessionLocal
+import app.models.models  # noqa: F401
+
+
+@pytest.fixture(autouse=True)
+def tables():
+    """Every test starts from freshly created, empty tables"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+
+
+@pytest.fixture
+def run():
+    """
+    Run a coroutine on a new event loop.
+
+    The async engine's pooled connections each keep an aiosqlite thread
+    bound to the loop that opened them; they are closed before the loop
+    ends, as the service does on shutdown.
+    """
+    def run_coroutine(coroutine):
+        async def main():
+            try:
+                return await coroutine
+            finally:
+                await async_engine.dispose()
+
+        return asyncio.run(main())
+
+    return run_coroutine
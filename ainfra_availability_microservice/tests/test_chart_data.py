@@ -0,0 +1,49 @@
+# tests/test_chart_data.py
+from datetime import datetime, timedelta
+
+import config
+from app.models.models import Device
+from app.services.availability import AvailabilityService
+from app.services.writer import ResultWriter
+
+
+def seed(run, states):
+    start = datetime.utcnow() - timedelta(hours=1)
+    run(ResultWriter().write_many([{
+        "device_id": 1,
+        "timestamp": (start + timedelta(seconds=10 * i)).isoformat(),
+        "is_available": up,
+        "response_time": float(i),
+        "check_method": "ping",
+    } for i, up in enumerate(states)]))
+
+
+def test_raw_series_is_downsampled_while_streamed(db, monkeypatch, run):
+    monkeypatch.setattr(config, "RAW_CHECKS", "all")
+    monkeypatch.setattr(config, "CHART_QUERY_PAGE_SIZE", 7)
+    db.add(Device(id=1, name="router", ip_address="10.0.0.1"))
+    db.commit()
+    states = [i != 42 for i in range(100)]
+    seed(run, states)
+
+    full = AvailabilityService.get_availability_chart_data(db, 1, days=1, max_points=0, source="raw")
+    chart = AvailabilityService.get_availability_chart_data(db, 1, days=1, max_points=10, source="raw")
+
+    assert len(full["timestamps"]) == 100
+    assert len(chart["timestamps"]) == 10
+    # First and last checks are kept; the one failure shows in its bucket
+    assert chart["timestamps"][0] == full["timestamps"][0]
+    assert chart["timestamps"][-1] == full["timestamps"][-1]
+    assert chart["availability"].count(0) == 1
+    assert chart["timestamps"] == sorted(chart["timestamps"])
+
+
+def test_max_points_below_three_keeps_three_points(db, monkeypatch, run):
+    monkeypatch.setattr(config, "RAW_CHECKS", "all")
+    db.add(Device(id=1, name="router", ip_address="10.0.0.1"))
+    db.commit()
+    seed(run, [True] * 20)
+
+    chart = AvailabilityService.get_availability_chart_data(db, 1, days=1, max_points=1, source="raw")
+
+    assert len(chart["timestamps"]) == 3
@@ -0,0 +1,54 @@
+# tests/test_device_events.py
+import httpx
+
+import config
+from app.models.models import Device
+from app.services.sync import apply_device_events
+
+
+def updated(device_id, **device):
+    return {"event_type": "device_updated", "device_id": device_id,
+            "device": {"id": device_id, "name": f"d{device_id}", "ip_address": f"10.0.0.{device_id}", **device}}
+
+
+def test_bad_events_are_rejected_alone(db):
+    db.add(Device(id=4, name="old", ip_address="10.0.0.4"))
+    db.commit()
+
+    result = apply_device_events(db, [
+        updated(1),
+        updated(2, name=None),  # Fails validation
+        updated(3, is_active="maybe"),  # Fails when stored
+        {"event_type": "device_deleted", "device_id": 4},
+    ])
+
+    assert result["applied"] == 2
+    assert [r["device_id"] for r in result["rejected"]] == [2, 3]
+    assert "lacks name" in result["rejected"][0]["error"]
+    db.expire_all()
+    assert [device.id for device in db.query(Device).all()] == [1]
+
+
+def test_pushed_events_need_the_shared_secret(db, run, monkeypatch):
+    from app.main import app
+
+    db.add(Device(id=4, name="old", ip_address="10.0.0.4"))
+    db.commit()
+    batch = {"events": [{"event_type": "device_deleted", "device_id": 4}]}
+
+    async def post(secret):
+        headers = {"X-Device-Event-Secret": secret} if secret else {}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return (await client.post("/device-events", json=batch, headers=headers)).status_code
+
+    monkeypatch.setattr(config, "DEVICE_EVENT_SECRET", "")
+    assert run(post("anything")) == 403
+    monkeypatch.setattr(config, "DEVICE_EVENT_SECRET", "s3cret")
+    assert run(post(None)) == 401
+    assert run(post("wrong")) == 401
+    db.expire_all()
+    assert db.get(Device, 4) is not None
+
+    assert run(post("s3cret")) == 200
+    db.expire_all()
+    assert db.get(Device, 4) is None
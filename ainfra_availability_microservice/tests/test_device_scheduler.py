@@ -0,0 +1,84 @@
+# tests/test_device_scheduler.py
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+from app.models.models import Device
+from app.schemas.schemas import DeviceScheduleUpdate
+from app.services.device_scheduler import DeviceCheckScheduler, phase
+from app.services.writer import ResultWriter
+
+BASE = config.DEFAULT_CHECK_INTERVAL * 60
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = DeviceCheckScheduler()
+    yield scheduler
+    scheduler.stop()
+
+
+def down_since(run, device_id, since):
+    run(ResultWriter().write_many([{
+        "device_id": device_id,
+        "timestamp": (since + timedelta(minutes=i)).isoformat(),
+        "is_available": False,
+        "check_method": "ping",
+    } for i in range(2)]))
+
+
+def test_next_check_lands_on_the_device_phase(scheduler):
+    interval = 60
+    offset = phase(7) * interval
+
+    for resume in (True, False):
+        now = time.time()
+        delay = scheduler._aligned_delay(7, interval, resume)
+        periods = (now + delay - offset) / interval
+        assert periods == pytest.approx(round(periods), abs=1e-4)
+        # Resuming takes the next phase point, after a check it is at least half an interval away
+        assert (0 <= delay <= interval) if resume else (interval / 2 <= delay <= interval * 1.5)
+
+
+def test_state_change_is_confirmed_then_back_to_the_base_interval(db, scheduler):
+    db.add(Device(id=1, name="router", ip_address="10.0.0.1"))
+    db.commit()
+    scheduler.refresh_devices()
+
+    intervals = [scheduler.next_interval(1, up) for up in (True, False, False, False, False, False)]
+
+    recheck = min(BASE, config.STATE_CHANGE_RECHECK_SECONDS)
+    assert intervals == [BASE, 0] + [recheck] * config.STATE_CHANGE_CONFIRM_CHECKS + [BASE]
+
+
+def test_backoff_of_a_long_dead_device_survives_a_restart(db, scheduler, run):
+    db.add_all([Device(id=1, name="dead", ip_address="10.0.0.1"),
+                Device(id=2, name="just-down", ip_address="10.0.0.2")])
+    db.commit()
+    now = datetime.utcnow()
+    down_since(run, 1, now - timedelta(seconds=config.DOWN_BACKOFF_AFTER_SECONDS + 600))
+    down_since(run, 2, now - timedelta(minutes=5))
+
+    # A new scheduler process seeds the state start from the stored history
+    scheduler.refresh_devices()
+
+    backoff = [scheduler.next_interval(1, False) for _ in range(7)]
+    cap = max(BASE, config.DOWN_BACKOFF_MAX_SECONDS)
+    assert backoff == [min(cap, BASE * 2 ** i) for i in range(1, 8)]
+    assert backoff[-1] == cap
+    assert scheduler.next_interval(2, False) == BASE
+
+
+def test_unknown_tier_is_refused_or_falls_back_with_a_warning(db, scheduler, capsys):
+    with pytest.raises(ValueError, match="check_tier must be one of"):
+        DeviceScheduleUpdate(check_tier="gold")
+
+    # A tier stored before it was removed from the config
+    db.add(Device(id=1, name="router", ip_address="10.0.0.1", check_tier="gold"))
+    db.commit()
+    scheduler.refresh_devices()
+
+    assert scheduler._base_interval(1) == BASE
+    assert "unknown check tier 'gold'" in capsys.readouterr().out
@@ -0,0 +1,58 @@
+# tests/test_export.py
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from app.models.models import Device, AvailabilityCheck
+from app.services.export import ExportService
+
+START = datetime(2025, 5, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def checks(db):
+    db.add(Device(id=1, name="router", ip_address="10.0.0.1"))
+    for i in range(5):
+        db.add(AvailabilityCheck(id=i + 1, device_id=1, timestamp=START + timedelta(minutes=i),
+                                 is_available=i % 2 == 0, response_time=None if i % 2 else 1.5 * i,
+                                 check_method="ping", error_message=None if i % 2 == 0 else "timeout",
+                                 probe_policy="default"))
+    db.commit()
+    return [(i + 1, 1, START + timedelta(minutes=i), i % 2 == 0, None if i % 2 else 1.5 * i,
+             "ping", None if i % 2 == 0 else "timeout", "default") for i in range(5)]
+
+
+def export(export_format):
+    # A chunk size below the row count so the export spans several chunks
+    return b"".join(ExportService.stream(export_format, "checks", chunk_size=2))
+
+
+def read_arrow_rows(table):
+    return [tuple(row.values()) for row in table.to_pylist()]
+
+
+def test_csv_round_trip(checks):
+    rows = list(csv.reader(io.StringIO(export("csv").decode())))
+
+    assert rows[0] == ExportService.column_names("checks")
+    parsed = [(int(r[0]), int(r[1]), datetime.fromisoformat(r[2]), r[3] == "1",
+               float(r[4]) if r[4] else None, r[5], r[6] or None, r[7]) for r in rows[1:]]
+    assert parsed == checks
+
+
+def test_arrow_round_trip(checks):
+    table = pa.ipc.open_file(pa.BufferReader(export("arrow"))).read_all()
+
+    assert table.column_names == ExportService.column_names("checks")
+    assert read_arrow_rows(table) == checks
+
+
+def test_parquet_round_trip(checks):
+    table = pq.read_table(pa.BufferReader(export("parquet")))
+
+    assert table.column_names == ExportService.column_names("checks")
+    assert read_arrow_rows(table) == checks
@@ -0,0 +1,88 @@
+# tests/test_probe.py
+import asyncio
+import time
+
+import pytest
+
+from app.services import probe as probe_module
+from app.services.probe import ProbeService, DEFAULT_PROBE_POLICY
+
+
+@pytest.fixture
+def network(monkeypatch):
+    """
+    Stubbed probes: open TCP ports and a queue of ping outcomes; records every
+    probe run. Closed ports and lost pings take the whole timeout, as on a dead host.
+    """
+    state = {"open_ports": set(), "pings": [], "calls": []}
+
+    async def tcp_probe(ip_address, port, timeout):
+        state["calls"].append(f"tcp:{port}")
+        if port in state["open_ports"]:
+            return True, 2.0
+        await asyncio.sleep(timeout)
+        return False, None
+
+    async def ping(ip_address, timeout=1.0):
+        state["calls"].append("icmp")
+        if state["pings"] and state["pings"].pop(0):
+            return True, 4.0
+        await asyncio.sleep(timeout)
+        return False, None
+
+    monkeypatch.setattr(ProbeService, "_tcp_probe", staticmethod(tcp_probe))
+    monkeypatch.setattr(probe_module, "ping_device_async", ping)
+    return state
+
+
+def evaluate(preferred=None):
+    return asyncio.run(ProbeService.evaluate("10.0.0.1", DEFAULT_PROBE_POLICY, preferred=preferred))
+
+
+def test_default_is_up_on_any_open_port(network):
+    network["open_ports"] = {443}
+
+    result = evaluate()
+
+    assert result["is_available"] is True
+    assert result["check_method"] == "port_check"
+    assert result["successful_probe"] == {"method": "tcp", "port": 443}
+
+
+def test_default_needs_all_three_pings(network):
+    network["pings"] = [True, True, False]
+
+    result = evaluate()
+
+    assert result["is_available"] is False
+    assert network["calls"].count("icmp") == 3
+
+
+def test_default_is_up_on_three_ping_replies(network):
+    network["pings"] = [True, True, True]
+
+    result = evaluate()
+
+    assert result["is_available"] is True
+    assert result["check_method"] == "ping"
+
+
+def test_dead_host_fails_within_one_probe_timeout(network):
+    start = time.perf_counter()
+    result = evaluate()
+    elapsed = time.perf_counter() - start
+
+    assert result["is_available"] is False
+    assert len(result["probes_run"]) == len(DEFAULT_PROBE_POLICY["probes"])
+    # Every port and the first ping time out together
+    assert elapsed < DEFAULT_PROBE_POLICY["probe_timeout"] * 1.5
+
+
+def test_remembered_ping_runs_first(network):
+    network["pings"] = [True, True, True]
+
+    # Memos store only method and port
+    result = evaluate(preferred={"method": "icmp"})
+
+    assert result["is_available"] is True
+    assert network["calls"] == ["icmp", "icmp", "icmp"]
@@ -0,0 +1,76 @@
+# tests/test_reconcile.py
+import json
+import tracemalloc
+
+import httpx
+from sqlalchemy import insert
+
+from app.models.models import Device
+from app.services.sync import reconcile_devices
+
+DEVICES = 50_000
+# Peak Python allocations while reconciling: one batch, the session and the set
+# of IDs seen. 50,000 parsed export lines alone take about 50 MB
+MAX_PEAK_BYTES = 12 * 1024 * 1024
+
+
+def device(device_id, name=None):
+    return {"id": device_id, "name": name or f"device-{device_id}",
+            "ip_address": f"10.{device_id >> 16}.{(device_id >> 8) & 255}.{device_id & 255}", "is_active": True}
+
+
+def local_devices(db, count):
+    db.execute(insert(Device), [device(device_id) for device_id in range(1, count + 1)])
+    db.commit()
+
+
+def export_client(count, complete=True, renamed=()):
+    """Client whose device export streams count devices in chunks, with or without the end line"""
+    async def export():
+        for start in range(1, count + 1, 1000):
+            yield "".join(
+                json.dumps(device(i, "renamed" if i in renamed else None)) + "\n"
+                for i in range(start, min(start + 1000, count + 1))
+            ).encode()
+        if complete:
+            yield (json.dumps({"end": True, "count": count, "cursor": "2026-01-01T00:00:00"}) + "\n").encode()
+
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=export()))
+    return httpx.AsyncClient(transport=transport)
+
+
+def reconcile(run, client):
+    async def main():
+        async with client:
+            return await reconcile_devices(client)
+
+    tracemalloc.start()
+    try:
+        cursor = run(main())
+        return cursor, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_complete_export_is_streamed_and_reconciled(db, run):
+    # Ten local devices are gone upstream, three were renamed
+    local_devices(db, DEVICES + 10)
+
+    cursor, peak = reconcile(run, export_client(DEVICES, renamed={1, 25_000, DEVICES}))
+
+    assert cursor == "2026-01-01T00:00:00"
+    assert peak < MAX_PEAK_BYTES, f"peak {peak / 1e6:.1f} MB"
+    db.expire_all()
+    assert db.query(Device).count() == DEVICES
+    assert db.query(Device).filter(Device.name == "renamed").count() == 3
+
+
+def test_cut_off_export_deletes_nothing(db, run):
+    local_devices(db, DEVICES)
+
+    # The stream stops half way, without its end line
+    cursor, _ = reconcile(run, export_client(DEVICES // 2, complete=False))
+
+    assert cursor is None
+    db.expire_all()
+    assert db.query(Device).count() == DEVICES
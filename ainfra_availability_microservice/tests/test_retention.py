@@ -0,0 +1,44 @@
+# tests/test_retention.py
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+import config
+from app.models.database import engine
+from app.models.models import Device, AvailabilityCheck
+from app.services.retention import RetentionService
+
+
+def auto_vacuum():
+    # From a new connection, pooled ones can report the mode they saw before the VACUUM
+    engine.dispose()
+    with engine.connect() as conn:
+        return conn.execute(text("PRAGMA auto_vacuum")).scalar()
+
+
+def test_history_is_kept_by_default(db):
+    assert config.RAW_RETENTION_DAYS == 0
+    db.add(Device(id=1, name="router", ip_address="10.0.0.1"))
+    db.add(AvailabilityCheck(device_id=1, timestamp=datetime.utcnow() - timedelta(days=400),
+                             is_available=True, check_method="ping"))
+    db.commit()
+
+    summary = RetentionService.run()
+
+    assert summary["raw_checks_deleted"] == 0
+    assert db.query(AvailabilityCheck).count() == 1
+
+
+def test_existing_database_is_vacuumed_on_request_only(monkeypatch):
+    monkeypatch.setattr(config, "RAW_RETENTION_DAYS", 30)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("PRAGMA auto_vacuum = NONE"))
+        conn.execute(text("VACUUM"))
+
+    # Startup leaves the full VACUUM of an existing database to the maintenance command
+    RetentionService.prepare_storage()
+    assert auto_vacuum() == 0
+
+    assert RetentionService.enable_incremental_vacuum() is True
+    assert auto_vacuum() == 2
+    assert RetentionService.enable_incremental_vacuum() is False
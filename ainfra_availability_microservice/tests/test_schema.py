@@ -0,0 +1,74 @@
+# tests/test_schema.py
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect, text
+
+from app.models.database import Base, engine
+from app.models.schema import upgrade_schema, ADDED_COLUMNS
+
+# Tables as the first release created them
+BASELINE_DDL = [
+    """CREATE TABLE devices (
+        id INTEGER NOT NULL PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        ip_address VARCHAR(50) NOT NULL,
+        created_at DATETIME,
+        updated_at DATETIME,
+        is_active BOOLEAN
+    )""",
+    """CREATE TABLE availability_checks (
+        id INTEGER NOT NULL PRIMARY KEY,
+        device_id INTEGER REFERENCES devices (id),
+        timestamp DATETIME,
+        is_available BOOLEAN,
+        response_time FLOAT,
+        check_method VARCHAR(50) NOT NULL,
+        error_message VARCHAR(255)
+    )""",
+    "CREATE INDEX ix_availability_checks_timestamp ON availability_checks (timestamp)",
+    """CREATE TABLE monitoring_settings (
+        id INTEGER NOT NULL PRIMARY KEY,
+        "key" VARCHAR(100) NOT NULL UNIQUE,
+        value VARCHAR(255) NOT NULL,
+        description VARCHAR(255)
+    )""",
+]
+
+
+def baseline_database():
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        for ddl in BASELINE_DDL:
+            conn.execute(text(ddl))
+        conn.execute(text(
+            "INSERT INTO devices (id, name, ip_address, is_active) VALUES (1, 'router', '127.0.0.1', 1)"))
+        conn.execute(text(
+            "INSERT INTO availability_checks (device_id, timestamp, is_available, response_time, check_method) "
+            "VALUES (1, :timestamp, 1, 1.5, 'ping')"), {"timestamp": datetime.utcnow() - timedelta(hours=1)})
+
+
+def test_upgrade_adds_missing_columns_once():
+    baseline_database()
+    Base.metadata.create_all(bind=engine)
+
+    added = upgrade_schema()
+
+    assert added == [f"{table.name}.{column}" for table, column in ADDED_COLUMNS]
+    inspector = inspect(engine)
+    for table, column in ADDED_COLUMNS:
+        assert column in {c["name"] for c in inspector.get_columns(table.name)}
+    assert "ix_devices_probe_group" in {index["name"] for index in inspector.get_indexes("devices")}
+    assert upgrade_schema() == []
+
+
+def test_service_starts_on_a_baseline_database():
+    baseline_database()
+    from app.main import app
+
+    with TestClient(app) as client:
+        assert client.get("/devices").status_code == 200
+        history = client.get("/1/history").json()
+
+    # The baseline row, next to any checks the scheduler ran meanwhile
+    assert [check["response_time"] for check in history if check["check_method"] == "ping"][-1] == 1.5
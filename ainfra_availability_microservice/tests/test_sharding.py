@@ -0,0 +1,81 @@
+# tests/test_sharding.py
+import asyncio
+import socket
+
+import pytest
+
+import config
+from app.services.sharding import ShardedProbePool
+
+
+@pytest.fixture
+def open_port():
+    """A local port that accepts connections, for the workers' TCP probes"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1024)
+    yield server.getsockname()[1]
+    server.close()
+
+
+def target(device_id, port, padding=0):
+    return {
+        "device_id": device_id,
+        "device_name": f"device-{device_id}" + "x" * padding,
+        "ip_address": "127.0.0.1",
+        "policy": {"name": "local", "probes": [{"method": "tcp", "port": port}],
+                   "mode": "sequential", "quorum": 1, "probe_timeout": 1.0},
+        "preferred": None,
+    }
+
+
+def test_workers_probe_sharded_devices(open_port, run):
+    pool = ShardedProbePool()
+
+    async def probe_all():
+        pool.start(2)
+        try:
+            pool.rebalance(range(1, 401))
+            # Large targets fill the socket buffers; sends queue instead of blocking the loop
+            results = await asyncio.gather(*(pool.probe(target(i, open_port, padding=16384))
+                                             for i in range(1, 401)))
+            return results, pool.stats()
+        finally:
+            await pool.stop()
+
+    results, stats = run(probe_all())
+
+    assert [r["device_id"] for r in results] == list(range(1, 401))
+    assert all(r["is_available"] for r in results)
+    assert stats["mode"] == "sharded"
+    assert [w["completed"] for w in stats["workers"]] == [w["devices"] for w in stats["workers"]]
+    assert all(w["devices"] for w in stats["workers"])
+    assert not pool.running
+
+
+def test_dead_worker_is_replaced(open_port, monkeypatch, run):
+    monkeypatch.setattr(config, "SHARD_RESTART_DELAY_SECONDS", 0.1)
+    pool = ShardedProbePool()
+
+    async def kill_and_probe():
+        pool.start(2)
+        try:
+            pool.rebalance(range(1, 101))
+            await asyncio.gather(*(pool.probe(target(i, open_port)) for i in range(1, 101)))
+            pool._workers[0]["process"].kill()
+            # Its devices are probed by the other worker until it is back
+            results = await asyncio.gather(*(pool.probe(target(i, open_port)) for i in range(1, 101)))
+            for _ in range(100):
+                if pool._workers[0]["alive"]:
+                    break
+                await asyncio.sleep(0.1)
+            results += await asyncio.gather(*(pool.probe(target(i, open_port)) for i in range(1, 101)))
+            return results, pool.stats()
+        finally:
+            await pool.stop()
+
+    results, stats = run(kill_and_probe())
+
+    assert len(results) == 200 and all(r["is_available"] for r in results)
+    assert [w["restarts"] for w in stats["workers"]] == [1, 0]
+    assert all(w["alive"] for w in stats["workers"])
@@ -0,0 +1,114 @@
+# tests/test_writer.py
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+from app.models.models import Device, AvailabilityCheck, AvailabilityRollupMinute
+from app.services.availability import AvailabilityService
+from app.services.probe import ProbeService
+from app.services.writer import ResultWriter
+
+
+def result(device_id):
+    return {
+        "device_id": device_id,
+        "timestamp": datetime.utcnow().isoformat(),
+        "is_available": True,
+        "response_time": 1.0,
+        "check_method": "ping",
+    }
+
+
+@pytest.fixture
+def devices(db):
+    db.add_all([Device(id=device_id, name=f"d{device_id}", ip_address=f"10.0.0.{device_id}",
+                       is_active=device_id != 3) for device_id in (1, 2, 3)])
+    db.commit()
+
+
+def test_failed_batch_drops_only_the_bad_result(db, devices, monkeypatch, run):
+    monkeypatch.setattr(config, "RESULT_WRITER_RETRY_SECONDS", 0)
+    monkeypatch.setattr(config, "RAW_CHECKS", "all")
+    write_batch = ResultWriter._write_batch
+
+    def failing_write_batch(self, results):
+        # Stands in for a foreign key violation of a device deleted while its result was queued
+        if any(r["device_id"] == 99 for r in results):
+            raise RuntimeError("FOREIGN KEY constraint failed")
+        return write_batch(self, results)
+
+    monkeypatch.setattr(ResultWriter, "_write_batch", failing_write_batch)
+    writer = ResultWriter()
+    failed_before = writer.stats()["failed_rows"]
+    results = [result(1 + i % 2) for i in range(300)]
+    results.insert(137, result(99))
+
+    written = run(writer.write_many(results))
+
+    assert written == 300
+    assert writer.stats()["failed_rows"] - failed_before == 1
+    assert db.query(AvailabilityCheck).count() == 300
+
+
+def checks_in_one_minute(*states):
+    minute = datetime.utcnow().replace(second=0, microsecond=0)
+    return [dict(result(1), is_available=up, timestamp=(minute + timedelta(seconds=i)).isoformat())
+            for i, up in enumerate(states)]
+
+
+def test_only_state_changes_are_stored_as_raw_checks(db, devices, run):
+    results = checks_in_one_minute(True, True, False, False, True)
+
+    assert run(ResultWriter().write_many(results)) == 5
+
+    raw = db.query(AvailabilityCheck).order_by(AvailabilityCheck.timestamp).all()
+    assert [check.is_available for check in raw] == [True, False, True]
+    assert db.query(AvailabilityRollupMinute).one().checks == 5
+
+
+def test_chart_reads_rollups_beyond_the_raw_window(db, devices, monkeypatch, run):
+    monkeypatch.setattr(config, "RAW_CHECKS", "all")
+    run(ResultWriter().write_many(checks_in_one_minute(True, False, True)))
+
+    assert AvailabilityService.chart_source(1) == "raw"
+    assert AvailabilityService.chart_source(7) == "minute"
+    assert AvailabilityService.chart_source(30) == "hour"
+    assert AvailabilityService.chart_source(10000) == "day"
+
+    raw = AvailabilityService.get_availability_chart_data(db, 1, days=1)
+    week = AvailabilityService.get_availability_chart_data(db, 1, days=7)
+    ratio = AvailabilityService.get_availability_chart_data(db, 1, days=7, availability_agg="ratio")
+
+    assert (raw["source"], raw["availability"]) == ("raw", [1, 0, 1])
+    assert (week["source"], week["availability"]) == ("minute", [0])
+    assert ratio["availability"] == [round(2 / 3, 4)]
+
+
+def test_on_demand_check_probes_inactive_devices(db, devices, monkeypatch, run):
+    async def evaluate(ip_address, policy, preferred=None):
+        return {"is_available": True, "response_time": 1.0, "check_method": "ping", "error_message": None,
+                "probe_policy": policy["name"], "probes_run": [], "successful_probe": None}
+
+    submitted = []
+    monkeypatch.setattr(ProbeService, "evaluate", staticmethod(evaluate))
+    monkeypatch.setattr(ResultWriter, "submit", lambda self, r: submitted.append(r))
+
+    checked = run(AvailabilityService.check_device_availability(3))
+
+    assert checked["is_available"] is True
+    assert [r["device_id"] for r in submitted] == [3]
+    # The scheduler and sweeps still leave it out
+    assert 3 not in ProbeService.load_targets(db)
+
+
+def test_writer_works_from_one_event_loop_after_another(db, devices, run):
+    writer = ResultWriter()
+
+    async def write_concurrently():
+        # Two writes at once, so the second waits on the write lock
+        return sum(await asyncio.gather(writer.write_many([result(1)]), writer.write_many([result(2)])))
+
+    assert run(write_concurrently()) == 2
+    assert run(write_concurrently()) == 2
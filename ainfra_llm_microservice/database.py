@@ -3,6 +3,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import func
 from contextlib import contextmanager
+from functools import lru_cache
 from typing import Dict, List, Optional
 import os
 from pathlib import Path
@@ -43,8 +44,9 @@ def get_db():
         db.close()
 
 
+@lru_cache(maxsize=None)
 def is_running_in_docker():
-    """Check if the code is running inside a Docker container"""
+    """Check if the code is running inside a Docker container (read once per process)"""
     try:
         with open('/proc/1/cgroup', 'rt') as f:
             return 'docker' in f.read()
@@ -56,8 +58,9 @@ def init_db():
     """Initialize the database with required tables and default values"""
     Base.metadata.create_all(bind=engine)
 
-    # Set the MCP base URL based on environment
-    mcp_base_url = "http://app:8000/mcp" if is_running_in_docker() else "http://localhost:8000/mcp"
+    # Set the MCP base URL from the environment, or based on where we run
+    mcp_base_url = os.getenv(
+        "MCP_BASE_URL", "http://app:8000/mcp" if is_running_in_docker() else "http://localhost:8000/mcp")
 
     # Insert default settings if they don't exist
     default_settings = {
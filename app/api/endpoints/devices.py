@@ -1,23 +1,65 @@
-from fastapi import APIRouter, Depends, Path, Query, HTTPException
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, Path, Query, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 
 from ...core.database import get_db
-from ...schemas.device import DeviceCreate, DeviceResponse, DeviceUpdate, StandardDeviceUpdate, CustomDeviceUpdate
+from ...schemas.device import (
+    DeviceCreate, DeviceResponse, DeviceUpdate, StandardDeviceUpdate, CustomDeviceUpdate, DeviceChanges
+)
 from ...services.device_service import DeviceService
 
 router = APIRouter()
 
-@router.get("/", response_model=List[DeviceResponse], operation_id="get_all_devices")
+@router.get("/", response_model=Union[List[DeviceResponse], DeviceChanges], operation_id="get_all_devices")
 async def get_devices(
+    request: Request,
+    response: Response,
     skip: int = Query(0, description="Skip first N devices"),
     limit: int = Query(100, description="Limit the number of devices returned"),
+    updated_since: Optional[datetime] = Query(
+        None, description="Only changes at or after this time: {devices, deleted, cursor} instead of a list"),
     db: Session = Depends(get_db)
 ):
     """
     Get all devices with pagination.
+
+    With updated_since, returns the devices created or updated since then, the IDs of
+    devices deleted since then and a cursor to pass as updated_since next time.
+    Sends an ETag; a matching If-None-Match gets 304 Not Modified.
     """
-    return await DeviceService.get_devices(db, skip=skip, limit=limit)
+    if updated_since is None:
+        etag = f'"{await DeviceService.get_version(db)}-{skip}-{limit}"'
+    else:
+        # The version covers every change, so one ETag serves any cursor
+        etag = f'"{await DeviceService.get_version(db)}-changes"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    if updated_since is None:
+        return await DeviceService.get_devices(db, skip=skip, limit=limit)
+    # Stored timestamps are naive UTC
+    if updated_since.tzinfo is not None:
+        updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+    return await DeviceService.get_device_changes(db, updated_since)
+
+@router.get("/export", operation_id="export_all_devices")
+async def export_devices(
+    after_id: int = Query(0, description="Start after this device ID (to resume an export)"),
+    chunk_size: int = Query(1000, ge=1, le=10000, description="Devices read per query"),
+):
+    """
+    Stream every device as NDJSON, one device per line, in ID order.
+    The last line is {"end": true, "count": ..., "cursor": ...}; pass the cursor
+    as updated_since to GET /devices/ to continue with changes only.
+    """
+    # A plain iterator is run on the thread pool by StreamingResponse, off the event loop
+    return StreamingResponse(
+        DeviceService.export_devices(after_id, chunk_size),
+        media_type="application/x-ndjson"
+    )
 
 @router.get("/{device_id}", response_model=DeviceResponse, operation_id="get_device_by_id")
 async def get_device(
@@ -3,16 +3,77 @@ from pydantic_settings import BaseSettings
 from functools import lru_cache
 
 
+def _in_docker() -> bool:
+    try:
+        with open('/proc/1/cgroup', 'rt') as f:
+            return 'docker' in f.read()
+    except OSError:
+        return False
+
+
+# Other services are on the compose network in Docker; resolved once at startup
+_AVAILABILITY_HOST = "availability_service" if _in_docker() else "localhost"
+
+
 class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "AInfrastructure Platform"
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./infra_platform.db")
     PLUGINS_DIR: str = os.getenv("PLUGINS_DIR", "./plugins")
 
+    # Alert notifications (comma separated lists; empty disables the channel)
+    NOTIFY_WEBHOOK_URLS: str = os.getenv("NOTIFY_WEBHOOK_URLS", "")
+    SMTP_HOST: str = os.getenv("SMTP_HOST", "")
+    SMTP_PORT: int = int(os.getenv("SMTP_PORT", "25"))
+    SMTP_USERNAME: str = os.getenv("SMTP_USERNAME", "")
+    SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD", "")
+    SMTP_USE_TLS: bool = os.getenv("SMTP_USE_TLS", "false").lower() == "true"
+    SMTP_FROM: str = os.getenv("SMTP_FROM", "ainfra@localhost")
+    SMTP_TO: str = os.getenv("SMTP_TO", "")
+
+    # Notification dispatcher tuning
+    NOTIFY_POLL_INTERVAL_SECONDS: float = float(os.getenv("NOTIFY_POLL_INTERVAL_SECONDS", "5"))
+    NOTIFY_COALESCE_WINDOW_SECONDS: float = float(os.getenv("NOTIFY_COALESCE_WINDOW_SECONDS", "30"))
+    NOTIFY_BATCH_SIZE: int = int(os.getenv("NOTIFY_BATCH_SIZE", "200"))
+    NOTIFY_MAX_PER_MESSAGE: int = int(os.getenv("NOTIFY_MAX_PER_MESSAGE", "50"))
+    NOTIFY_DESTINATION_CONCURRENCY: int = int(os.getenv("NOTIFY_DESTINATION_CONCURRENCY", "2"))
+    NOTIFY_TIMEOUT_SECONDS: float = float(os.getenv("NOTIFY_TIMEOUT_SECONDS", "10"))
+    NOTIFY_MAX_ATTEMPTS: int = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8"))
+    NOTIFY_RETRY_BASE_SECONDS: float = float(os.getenv("NOTIFY_RETRY_BASE_SECONDS", "5"))
+    NOTIFY_RETRY_MAX_SECONDS: float = float(os.getenv("NOTIFY_RETRY_MAX_SECONDS", "900"))
+    # Delivered and coalesced outbox rows are deleted after this long
+    NOTIFY_RETENTION_HOURS: float = float(os.getenv("NOTIFY_RETENTION_HOURS", "168"))
+
+    # Upstream services and their shared HTTP clients (app/core/http_clients.py)
+    AVAILABILITY_SERVICE_URL: str = os.getenv("AVAILABILITY_SERVICE_URL", f"http://{_AVAILABILITY_HOST}:8001")
+    HTTP_CLIENT_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_CLIENT_TIMEOUT_SECONDS", "10"))
+    HTTP_CLIENT_MAX_CONNECTIONS: int = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", "50"))
+    HTTP_CLIENT_MAX_KEEPALIVE: int = int(os.getenv("HTTP_CLIENT_MAX_KEEPALIVE", "10"))
+    HTTP_CLIENT_KEEPALIVE_SECONDS: float = float(os.getenv("HTTP_CLIENT_KEEPALIVE_SECONDS", "60"))
+    HTTP_CLIENT_RETRIES: int = int(os.getenv("HTTP_CLIENT_RETRIES", "2"))
+
+    # The device change feed also returns changes this long before the cursor, for transactions that commit late
+    DEVICE_CHANGES_OVERLAP_SECONDS: float = float(os.getenv("DEVICE_CHANGES_OVERLAP_SECONDS", "30"))
+    # Shared secret sent with device events; the availability service only accepts events carrying it
+    DEVICE_EVENT_SECRET: str = os.getenv("DEVICE_EVENT_SECRET", "")
+    # Device change events pushed to other services (comma separated webhook URLs; empty disables).
+    # Pushing to the availability service is on once the shared secret is set
+    DEVICE_EVENT_WEBHOOK_URLS: str = os.getenv(
+        "DEVICE_EVENT_WEBHOOK_URLS",
+        AVAILABILITY_SERVICE_URL.rstrip("/") + "/device-events" if DEVICE_EVENT_SECRET else "")
+    DEVICE_EVENT_POLL_INTERVAL_SECONDS: float = float(os.getenv("DEVICE_EVENT_POLL_INTERVAL_SECONDS", "2"))
+    DEVICE_EVENT_BATCH_SIZE: int = int(os.getenv("DEVICE_EVENT_BATCH_SIZE", "500"))
+    DEVICE_EVENT_TIMEOUT_SECONDS: float = float(os.getenv("DEVICE_EVENT_TIMEOUT_SECONDS", "10"))
+    DEVICE_EVENT_MAX_ATTEMPTS: int = int(os.getenv("DEVICE_EVENT_MAX_ATTEMPTS", "20"))
+    DEVICE_EVENT_RETRY_BASE_SECONDS: float = float(os.getenv("DEVICE_EVENT_RETRY_BASE_SECONDS", "2"))
+    DEVICE_EVENT_RETRY_MAX_SECONDS: float = float(os.getenv("DEVICE_EVENT_RETRY_MAX_SECONDS", "300"))
+    # Delivered and coalesced device events are deleted after this long
+    DEVICE_EVENT_RETENTION_HOURS: float = float(os.getenv("DEVICE_EVENT_RETENTION_HOURS", "168"))
+
     class Config:
         env_file = ".env"
 
 
 @lru_cache()
 def get_settings():
-    return Settings()
\ No newline at end of file
+    return Settings()
@@ -0,0 +1,41 @@
+# app/core/device_event_dispatcher.py
+import time
+from datetime import datetime
+from ..core.database import SessionLocal
+from ..core.config import get_settings
+from ..services.device_event_service import DeviceEventService
+
+settings = get_settings()
+
+# Delivered events are pruned at most this often (seconds)
+PRUNE_INTERVAL_SECONDS = 3600
+_last_prune = None
+
+
+async def dispatch_device_events():
+    """Deliver the device event outbox until nothing is due, then prune delivered events"""
+    global _last_prune
+    if not DeviceEventService.get_destinations():
+        return
+
+    db = SessionLocal()
+    try:
+        while True:
+            result = await DeviceEventService.dispatch_pending(db)
+            if result["sent"] or result["failed"]:
+                print(f"[{datetime.utcnow()}] Device event dispatch: {result}")
+            # Stop on a short batch or when every destination is backing off
+            if result["due"] < settings.DEVICE_EVENT_BATCH_SIZE or \
+                    not (result["sent"] or result["coalesced"] or result["failed"]):
+                break
+
+        if _last_prune is None or time.monotonic() - _last_prune >= PRUNE_INTERVAL_SECONDS:
+            _last_prune = time.monotonic()
+            pruned = DeviceEventService.prune(db)
+            if pruned:
+                print(f"[{datetime.utcnow()}] Pruned {pruned} delivered device events")
+    except Exception as e:
+        db.rollback()
+        print(f"Error in device event dispatch: {str(e)}")
+    finally:
+        db.close()
@@ -0,0 +1,100 @@
+# app/core/http_clients.py
+from typing import Dict, Any, Optional
+
+import httpx
+
+from .config import get_settings
+
+settings = get_settings()
+
+# Per-service counters; connections are counted from the transport's trace events
+_NEW_COUNTERS = {"requests": 0, "errors": 0, "connections_opened": 0, "active": 0}
+
+
+class ServiceClients:
+    """
+    Long-lived pooled HTTP clients, one per upstream service.
+
+    Creating an httpx client per call pays a TCP (and TLS) handshake every
+    time and throws the connection away afterwards; the clients here keep
+    connections alive between calls. Base URLs come from the settings,
+    which resolve them once at startup. Connection failures are retried
+    by the transport; nothing that reached the server is resent.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ServiceClients, cls).__new__(cls)
+            cls._instance._clients = {}
+            cls._instance._counters = {}
+            cls._instance._base_urls = {
+                "availability": settings.AVAILABILITY_SERVICE_URL.rstrip("/"),
+                # Webhook receivers are full URLs
+                "webhooks": "",
+            }
+        return cls._instance
+
+    def base_url(self, name: str) -> str:
+        return self._base_urls[name]
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """The shared client of a service, created on first use"""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            counters = self._counters.setdefault(name, dict(_NEW_COUNTERS))
+
+            async def trace(event: str, info: Dict[str, Any]):
+                # Connection pool events reported by the transport for each request
+                if event == "connection.connect_tcp.complete":
+                    counters["connections_opened"] += 1
+                elif event.endswith(".send_request_headers.started"):
+                    counters["active"] += 1
+                elif event.endswith(".response_closed.started"):
+                    counters["active"] -= 1
+
+            async def on_request(request):
+                counters["requests"] += 1
+                request.extensions["trace"] = trace
+
+            async def on_response(response):
+                if response.status_code >= 500:
+                    counters["errors"] += 1
+
+            client = self._clients[name] = httpx.AsyncClient(
+                base_url=self.base_url(name),
+                timeout=settings.HTTP_CLIENT_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE,
+                    keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_SECONDS
+                ),
+                transport=httpx.AsyncHTTPTransport(retries=settings.HTTP_CLIENT_RETRIES),
+                event_hooks={"request": [on_request], "response": [on_response]}
+            )
+        return client
+
+    def stats(self) -> Dict[str, Any]:
+        """Requests, connections opened and connections in use per service"""
+        stats = {}
+        for name, base_url in self._base_urls.items():
+            counters = self._counters.get(name, _NEW_COUNTERS)
+            client = self._clients.get(name)
+            entry = {
+                "base_url": base_url or None,
+                "open": client is not None and not client.is_closed,
+                "requests": counters["requests"],
+                "server_errors": counters["errors"],
+                # New connections against requests shows how well keep-alive works
+                "connections_opened": counters["connections_opened"],
+                "active_connections": counters["active"],
+            }
+            stats[name] = entry
+        return stats
+
+    async def close(self, name: Optional[str] = None):
+        """Close one or all clients; they are recreated on the next get()"""
+        for client_name in [name] if name else list(self._clients):
+            client = self._clients.pop(client_name, None)
+            if client is not None:
+                await client.aclose()
@@ -0,0 +1,40 @@
+# app/core/notification_dispatcher.py
+import time
+from datetime import datetime
+from ..core.database import SessionLocal
+from ..core.config import get_settings
+from ..services.notification_service import NotificationService
+
+settings = get_settings()
+
+# Delivered rows are pruned at most this often (seconds)
+PRUNE_INTERVAL_SECONDS = 3600
+_last_prune = None
+
+
+async def dispatch_notifications():
+    """Drain the notification outbox until no due rows are left, then prune delivered rows"""
+    global _last_prune
+    if not NotificationService.get_destinations():
+        return
+
+    db = SessionLocal()
+    try:
+        while True:
+            result = await NotificationService.dispatch_pending(db)
+            if result["due"]:
+                print(f"[{datetime.utcnow()}] Notification dispatch: {result}")
+            # A short batch means the outbox is drained for now
+            if result["due"] < settings.NOTIFY_BATCH_SIZE:
+                break
+
+        if _last_prune is None or time.monotonic() - _last_prune >= PRUNE_INTERVAL_SECONDS:
+            _last_prune = time.monotonic()
+            pruned = NotificationService.prune(db)
+            if pruned:
+                print(f"[{datetime.utcnow()}] Pruned {pruned} delivered notifications")
+    except Exception as e:
+        db.rollback()
+        print(f"Error in notification dispatch: {str(e)}")
+    finally:
+        db.close()
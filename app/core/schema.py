@@ -0,0 +1,83 @@
+# app/core/schema.py
+"""
+Changes to tables that already existed in earlier releases.
+
+create_all only creates missing tables; existing ones are brought up to
+date here at startup.
+"""
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateTable
+
+from .database import engine as default_engine
+from ..models.device import Device, DeviceTombstone
+
+
+def _rebuild_devices_with_autoincrement(engine: Engine) -> bool:
+    """
+    SQLite reuses the highest rowid once it is deleted, which would give a
+    new device the id of a deleted one that clients know as deleted. A
+    table only gets AUTOINCREMENT when it is created, so devices tables of
+    earlier releases are rebuilt with it (the documented create, copy,
+    drop, rename procedure) and the id sequence starts above every id
+    ever used.
+    """
+    table = Device.__table__
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        ddl = conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table.name}).scalar()
+        if ddl is None or "AUTOINCREMENT" in ddl.upper():
+            return False
+
+        columns = ", ".join(conn.dialect.identifier_preparer.quote(column.name) for column in table.columns)
+        create = str(CreateTable(table).compile(dialect=conn.dialect)).strip()
+        conn.exec_driver_sql("BEGIN")
+        try:
+            conn.exec_driver_sql(create.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {table.name}_new ", 1))
+            conn.exec_driver_sql(f"INSERT INTO {table.name}_new ({columns}) SELECT {columns} FROM {table.name}")
+            conn.exec_driver_sql(f"DROP TABLE {table.name}")
+            conn.exec_driver_sql(f"ALTER TABLE {table.name}_new RENAME TO {table.name}")
+            for index in table.indexes:
+                index.create(conn)
+
+            last_id = max(
+                conn.execute(select(func.max(Device.id))).scalar() or 0,
+                conn.execute(select(func.max(DeviceTombstone.device_id))).scalar() or 0
+            )
+            conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table.name})
+            conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                         {"name": table.name, "seq": last_id})
+            conn.exec_driver_sql("COMMIT")
+        except Exception:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+
+    print(f"Rebuilt the {table.name} table so ids of deleted devices are not reused")
+    return True
+
+
+def _create_missing_device_indexes(engine: Engine) -> list:
+    """
+    Indexes added to the devices table since earlier releases, such as the
+    one on updated_at that the change feed filters on. create_all only
+    indexes the tables it creates. Returns the names of the indexes created.
+    """
+    table = Device.__table__
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        existing = {index["name"] for index in inspect(conn).get_indexes(table.name)}
+        created = []
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+                created.append(index.name)
+    if created:
+        print(f"Created indexes on the {table.name} table: {', '.join(created)}")
+    return created
+
+
+def upgrade_schema(engine: Engine = None) -> None:
+    """Bring tables created by earlier releases up to date"""
+    engine = engine or default_engine
+    if engine.dialect.name == "sqlite":
+        _rebuild_devices_with_autoincrement(engine)
+    _create_missing_device_indexes(engine)
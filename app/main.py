@@ -3,6 +3,7 @@ from fastapi import FastAPI, Depends
 from contextlib import asynccontextmanager
 from .core.config import get_settings
 from .core.database import Base, engine
+from .core.schema import upgrade_schema
 from .api.router import api_router
 from .core.init_settings import initialize_default_settings
 from .plugins.loader import PluginLoader
@@ -12,10 +13,14 @@ from fastapi_mcp import FastApiMCP
 from fastapi.middleware.cors import CORSMiddleware
 from .core.simple_scheduler import SimpleScheduler
 from .core.sensor_monitor import check_sensors
+from .core.notification_dispatcher import dispatch_notifications
+from .core.device_event_dispatcher import dispatch_device_events
+from .core.http_clients import ServiceClients
 import asyncio
 
-# Create database tables
+# Create database tables, and bring tables of earlier releases up to date
 Base.metadata.create_all(bind=engine)
+upgrade_schema()
 
 # Instantiate settings
 settings = get_settings()
@@ -45,6 +50,20 @@ async def lifespan(app: FastAPI):
             interval_minutes=0.5
         )
 
+        # Drain the alert notification outbox independently of sensor checks
+        scheduler.schedule_task(
+            "notification_dispatch",
+            dispatch_notifications,
+            interval_minutes=settings.NOTIFY_POLL_INTERVAL_SECONDS / 60
+        )
+
+        # Push device changes to subscribers such as the availability service
+        scheduler.schedule_task(
+            "device_event_dispatch",
+            dispatch_device_events,
+            interval_minutes=settings.DEVICE_EVENT_POLL_INTERVAL_SECONDS / 60
+        )
+
     finally:
         db.close()
 
@@ -54,6 +73,9 @@ async def lifespan(app: FastAPI):
     scheduler = SimpleScheduler()
     scheduler.stop()
 
+    # Close the pooled connections to other services
+    await ServiceClients().close()
+
 
 # Create FastAPI app
 app = FastAPI(
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, DateTime, Boolean, Text, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum, DateTime, Boolean, Text, JSON, event
+from sqlalchemy.orm import Session, relationship
 from datetime import datetime
 import enum
 from ..core.database import Base
@@ -18,6 +18,8 @@ class OSType(str, enum.Enum):
 
 class Device(Base):
     __tablename__ = "devices"
+    # Ids of deleted devices are never handed out again, their tombstones stay valid
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
@@ -25,7 +27,7 @@ class Device(Base):
     type = Column(Enum(DeviceType), nullable=False)
     ip_address = Column(String(50), nullable=False, unique=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     is_active = Column(Boolean, default=True)
 
     standard_device = relationship("StandardDevice", back_populates="device", uselist=False,
@@ -54,4 +56,38 @@ class CustomDevice(Base):
     connection_params = Column(JSON, default={})
 
     device = relationship("Device", back_populates="custom_device")
-    plugin = relationship("Plugin", back_populates="custom_devices")
\ No newline at end of file
+    plugin = relationship("Plugin", back_populates="custom_devices")
+
+    @property
+    def plugin_name(self):
+        """Name of the device's plugin; load the plugin eagerly when listing devices"""
+        return self.plugin.name if self.plugin else None
+
+
+@event.listens_for(Session, "before_flush")
+def _touch_parent_devices(session, flush_context, instances):
+    """
+    Edits of a device's standard or custom details are changes of the device:
+    bump its updated_at, which the change feed and ETags go by.
+    """
+    now = datetime.utcnow()
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if not isinstance(obj, (StandardDevice, CustomDevice)):
+                continue
+            if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+                continue
+            device = obj.device
+            if device is not None and device not in session.deleted:
+                device.updated_at = now
+
+
+class DeviceTombstone(Base):
+    """
+    Record of a deleted device, so clients syncing changes with
+    updated_since learn about deletions too.
+    """
+    __tablename__ = "device_tombstones"
+
+    device_id = Column(Integer, primary_key=True)
+    deleted_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, Enum, DateTime, Text, JSON
+from datetime import datetime
+import enum
+from ..core.database import Base
+
+
+class DeviceEventStatus(str, enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    COALESCED = "coalesced"
+
+
+class DeviceEventOutbox(Base):
+    """
+    Transactional outbox for device change events.
+
+    Rows are written in the same commit as the device change, one per
+    subscriber, and delivered in order by the device event dispatcher.
+    """
+    __tablename__ = "device_event_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    destination = Column(String(512), nullable=False, index=True)  # Webhook URL
+    event_type = Column(String(50), nullable=False)  # device_created, device_updated, device_deleted
+    device_id = Column(Integer, nullable=False, index=True)
+    payload = Column(JSON, default={})
+    status = Column(Enum(DeviceEventStatus), default=DeviceEventStatus.PENDING, index=True)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
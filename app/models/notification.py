@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, String, Enum, DateTime, Text, JSON
+from datetime import datetime
+import enum
+from ..core.database import Base
+
+
+class NotificationStatus(str, enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    COALESCED = "coalesced"
+
+
+class NotificationOutbox(Base):
+    """
+    Transactional outbox for alert notifications.
+
+    Rows are written in the same commit as the alert change, one per
+    destination, and drained asynchronously by the notification dispatcher.
+    """
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    destination = Column(String(512), nullable=False, index=True)  # e.g. "webhook:http://..." or "smtp:ops@example.com"
+    dedup_key = Column(String(255), nullable=False, index=True)  # e.g. "sensor:12"
+    event_type = Column(String(50), nullable=False)  # alert_created, alert_escalated, alert_resolved
+    alert_id = Column(Integer, nullable=True)
+    sensor_id = Column(Integer, nullable=True)
+    payload = Column(JSON, default={})
+    status = Column(Enum(NotificationStatus), default=NotificationStatus.PENDING, index=True)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
@@ -72,4 +72,10 @@ class DeviceResponse(DeviceBase):
     custom_device: Optional[CustomDeviceResponse] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class DeviceChanges(BaseModel):
+    """Devices created or updated and devices deleted since updated_since"""
+    devices: List[DeviceResponse]
+    deleted: List[int]
+    cursor: datetime  # Pass as updated_since on the next call
@@ -0,0 +1,198 @@
+# app/services/device_event_service.py
+import random
+import datetime
+from typing import List, Dict, Any, Optional
+
+from sqlalchemy.orm import Session
+
+from ..core.config import get_settings
+from ..core.http_clients import ServiceClients
+from ..models.device import Device
+from ..models.device_event import DeviceEventOutbox, DeviceEventStatus
+
+settings = get_settings()
+
+# Header carrying DEVICE_EVENT_SECRET to receivers
+DEVICE_EVENT_SECRET_HEADER = "X-Device-Event-Secret"
+
+
+class DeviceEventService:
+    @staticmethod
+    def get_destinations() -> List[str]:
+        """Get all configured device event webhook URLs"""
+        return [url.strip() for url in settings.DEVICE_EVENT_WEBHOOK_URLS.split(",") if url.strip()]
+
+    @staticmethod
+    def enqueue_device_event(db: Session, device: Device, event_type: str) -> int:
+        """
+        Add outbox rows for a device change to the current transaction.
+
+        The caller commits, so the event is persisted if and only if the
+        device change is. Every event carries the full device state, so
+        applying it twice or skipping older ones is harmless. Returns the
+        number of rows added.
+        """
+        destinations = DeviceEventService.get_destinations()
+        if not destinations:
+            return 0
+
+        if device.id is None:
+            db.flush()  # Get the device ID
+
+        payload = {
+            "event_type": event_type,
+            "occurred_at": datetime.datetime.utcnow().isoformat(),
+            "device_id": device.id,
+            "device": None if event_type == "device_deleted" else {
+                "id": device.id,
+                "name": device.name,
+                "ip_address": str(device.ip_address),
+                "type": device.type.value if device.type else None,
+                "is_active": device.is_active if device.is_active is not None else True,
+            },
+        }
+
+        for destination in destinations:
+            db.add(DeviceEventOutbox(
+                destination=destination,
+                event_type=event_type,
+                device_id=device.id,
+                payload=payload,
+                status=DeviceEventStatus.PENDING
+            ))
+
+        return len(destinations)
+
+    @staticmethod
+    def _schedule_retry(row: DeviceEventOutbox, error: str, permanent: bool = False) -> bool:
+        """Record a failed delivery and back off exponentially; True once given up"""
+        row.attempts = (row.attempts or 0) + 1
+        row.last_error = error[:1000]
+
+        if permanent or row.attempts >= settings.DEVICE_EVENT_MAX_ATTEMPTS:
+            row.status = DeviceEventStatus.FAILED
+            return True
+
+        delay = min(
+            settings.DEVICE_EVENT_RETRY_MAX_SECONDS,
+            settings.DEVICE_EVENT_RETRY_BASE_SECONDS * (2 ** (row.attempts - 1))
+        ) * random.uniform(0.8, 1.2)
+        row.next_attempt_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+        return False
+
+    @staticmethod
+    async def dispatch_pending(db: Session, limit: Optional[int] = None) -> Dict[str, int]:
+        """
+        Deliver the oldest batch of pending events to every destination.
+
+        Each destination gets its events in order: a failed batch holds back
+        everything after it until its retry, so an older state never
+        overwrites a newer one. Within a batch only the newest event per
+        device is sent; the others are marked coalesced.
+
+        After a failed batch the event at its head is sent alone until it
+        gets through, so one bad event is dead-lettered (FAILED) by itself
+        instead of holding back the queue and taking the batch with it.
+        Events the receiver rejects, and events it refuses with a client
+        error, are dead-lettered without retries.
+        """
+        now = datetime.datetime.utcnow()
+        results = {"due": 0, "sent": 0, "coalesced": 0, "retrying": 0, "failed": 0}
+
+        client = ServiceClients().get("webhooks")
+        for destination in DeviceEventService.get_destinations():
+            rows = db.query(DeviceEventOutbox).filter(
+                DeviceEventOutbox.destination == destination,
+                DeviceEventOutbox.status == DeviceEventStatus.PENDING
+            ).order_by(DeviceEventOutbox.id).limit(limit or settings.DEVICE_EVENT_BATCH_SIZE).all()
+
+            # The head of the queue backing off holds back the rest
+            if not rows or rows[0].next_attempt_at > now:
+                continue
+            results["due"] += len(rows)
+            if rows[0].attempts:
+                rows = rows[:1]
+
+            newest: Dict[int, DeviceEventOutbox] = {}
+            for row in rows:
+                newest[row.device_id] = row
+            batch = sorted(newest.values(), key=lambda r: r.id)
+
+            status_code = None
+            try:
+                response = await client.post(destination, json={"events": [row.payload for row in batch]},
+                                             headers={DEVICE_EVENT_SECRET_HEADER: settings.DEVICE_EVENT_SECRET},
+                                             timeout=settings.DEVICE_EVENT_TIMEOUT_SECONDS)
+                status_code = response.status_code
+                if status_code >= 300:
+                    raise RuntimeError(f"Webhook returned HTTP {status_code}")
+            except Exception as e:
+                error = f"{type(e).__name__}: {str(e)}"
+                # The receiver refused the content; sending it again gets the same answer
+                permanent = status_code is not None and 400 <= status_code < 500 and status_code not in (408, 429)
+                head = rows[0]
+                if len(rows) > 1:
+                    # Only the head records the failure and goes alone next, right away if it was refused
+                    if permanent:
+                        head.attempts = (head.attempts or 0) + 1
+                        head.last_error = error[:1000]
+                    else:
+                        DeviceEventService._schedule_retry(head, error)
+                    results["retrying"] += len(rows)
+                elif DeviceEventService._schedule_retry(head, error, permanent):
+                    print(f"Giving up on device event {head.id} to {destination}: {error}")
+                    results["failed"] += 1
+                else:
+                    results["retrying"] += 1
+                continue
+
+            rejected = DeviceEventService._rejected(response)
+            sent_at = datetime.datetime.utcnow()
+            for row in rows:
+                row.attempts = (row.attempts or 0) + 1
+                if newest[row.device_id] is not row:
+                    row.status = DeviceEventStatus.COALESCED
+                    results["coalesced"] += 1
+                elif row.device_id in rejected:
+                    row.status = DeviceEventStatus.FAILED
+                    row.last_error = f"Rejected by the receiver: {rejected[row.device_id]}"[:1000]
+                    print(f"Device event {row.id} rejected by {destination}: {rejected[row.device_id]}")
+                    results["failed"] += 1
+                else:
+                    row.status = DeviceEventStatus.SENT
+                    row.sent_at = sent_at
+                    results["sent"] += 1
+
+        db.commit()
+        return results
+
+    @staticmethod
+    def prune(db: Session, batch_size: int = 5000) -> int:
+        """
+        Delete sent and coalesced events older than DEVICE_EVENT_RETENTION_HOURS,
+        in bounded batches; failed (dead-lettered) events are kept for inspection.
+        Returns the number of rows deleted.
+        """
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=settings.DEVICE_EVENT_RETENTION_HOURS)
+        deleted = 0
+        while True:
+            ids = [row_id for row_id, in db.query(DeviceEventOutbox.id).filter(
+                DeviceEventOutbox.status.in_([DeviceEventStatus.SENT, DeviceEventStatus.COALESCED]),
+                DeviceEventOutbox.created_at < cutoff
+            ).limit(batch_size).all()]
+            if not ids:
+                break
+            db.query(DeviceEventOutbox).filter(DeviceEventOutbox.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            deleted += len(ids)
+        return deleted
+
+    @staticmethod
+    def _rejected(response) -> Dict[int, str]:
+        """device_id -> reason for the events a receiver accepted the batch without"""
+        try:
+            body = response.json()
+        except ValueError:
+            return {}
+        rejected = body.get("rejected") if isinstance(body, dict) else None
+        return {r.get("device_id"): r.get("error") or "rejected" for r in rejected or [] if isinstance(r, dict)}
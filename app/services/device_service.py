@@ -1,21 +1,141 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any, Union
-from ..models.device import Device, StandardDevice, CustomDevice, DeviceType
+import hashlib
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional, Dict, Any, Union, Iterator
+from ..core.config import get_settings
+from ..core.database import SessionLocal
+from ..models.device import Device, StandardDevice, CustomDevice, DeviceType, DeviceTombstone
 from ..schemas.device import DeviceCreate, DeviceUpdate, StandardDeviceUpdate, CustomDeviceUpdate
 from ..core.exceptions import DeviceNotFoundException, PluginNotFoundException
 from ..models.plugin import Plugin
+from .device_event_service import DeviceEventService
+
+settings = get_settings()
+
+
+def _device_details():
+    """
+    Loader options for everything DeviceResponse reads. The details are
+    one-to-one, so they come in the device query itself as outer joins
+    instead of lazy loads per device; only the plugin's name is read.
+    Built per query, as mappers are only ready once all models are imported.
+    """
+    return (
+        joinedload(Device.standard_device),
+        joinedload(Device.custom_device).joinedload(CustomDevice.plugin).load_only(Plugin.id, Plugin.name),
+    )
 
 
 class DeviceService:
     @staticmethod
     async def get_devices(db: Session, skip: int = 0, limit: int = 100) -> List[Device]:
         """Get all devices with pagination"""
-        return db.query(Device).offset(skip).limit(limit).all()
+        return db.query(Device).options(*_device_details()).offset(skip).limit(limit).all()
+
+    @staticmethod
+    async def get_device_changes(db: Session, updated_since: datetime) -> Dict[str, Any]:
+        """
+        Devices created or updated and devices deleted at or after updated_since.
+        The returned cursor is the newest change seen. Changes are stamped when
+        they are made but only visible once committed, so a slow transaction can
+        commit a change older than the cursor; every call therefore also returns
+        the changes of the DEVICE_CHANGES_OVERLAP_SECONDS before updated_since.
+        Clients apply changes idempotently and get those again.
+        """
+        since = updated_since - timedelta(seconds=settings.DEVICE_CHANGES_OVERLAP_SECONDS)
+        devices = db.query(Device).options(*_device_details()).filter(
+            Device.updated_at >= since
+        ).order_by(Device.updated_at).all()
+        tombstones = db.query(DeviceTombstone).filter(
+            DeviceTombstone.deleted_at >= since
+        ).order_by(DeviceTombstone.deleted_at).all()
+
+        cursor = updated_since
+        if devices:
+            cursor = max(cursor, devices[-1].updated_at)
+        if tombstones:
+            cursor = max(cursor, tombstones[-1].deleted_at)
+        return {
+            "devices": devices,
+            "deleted": [tombstone.device_id for tombstone in tombstones],
+            "cursor": cursor,
+        }
+
+    @staticmethod
+    def export_devices(after_id: int = 0, chunk_size: int = 1000) -> Iterator[bytes]:
+        """
+        Every device as one NDJSON line, read chunk_size devices at a time by ID.
+
+        Each chunk is a short query on its own session, so memory stays at one
+        chunk and no transaction is held while the client reads. The last line is
+        {"end": true, "count": ..., "cursor": ...}; a stream without it was cut
+        short. The cursor is taken before the first chunk, so passing it as
+        updated_since afterwards picks up every change made during the export.
+        """
+        db = SessionLocal()
+        try:
+            last_update = db.query(func.max(Device.updated_at)).scalar()
+            last_delete = db.query(func.max(DeviceTombstone.deleted_at)).scalar()
+        finally:
+            db.close()
+        cursor = max([t for t in (last_update, last_delete) if t is not None], default=datetime(1970, 1, 1))
+
+        count = 0
+        while True:
+            db = SessionLocal()
+            try:
+                rows = db.query(
+                    Device.id, Device.name, Device.description, Device.type, Device.ip_address,
+                    Device.is_active, Device.created_at, Device.updated_at
+                ).filter(Device.id > after_id).order_by(Device.id).limit(chunk_size).all()
+            finally:
+                db.close()
+            if not rows:
+                break
+
+            lines = [json.dumps({
+                "id": row.id,
+                "name": row.name,
+                "description": row.description,
+                "type": row.type.value if row.type else None,
+                "ip_address": row.ip_address,
+                "is_active": row.is_active if row.is_active is not None else True,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+            }) for row in rows]
+            yield ("\n".join(lines) + "\n").encode()
+
+            count += len(rows)
+            after_id = rows[-1].id
+            if len(rows) < chunk_size:
+                break
+
+        yield (json.dumps({"end": True, "count": count, "cursor": cursor.isoformat()}) + "\n").encode()
+
+    @staticmethod
+    async def get_version(db: Session) -> str:
+        """
+        Short hash that changes whenever a device is created, updated or deleted.
+        The number of devices stamped within DEVICE_CHANGES_OVERLAP_SECONDS
+        covers an update that commits after a newer one, which leaves the
+        count and the newest stamp as they were.
+        """
+        recent_since = datetime.utcnow() - timedelta(seconds=settings.DEVICE_CHANGES_OVERLAP_SECONDS)
+        count, last_update, recent = db.query(
+            func.count(Device.id), func.max(Device.updated_at),
+            func.count(case((Device.updated_at >= recent_since, 1)))
+        ).one()
+        deletes, last_delete = db.query(
+            func.count(DeviceTombstone.device_id), func.max(DeviceTombstone.deleted_at)
+        ).one()
+        return hashlib.md5(f"{count}:{last_update}:{recent}:{deletes}:{last_delete}".encode()).hexdigest()[:16]
 
     @staticmethod
     async def get_device(db: Session, device_id: int) -> Device:
         """Get a device by ID"""
-        device = db.query(Device).filter(Device.id == device_id).first()
+        device = db.query(Device).options(*_device_details()).filter(Device.id == device_id).first()
         if not device:
             raise DeviceNotFoundException(f"Device with ID {device_id} not found")
         return device
@@ -70,14 +190,9 @@ class DeviceService:
             )
             db.add(custom_device)
 
+        DeviceEventService.enqueue_device_event(db, device, "device_created")
         db.commit()
         db.refresh(device)
-
-        if device.type == DeviceType.CUSTOM and device.custom_device:
-            plugin = db.query(Plugin).filter(Plugin.id == device.custom_device.plugin_id).first()
-            if plugin:
-                setattr(device.custom_device, "plugin_name", plugin.name)
-
         return device
 
     @staticmethod
@@ -120,6 +235,7 @@ class DeviceService:
             for key, value in custom_data.dict(exclude_unset=True).items():
                 setattr(device.custom_device, key, value)
 
+        DeviceEventService.enqueue_device_event(db, device, "device_updated")
         db.commit()
         db.refresh(device)
         return device
@@ -129,5 +245,7 @@ class DeviceService:
         """Delete a device"""
         device = await DeviceService.get_device(db, device_id)
         db.delete(device)
+        db.merge(DeviceTombstone(device_id=device_id, deleted_at=datetime.utcnow()))
+        DeviceEventService.enqueue_device_event(db, device, "device_deleted")
         db.commit()
         return True
\ No newline at end of file
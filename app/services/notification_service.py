@@ -0,0 +1,300 @@
+# app/services/notification_service.py
+import asyncio
+import random
+import smtplib
+import datetime
+from email.message import EmailMessage
+from typing import List, Dict, Any, Optional, Tuple
+
+import httpx
+from sqlalchemy.orm import Session
+
+from ..core.config import get_settings
+from ..core.http_clients import ServiceClients
+from ..models.notification import NotificationOutbox, NotificationStatus
+from ..models.sensor import Sensor, Alert
+
+settings = get_settings()
+
+
+class NotificationService:
+    # One semaphore per destination so a slow receiver only throttles itself
+    _destination_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @staticmethod
+    def get_destinations() -> List[str]:
+        """Get all configured notification destinations"""
+        destinations = []
+
+        for url in settings.NOTIFY_WEBHOOK_URLS.split(","):
+            if url.strip():
+                destinations.append(f"webhook:{url.strip()}")
+
+        if settings.SMTP_HOST:
+            for recipient in settings.SMTP_TO.split(","):
+                if recipient.strip():
+                    destinations.append(f"smtp:{recipient.strip()}")
+
+        return destinations
+
+    @staticmethod
+    def enqueue_alert_event(db: Session, alert: Alert, sensor: Sensor, event_type: str) -> int:
+        """
+        Add outbox rows for an alert change to the current transaction.
+
+        The caller commits, so the notification is persisted if and only if
+        the alert change is. Returns the number of rows added.
+        """
+        destinations = NotificationService.get_destinations()
+        if not destinations:
+            return 0
+
+        if alert.id is None:
+            db.flush()  # Get the alert ID
+
+        now = datetime.datetime.utcnow()
+        device = sensor.device
+        payload = {
+            "event_type": event_type,
+            "occurred_at": now.isoformat(),
+            "alert_id": alert.id,
+            "alert_status": alert.status.value if alert.status else None,
+            "alert_level": sensor.alert_level.value if sensor.alert_level else None,
+            "value": alert.value,
+            "message": alert.message,
+            "sensor_id": sensor.id,
+            "sensor_name": sensor.name,
+            "metric_key": sensor.metric_key,
+            "alert_condition": sensor.alert_condition,
+            "device_id": sensor.device_id,
+            "device_name": device.name if device else None,
+        }
+
+        # Hold new rows for the coalescing window so flapping alerts collapse into one message
+        due_at = now + datetime.timedelta(seconds=settings.NOTIFY_COALESCE_WINDOW_SECONDS)
+
+        for destination in destinations:
+            db.add(NotificationOutbox(
+                destination=destination,
+                dedup_key=f"sensor:{sensor.id}",
+                event_type=event_type,
+                alert_id=alert.id,
+                sensor_id=sensor.id,
+                payload=payload,
+                status=NotificationStatus.PENDING,
+                next_attempt_at=due_at
+            ))
+
+        return len(destinations)
+
+    @staticmethod
+    def _coalesce(rows: List[NotificationOutbox]) -> List[Tuple[NotificationOutbox, List[NotificationOutbox]]]:
+        """
+        Group pending rows by destination and alert source.
+
+        Returns (representative, superseded) pairs where the representative is the
+        newest row of the group and carries the transitions of the older rows.
+        """
+        groups: Dict[Tuple[str, str], List[NotificationOutbox]] = {}
+        for row in sorted(rows, key=lambda r: r.id):
+            groups.setdefault((row.destination, row.dedup_key), []).append(row)
+
+        result = []
+        for group in groups.values():
+            representative = group[-1]
+            superseded = group[:-1]
+
+            if superseded:
+                transitions = []
+                for row in group:
+                    transitions.extend((row.payload or {}).get("transitions", [row.event_type]))
+
+                payload = dict(representative.payload or {})
+                payload["transitions"] = transitions
+                payload["coalesced_count"] = len(transitions)
+                payload["flapping"] = "alert_created" in transitions and "alert_resolved" in transitions
+                representative.payload = payload
+                representative.attempts = max(row.attempts or 0 for row in group)
+
+            result.append((representative, superseded))
+
+        return result
+
+    @staticmethod
+    def _schedule_retry(row: NotificationOutbox, error: str) -> None:
+        """Record a failed delivery and back off exponentially"""
+        row.attempts = (row.attempts or 0) + 1
+        row.last_error = error[:1000]
+
+        if row.attempts >= settings.NOTIFY_MAX_ATTEMPTS:
+            row.status = NotificationStatus.FAILED
+            return
+
+        delay = min(
+            settings.NOTIFY_RETRY_MAX_SECONDS,
+            settings.NOTIFY_RETRY_BASE_SECONDS * (2 ** (row.attempts - 1))
+        )
+        delay *= random.uniform(0.8, 1.2)  # Jitter so retries for many rows do not align
+        row.next_attempt_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+
+    @staticmethod
+    async def _send_webhook(client: httpx.AsyncClient, url: str, payloads: List[Dict[str, Any]]) -> None:
+        """POST a batch of notifications to a webhook receiver"""
+        response = await client.post(url, json={"notifications": payloads}, timeout=settings.NOTIFY_TIMEOUT_SECONDS)
+        if response.status_code >= 300:
+            raise RuntimeError(f"Webhook returned HTTP {response.status_code}")
+
+    @staticmethod
+    def _send_email(recipient: str, payloads: List[Dict[str, Any]]) -> None:
+        """Send a batch of notifications as a single digest email (blocking)"""
+        message = EmailMessage()
+        message["Subject"] = f"[AInfra] {len(payloads)} alert notification(s)"
+        message["From"] = settings.SMTP_FROM
+        message["To"] = recipient
+
+        lines = []
+        for payload in payloads:
+            line = (
+                f"[{(payload.get('alert_level') or 'info').upper()}] {payload.get('event_type')}: "
+                f"{payload.get('message')} (device: {payload.get('device_name')})"
+            )
+            if payload.get("flapping"):
+                line += f" - flapping, {payload.get('coalesced_count')} transitions"
+            lines.append(line)
+        message.set_content("\n".join(lines))
+
+        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.NOTIFY_TIMEOUT_SECONDS) as smtp:
+            if settings.SMTP_USE_TLS:
+                smtp.starttls()
+            if settings.SMTP_USERNAME:
+                smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+            smtp.send_message(message)
+
+    @staticmethod
+    async def _deliver(
+            client: httpx.AsyncClient,
+            destination: str,
+            rows: List[NotificationOutbox]
+    ) -> Tuple[List[NotificationOutbox], List[Tuple[NotificationOutbox, str]]]:
+        """
+        Deliver rows to one destination in batches, respecting its concurrency limit.
+
+        Returns (delivered rows, [(failed row, error)]).
+        """
+        semaphore = NotificationService._destination_semaphores.setdefault(
+            destination, asyncio.Semaphore(settings.NOTIFY_DESTINATION_CONCURRENCY)
+        )
+        channel, target = destination.split(":", 1)
+
+        batch_size = max(1, settings.NOTIFY_MAX_PER_MESSAGE)
+        batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+
+        async def send_batch(batch):
+            payloads = [row.payload for row in batch]
+            async with semaphore:
+                try:
+                    if channel == "webhook":
+                        await asyncio.wait_for(
+                            NotificationService._send_webhook(client, target, payloads),
+                            timeout=settings.NOTIFY_TIMEOUT_SECONDS
+                        )
+                    elif channel == "smtp":
+                        await asyncio.wait_for(
+                            asyncio.to_thread(NotificationService._send_email, target, payloads),
+                            timeout=settings.NOTIFY_TIMEOUT_SECONDS
+                        )
+                    else:
+                        raise ValueError(f"Unknown notification channel: {channel}")
+                    return batch, None
+                except Exception as e:
+                    return batch, f"{type(e).__name__}: {str(e)}"
+
+        delivered = []
+        failed = []
+        for batch, error in await asyncio.gather(*(send_batch(batch) for batch in batches)):
+            if error is None:
+                delivered.extend(batch)
+            else:
+                failed.extend((row, error) for row in batch)
+
+        return delivered, failed
+
+    @staticmethod
+    async def dispatch_pending(db: Session, limit: Optional[int] = None) -> Dict[str, int]:
+        """
+        Drain one batch of due outbox rows.
+
+        Rows for the same destination and alert source are coalesced, then every
+        destination is delivered to concurrently so one slow receiver does not
+        delay the others.
+        """
+        now = datetime.datetime.utcnow()
+        due_rows = db.query(NotificationOutbox).filter(
+            NotificationOutbox.status == NotificationStatus.PENDING,
+            NotificationOutbox.next_attempt_at <= now
+        ).order_by(NotificationOutbox.id).limit(limit or settings.NOTIFY_BATCH_SIZE).all()
+
+        results = {"due": len(due_rows), "sent": 0, "coalesced": 0, "retrying": 0, "failed": 0}
+        if not due_rows:
+            return results
+
+        # Pull in every other pending row for the same sources, whether it is still
+        # waiting out its coalescing window or backing off, so they go out as one
+        due_ids = {row.id for row in due_rows}
+        related_rows = db.query(NotificationOutbox).filter(
+            NotificationOutbox.status == NotificationStatus.PENDING,
+            NotificationOutbox.dedup_key.in_({row.dedup_key for row in due_rows})
+        ).all()
+        rows = due_rows + [row for row in related_rows if row.id not in due_ids]
+
+        by_destination: Dict[str, List[NotificationOutbox]] = {}
+        for representative, superseded in NotificationService._coalesce(rows):
+            for row in superseded:
+                row.status = NotificationStatus.COALESCED
+                results["coalesced"] += 1
+            by_destination.setdefault(representative.destination, []).append(representative)
+
+        client = ServiceClients().get("webhooks")
+        outcomes = await asyncio.gather(*(
+            NotificationService._deliver(client, destination, destination_rows)
+            for destination, destination_rows in by_destination.items()
+        ))
+
+        sent_at = datetime.datetime.utcnow()
+        for delivered, failed in outcomes:
+            for row in delivered:
+                row.status = NotificationStatus.SENT
+                row.sent_at = sent_at
+                row.attempts = (row.attempts or 0) + 1
+                results["sent"] += 1
+            for row, error in failed:
+                NotificationService._schedule_retry(row, error)
+                if row.status == NotificationStatus.FAILED:
+                    print(f"Giving up on notification {row.id} to {row.destination}: {error}")
+                    results["failed"] += 1
+                else:
+                    results["retrying"] += 1
+
+        db.commit()
+        return results
+
+    @staticmethod
+    def prune(db: Session, batch_size: int = 5000) -> int:
+        """
+        Delete sent and coalesced rows older than NOTIFY_RETENTION_HOURS, in
+        bounded batches; failed rows are kept for inspection. Returns the number
+        of rows deleted.
+        """
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=settings.NOTIFY_RETENTION_HOURS)
+        deleted = 0
+        while True:
+            ids = [row_id for row_id, in db.query(NotificationOutbox.id).filter(
+                NotificationOutbox.status.in_([NotificationStatus.SENT, NotificationStatus.COALESCED]),
+                NotificationOutbox.created_at < cutoff
+            ).limit(batch_size).all()]
+            if not ids:
+                break
+            db.query(NotificationOutbox).filter(NotificationOutbox.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            deleted += len(ids)
+        return deleted
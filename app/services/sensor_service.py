@@ -8,6 +8,7 @@ from ..models.device import Device, DeviceType
 from ..schemas.sensor import SensorCreate, SensorUpdate, AlertCreate
 from ..core.exceptions import SensorNotFoundException, DeviceNotFoundException
 from ..services.standard_service import StandardDeviceService
+from ..services.notification_service import NotificationService
 import datetime
 
 
@@ -110,8 +111,10 @@ class SensorService:
             if existing_alert.is_resolved:
                 existing_alert.status = AlertStatus.RESOLVED
                 existing_alert.resolution_time = datetime.datetime.utcnow()
+                NotificationService.enqueue_alert_event(db, existing_alert, sensor, "alert_resolved")
             elif existing_alert.consecutive_checks > 3 and existing_alert.status == AlertStatus.NEW:
                 existing_alert.status = AlertStatus.ONGOING
+                NotificationService.enqueue_alert_event(db, existing_alert, sensor, "alert_escalated")
 
             alert = existing_alert
         else:
@@ -125,6 +128,8 @@ class SensorService:
                 resolution_time=datetime.datetime.utcnow() if alert_data.is_resolved else None
             )
             db.add(alert)
+            if not alert.is_resolved:
+                NotificationService.enqueue_alert_event(db, alert, sensor, "alert_created")
 
         db.commit()
         db.refresh(alert)
@@ -204,10 +209,14 @@ class SensorService:
         if not alert:
             raise HTTPException(status_code=404, detail=f"Alert with ID {alert_id} not found")
 
+        was_resolved = alert.status == AlertStatus.RESOLVED
         alert.is_resolved = True
         alert.status = AlertStatus.RESOLVED
         alert.resolution_time = datetime.datetime.utcnow()
 
+        if not was_resolved:
+            NotificationService.enqueue_alert_event(db, alert, alert.sensor, "alert_resolved")
+
         db.commit()
         db.refresh(alert)
         return alert
@@ -310,6 +319,7 @@ class SensorService:
 
                     if existing_alert.consecutive_checks > 3 and existing_alert.status == AlertStatus.NEW:
                         existing_alert.status = AlertStatus.ONGOING
+                        NotificationService.enqueue_alert_event(db, existing_alert, sensor, "alert_escalated")
 
                     db.commit()
                     db.refresh(existing_alert)
@@ -326,6 +336,7 @@ class SensorService:
                         last_checked_at=datetime.datetime.utcnow()
                     )
                     db.add(alert)
+                    NotificationService.enqueue_alert_event(db, alert, sensor, "alert_created")
                     db.commit()
                     db.refresh(alert)
                     return alert
@@ -347,6 +358,7 @@ class SensorService:
                             existing_alert.status = AlertStatus.RESOLVED
                             existing_alert.resolution_time = datetime.datetime.utcnow()
                             existing_alert.message += f" (Auto-resolved after {consecutive_success_needed} checks)"
+                            NotificationService.enqueue_alert_event(db, existing_alert, sensor, "alert_resolved")
                     else:
                         # First successful check after failures
                         existing_alert.consecutive_checks = -1
@@ -0,0 +1,3 @@
+# conftest.py
+# The microservices have their own `app` packages and test suites; run those from their directories
+collect_ignore_glob = ["ainfra_*"]
@@ -0,0 +1,44 @@
+# tests/conftest.py
+import os
+import tempfile
+
+# Point the app at a throwaway database before anything imports the settings
+_tmp_dir = tempfile.mkdtemp(prefix="ainfra-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/test.db"
+os.environ["NOTIFY_WEBHOOK_URLS"] = ""
+os.environ["SMTP_HOST"] = ""
+os.environ["DEVICE_EVENT_WEBHOOK_URLS"] = ""
+
+import pytest
+
+from app.core.config import get_settings
+from app.core.database import Base, engine, SessionLocal
+# Every model module, so all relationships resolve
+from app.models import device, device_event, notification, plugin, sensor, settings  # noqa: F401
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _tables():
+    Base.metadata.create_all(bind=engine)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+        # Every test starts from empty tables
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+
+
+@pytest.fixture
+def app_settings():
+    """The shared settings object; monkeypatch its attributes to change configuration"""
+    return get_settings()
@@ -0,0 +1,45 @@
+# tests/test_device_changes.py
+import asyncio
+import datetime
+
+from app.models.device import Device, DeviceType, StandardDevice
+
+LONG_AGO = datetime.datetime(2024, 1, 1)
+
+
+def add_device(db):
+    device = Device(name="server", type=DeviceType.STANDARD, ip_address="10.0.0.1", updated_at=LONG_AGO,
+                    standard_device=StandardDevice(os_type="linux", hostname="server"))
+    db.add(device)
+    db.commit()
+    # Created now, as a long-unchanged device
+    db.query(Device).update({Device.updated_at: LONG_AGO})
+    db.commit()
+    return device
+
+
+def test_detail_edit_is_a_device_change(db):
+    device = add_device(db)
+
+    device.standard_device.hostname = "server.lan"
+    db.commit()
+
+    assert device.updated_at > LONG_AGO
+
+
+def test_change_committed_after_a_newer_one_is_not_missed(db, app_settings, monkeypatch):
+    from app.services.device_service import DeviceService
+
+    monkeypatch.setattr(app_settings, "DEVICE_CHANGES_OVERLAP_SECONDS", 30)
+    device = add_device(db)
+    cursor = datetime.datetime.utcnow()
+    before = asyncio.run(DeviceService.get_version(db))
+
+    # Stamped before the cursor a client already holds, committed after it
+    db.query(Device).update({Device.updated_at: cursor - datetime.timedelta(seconds=10), Device.name: "late"})
+    db.commit()
+
+    changes = asyncio.run(DeviceService.get_device_changes(db, cursor))
+    assert [d.id for d in changes["devices"]] == [device.id]
+    assert changes["cursor"] == cursor
+    assert asyncio.run(DeviceService.get_version(db)) != before
@@ -0,0 +1,121 @@
+# tests/test_device_event_service.py
+import asyncio
+import datetime
+
+import httpx
+import pytest
+
+from app.core.http_clients import ServiceClients
+from app.models.device import Device, DeviceType
+from app.models.device_event import DeviceEventOutbox, DeviceEventStatus
+from app.services.device_event_service import DeviceEventService
+
+RECEIVER = "http://receiver.test/device-events"
+BAD_DEVICE = "bad"
+
+
+@pytest.fixture
+def receiver(monkeypatch, app_settings):
+    """Record the batches posted to the device event webhook; reply() decides the response"""
+    monkeypatch.setattr(app_settings, "DEVICE_EVENT_WEBHOOK_URLS", RECEIVER)
+    monkeypatch.setattr(app_settings, "DEVICE_EVENT_SECRET", "s3cret")
+
+    class Receiver:
+        def __init__(self):
+            self.batches = []
+            self.headers = []
+
+        @staticmethod
+        def reply(events):
+            return httpx.Response(200, json={"applied": len(events), "rejected": []})
+
+        async def post(self, url, json, headers, timeout):
+            self.batches.append([event["device_id"] for event in json["events"]])
+            self.headers.append(headers)
+            return self.reply(json["events"])
+
+    fake = Receiver()
+    monkeypatch.setattr(ServiceClients, "get", lambda self, name: fake)
+    return fake
+
+
+@pytest.fixture
+def devices(db):
+    """Three updated devices; the second one's event is the one receivers refuse"""
+    devices = [Device(name=name, type=DeviceType.STANDARD, ip_address=f"10.0.0.{i}")
+               for i, name in enumerate(["first", BAD_DEVICE, "third"], start=1)]
+    db.add_all(devices)
+    db.flush()
+    for device in devices:
+        DeviceEventService.enqueue_device_event(db, device, "device_updated")
+    db.commit()
+    return devices
+
+
+def statuses(db):
+    rows = db.query(DeviceEventOutbox).order_by(DeviceEventOutbox.id).all()
+    return [row.status for row in rows]
+
+
+def test_rejected_event_is_dead_lettered_alone(db, receiver, devices):
+    def reply(events):
+        rejected = [{"device_id": e["device_id"], "error": "device state lacks name"}
+                    for e in events if e["device"]["name"] == BAD_DEVICE]
+        return httpx.Response(200, json={"applied": len(events) - len(rejected), "rejected": rejected})
+
+    receiver.reply = reply
+
+    result = asyncio.run(DeviceEventService.dispatch_pending(db))
+
+    assert (result["sent"], result["failed"]) == (2, 1)
+    assert statuses(db) == [DeviceEventStatus.SENT, DeviceEventStatus.FAILED, DeviceEventStatus.SENT]
+    assert "lacks name" in db.query(DeviceEventOutbox).filter(
+        DeviceEventOutbox.device_id == devices[1].id).one().last_error
+    assert receiver.headers == [{"X-Device-Event-Secret": "s3cret"}]
+
+
+def test_refused_batch_is_narrowed_to_the_bad_event(db, receiver, devices):
+    # A receiver that refuses the whole batch over one event
+    def reply(events):
+        if any(e["device"]["name"] == BAD_DEVICE for e in events):
+            return httpx.Response(422, json={"detail": "invalid event"})
+        return httpx.Response(200, json={"applied": len(events)})
+
+    receiver.reply = reply
+
+    for _ in range(5):
+        asyncio.run(DeviceEventService.dispatch_pending(db))
+
+    first, bad, third = (device.id for device in devices)
+    # Whole batch, the head alone, the rest, the bad event alone, then the events after it
+    assert receiver.batches == [[first, bad, third], [first], [bad, third], [bad], [third]]
+    assert statuses(db) == [DeviceEventStatus.SENT, DeviceEventStatus.FAILED, DeviceEventStatus.SENT]
+
+
+def test_unreachable_receiver_backs_off_without_giving_up(db, receiver, devices):
+    receiver.reply = lambda events: httpx.Response(503)
+
+    asyncio.run(DeviceEventService.dispatch_pending(db))
+    result = asyncio.run(DeviceEventService.dispatch_pending(db))
+
+    # The head backs off and holds back the others, nothing is dropped
+    assert result["due"] == 0 and len(receiver.batches) == 1
+    assert statuses(db) == [DeviceEventStatus.PENDING] * 3
+    assert [row.attempts for row in db.query(DeviceEventOutbox).order_by(DeviceEventOutbox.id)] == [1, 0, 0]
+
+
+def test_prune_deletes_old_delivered_events_only(db, monkeypatch, app_settings):
+    monkeypatch.setattr(app_settings, "DEVICE_EVENT_RETENTION_HOURS", 24)
+    old = datetime.datetime.utcnow() - datetime.timedelta(hours=48)
+    for status in (DeviceEventStatus.SENT, DeviceEventStatus.COALESCED, DeviceEventStatus.FAILED,
+                   DeviceEventStatus.PENDING):
+        db.add(DeviceEventOutbox(destination=RECEIVER, event_type="device_updated", device_id=1,
+                                 payload={}, status=status, created_at=old))
+    db.add(DeviceEventOutbox(destination=RECEIVER, event_type="device_updated", device_id=1,
+                             payload={}, status=DeviceEventStatus.SENT))
+    db.commit()
+
+    assert DeviceEventService.prune(db) == 2
+
+    remaining = sorted(row.status.value for row in db.query(DeviceEventOutbox))
+    assert remaining == ["failed", "pending", "sent"]
@@ -0,0 +1,41 @@
+# tests/test_device_export.py
+import json
+import tracemalloc
+
+from sqlalchemy import insert
+
+from app.models.device import Device, DeviceType
+from app.services.device_service import DeviceService
+
+DEVICES = 50_000
+# One chunk of rows and lines; all 50,000 devices as lines take about 10 MB
+MAX_PEAK_BYTES = 4 * 1024 * 1024
+
+
+def test_export_streams_every_device_in_chunks(db):
+    db.execute(insert(Device), [
+        {"id": i, "name": f"device-{i}", "type": DeviceType.STANDARD,
+         "ip_address": f"10.{i >> 16}.{(i >> 8) & 255}.{i & 255}"}
+        for i in range(1, DEVICES + 1)
+    ])
+    db.commit()
+
+    count, last_id, end = 0, 0, None
+    tracemalloc.start()
+    try:
+        for chunk in DeviceService.export_devices(chunk_size=1000):
+            for line in chunk.decode().splitlines():
+                record = json.loads(line)
+                if record.get("end"):
+                    end = record
+                    continue
+                assert record["id"] > last_id
+                last_id = record["id"]
+                count += 1
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert count == DEVICES and last_id == DEVICES
+    assert end["count"] == DEVICES and end["cursor"]
+    assert peak < MAX_PEAK_BYTES, f"peak {peak / 1e6:.1f} MB"
@@ -0,0 +1,82 @@
+# tests/test_device_ids.py
+import asyncio
+import datetime
+
+from sqlalchemy import create_engine, inspect, text
+
+from app.core.schema import upgrade_schema
+from app.models.device import Device, DeviceTombstone, DeviceType
+from app.schemas.device import DeviceCreate
+from app.services.device_service import DeviceService
+
+# devices as releases before AUTOINCREMENT created it
+LEGACY_DEVICES_DDL = """CREATE TABLE devices (
+    id INTEGER NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    description TEXT,
+    type VARCHAR(8) NOT NULL,
+    ip_address VARCHAR(50) NOT NULL,
+    created_at DATETIME,
+    updated_at DATETIME,
+    is_active BOOLEAN,
+    PRIMARY KEY (id),
+    UNIQUE (ip_address)
+)"""
+
+
+def new_device(ip_address):
+    return DeviceCreate(name=ip_address, type=DeviceType.STANDARD, ip_address=ip_address,
+                        standard_device={"os_type": "linux", "hostname": ip_address})
+
+
+def test_deleted_device_id_is_not_reused(db):
+    first = asyncio.run(DeviceService.create_device(db, new_device("10.0.0.1")))
+    last = asyncio.run(DeviceService.create_device(db, new_device("10.0.0.2")))
+    asyncio.run(DeviceService.delete_device(db, last.id))
+
+    created = asyncio.run(DeviceService.create_device(db, new_device("10.0.0.3")))
+
+    assert created.id > last.id > first.id
+    assert db.query(DeviceTombstone.device_id).all() == [(last.id,)]
+    changes = asyncio.run(DeviceService.get_device_changes(db, datetime.datetime.utcnow() - datetime.timedelta(minutes=1)))
+    assert changes["deleted"] == [last.id]
+
+
+def test_legacy_devices_table_is_rebuilt(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    with engine.begin() as conn:
+        conn.execute(text(LEGACY_DEVICES_DDL))
+        DeviceTombstone.__table__.create(conn)
+        for device_id in (1, 2, 3):
+            conn.execute(text(
+                "INSERT INTO devices (id, name, type, ip_address, is_active) VALUES (:id, 'd', 'STANDARD', :ip, 1)"),
+                {"id": device_id, "ip": f"10.0.0.{device_id}"})
+        # The highest id was deleted: without AUTOINCREMENT it would be handed out again
+        conn.execute(text("DELETE FROM devices WHERE id = 3"))
+        conn.execute(text("INSERT INTO device_tombstones (device_id) VALUES (3)"))
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)
+
+    with engine.begin() as conn:
+        assert "AUTOINCREMENT" in conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE name = 'devices'")).scalar()
+        conn.execute(text(
+            "INSERT INTO devices (name, type, ip_address, is_active) VALUES ('d', 'STANDARD', '10.0.0.4', 1)"))
+        assert conn.execute(text("SELECT id FROM devices ORDER BY id")).scalars().all() == [1, 2, 4]
+    assert {index["name"] for index in inspect(engine).get_indexes("devices")} == \
+           {index.name for index in Device.__table__.indexes}
+    engine.dispose()
+
+
+def test_missing_updated_at_index_is_created(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/indexes.db")
+    Device.__table__.create(engine)
+    DeviceTombstone.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_devices_updated_at"))
+
+    upgrade_schema(engine)
+
+    assert "ix_devices_updated_at" in {index["name"] for index in inspect(engine).get_indexes("devices")}
+    engine.dispose()
@@ -0,0 +1,68 @@
+# tests/test_device_queries.py
+import contextlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.api.endpoints import devices as devices_endpoint
+from app.core.database import engine
+from app.models.device import Device, DeviceType, OSType, StandardDevice, CustomDevice
+from app.models.plugin import Plugin
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(devices_endpoint.router, prefix="/api/v1/devices")
+    return TestClient(app)
+
+
+@contextlib.contextmanager
+def count_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def add_devices(db, count, first_id=1):
+    """Half standard devices, half custom devices of one plugin"""
+    plugin = db.query(Plugin).first() or Plugin(name="esxi", version="1.0", code="")
+    for device_id in range(first_id, first_id + count):
+        device = Device(id=device_id, name=f"device-{device_id}", ip_address=f"10.0.{device_id >> 8}.{device_id & 255}")
+        if device_id % 2:
+            device.type = DeviceType.STANDARD
+            device.standard_device = StandardDevice(os_type=OSType.LINUX, hostname=device.name)
+        else:
+            device.type = DeviceType.CUSTOM
+            device.custom_device = CustomDevice(plugin=plugin, connection_params={"host": device.ip_address})
+        db.add(device)
+    db.commit()
+
+
+def list_devices(client):
+    with count_statements() as statements:
+        response = client.get("/api/v1/devices/", params={"limit": 1000})
+    assert response.status_code == 200
+    return response.json(), len(statements)
+
+
+def test_device_list_query_count_does_not_grow_with_devices(db, client):
+    add_devices(db, 10)
+    few, few_statements = list_devices(client)
+    add_devices(db, 990, first_id=11)
+    many, many_statements = list_devices(client)
+
+    assert len(few) == 10 and len(many) == 1000
+    # Two for the ETag version, one for the devices with their details and plugin names
+    assert many_statements == few_statements == 3
+    assert {device["custom_device"]["plugin_name"] for device in many if device["custom_device"]} == {"esxi"}
+    assert all(device["standard_device"]["hostname"] for device in many if device["standard_device"])
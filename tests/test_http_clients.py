@@ -0,0 +1,36 @@
+# tests/test_http_clients.py
+import asyncio
+
+from app.core.http_clients import ServiceClients
+
+
+async def serve_keep_alive(reader, writer):
+    """Minimal HTTP/1.1 server answering every request on a connection with 204"""
+    try:
+        while await reader.readuntil(b"\r\n\r\n"):
+            writer.write(b"HTTP/1.1 204 No Content\r\n\r\n")
+            await writer.drain()
+    except asyncio.IncompleteReadError:
+        writer.close()
+
+
+def test_stats_count_reused_connections():
+    async def main():
+        server = await asyncio.start_server(serve_keep_alive, "127.0.0.1", 0)
+        url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/hook"
+        clients = ServiceClients()
+        before = clients.stats()["webhooks"]
+        try:
+            for _ in range(3):
+                await clients.get("webhooks").post(url, json={})
+            return before, clients.stats()["webhooks"]
+        finally:
+            await clients.close("webhooks")
+            server.close()
+
+    before, after = asyncio.run(main())
+
+    assert after["requests"] - before["requests"] == 3
+    # One connection, kept alive for all three requests and released after each
+    assert after["connections_opened"] - before["connections_opened"] == 1
+    assert after["active_connections"] == 0
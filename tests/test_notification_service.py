@@ -0,0 +1,89 @@
+# tests/test_notification_service.py
+import asyncio
+import datetime
+
+import pytest
+
+from app.models.device import Device, DeviceType
+from app.models.notification import NotificationOutbox, NotificationStatus
+from app.models.sensor import Sensor, Alert, AlertStatus
+from app.services.notification_service import NotificationService
+
+
+@pytest.fixture
+def webhook(monkeypatch, app_settings):
+    """Configure one webhook destination and record what would be posted to it"""
+    monkeypatch.setattr(app_settings, "NOTIFY_WEBHOOK_URLS", "http://hooks.test/alerts")
+    monkeypatch.setattr(app_settings, "NOTIFY_COALESCE_WINDOW_SECONDS", 30)
+    sent = []
+
+    async def send_webhook(client, url, payloads):
+        sent.append((url, payloads))
+
+    monkeypatch.setattr(NotificationService, "_send_webhook", staticmethod(send_webhook))
+    return sent
+
+
+@pytest.fixture
+def sensor(db):
+    device = Device(name="web-1", type=DeviceType.STANDARD, ip_address="10.0.0.1")
+    sensor = Sensor(name="cpu", device=device, metric_key="cpu.total", alert_condition=">90")
+    db.add(sensor)
+    db.commit()
+    return sensor
+
+
+def enqueue(db, sensor, event_type, status):
+    alert = Alert(sensor=sensor, value=95.0, message=f"cpu {event_type}", status=status)
+    db.add(alert)
+    NotificationService.enqueue_alert_event(db, alert, sensor, event_type)
+    db.commit()
+
+
+def test_flapping_within_window_is_sent_once(db, sensor, webhook):
+    # Three transitions 10s apart: only the first one's coalescing window has ended
+    enqueue(db, sensor, "alert_created", AlertStatus.NEW)
+    enqueue(db, sensor, "alert_resolved", AlertStatus.RESOLVED)
+    enqueue(db, sensor, "alert_created", AlertStatus.NEW)
+    now = datetime.datetime.utcnow()
+    rows = db.query(NotificationOutbox).order_by(NotificationOutbox.id).all()
+    for offset, row in zip((-1, 9, 19), rows):
+        row.next_attempt_at = now + datetime.timedelta(seconds=offset)
+    db.commit()
+
+    result = asyncio.run(NotificationService.dispatch_pending(db))
+
+    assert result["sent"] == 1
+    assert result["coalesced"] == 2
+    assert len(webhook) == 1
+    (payload,) = webhook[0][1]
+    assert payload["transitions"] == ["alert_created", "alert_resolved", "alert_created"]
+    assert payload["flapping"] is True
+    statuses = [row.status for row in db.query(NotificationOutbox).order_by(NotificationOutbox.id)]
+    assert statuses == [NotificationStatus.COALESCED, NotificationStatus.COALESCED, NotificationStatus.SENT]
+
+
+def test_nothing_is_sent_before_the_window_ends(db, sensor, webhook):
+    enqueue(db, sensor, "alert_created", AlertStatus.NEW)
+
+    result = asyncio.run(NotificationService.dispatch_pending(db))
+
+    assert result["due"] == 0
+    assert webhook == []
+
+
+def test_prune_deletes_old_delivered_rows_only(db, sensor, webhook, monkeypatch, app_settings):
+    monkeypatch.setattr(app_settings, "NOTIFY_RETENTION_HOURS", 24)
+    old = datetime.datetime.utcnow() - datetime.timedelta(hours=48)
+    for status in (NotificationStatus.SENT, NotificationStatus.COALESCED, NotificationStatus.FAILED,
+                   NotificationStatus.PENDING):
+        db.add(NotificationOutbox(destination="webhook:http://hooks.test/alerts", dedup_key="sensor:1",
+                                  event_type="alert_created", status=status, created_at=old))
+    db.add(NotificationOutbox(destination="webhook:http://hooks.test/alerts", dedup_key="sensor:1",
+                              event_type="alert_created", status=NotificationStatus.SENT))
+    db.commit()
+
+    assert NotificationService.prune(db) == 2
+
+    remaining = sorted(row.status.value for row in db.query(NotificationOutbox))
+    assert remaining == ["failed", "pending", "sent"]